@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ollama_client import OllamaClient
+
+DEFAULT_MODEL = os.environ.get("MODEL_NAME", "") or "gemma3:1b"
+DEFAULT_SERVER = os.environ.get("OLLAMA_SERVER", "http://localhost:11434")
+
+# Per-message overhead of the chat template, in tokens
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for text Ollama hasn't counted."""
+    return len(text) // 4 + MESSAGE_OVERHEAD
+
+
+class ChatHistory:
+    """Structured message history kept under a token budget.
+
+    Each message's token count is computed once when it is added (replies
+    use Ollama's exact eval_count), so keeping the budget is a running total
+    and dropping whole exchanges from the front, never a rescan of the
+    transcript. The system prompt and the newest user message always stay.
+    ``add`` returns what it dropped so ``pop`` can put it back if the
+    message is withdrawn.
+    """
+
+    def __init__(self, token_budget: int = 1536, system_prompt: Optional[str] = None):
+        self.token_budget = token_budget
+        self.system: Optional[Tuple[Dict[str, str], int]] = None
+        if system_prompt:
+            self.system = ({"role": "system", "content": system_prompt}, estimate_tokens(system_prompt))
+        self.turns: Deque[Tuple[Dict[str, str], int]] = deque()
+        self.tokens = self.system[1] if self.system else 0
+        self.dropped = 0
+
+    def add(self, role: str, content: str, tokens: Optional[int] = None) -> List[Tuple[Dict[str, str], int]]:
+        """Append a message, dropping the oldest messages over budget; returns the dropped ones."""
+        tokens = estimate_tokens(content) if tokens is None else tokens + MESSAGE_OVERHEAD
+        self.turns.append(({"role": role, "content": content}, tokens))
+        self.tokens += tokens
+        dropped = []
+        while self.tokens > self.token_budget and len(self.turns) > 1:
+            dropped.append(self._drop_oldest())
+        # Never start the window with a dangling assistant reply
+        while len(self.turns) > 1 and self.turns[0][0]["role"] == "assistant":
+            dropped.append(self._drop_oldest())
+        return dropped
+
+    def _drop_oldest(self) -> Tuple[Dict[str, str], int]:
+        turn = self.turns.popleft()
+        self.tokens -= turn[1]
+        self.dropped += 1
+        return turn
+
+    def pop(self, restore: List[Tuple[Dict[str, str], int]] = ()):
+        """Remove the newest message and put back the messages its ``add`` dropped."""
+        _, tokens = self.turns.pop()
+        self.tokens -= tokens
+        for turn in reversed(restore):
+            self.turns.appendleft(turn)
+            self.tokens += turn[1]
+            self.dropped -= 1
+
+    def clear(self):
+        self.turns.clear()
+        self.tokens = self.system[1] if self.system else 0
+
+    def messages(self) -> List[Dict[str, str]]:
+        messages = [message for message, _ in self.turns]
+        return [self.system[0]] + messages if self.system else messages
+
+
+class ChatCLI:
+    """Streams chat turns from one OllamaClient, so every turn reuses its pooled connection."""
+
+    def __init__(self, client: OllamaClient, history: ChatHistory, max_tokens: int = 512,
+                 temperature: float = 0.7, num_ctx: int = 2048, seed: Optional[int] = None,
+                 echo: bool = True):
+        self.client = client
+        self.history = history
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.num_ctx = num_ctx
+        self.seed = seed
+        self.echo = echo
+
+    def turn(self, user_input: str) -> Dict[str, Any]:
+        """Send one user message, print the reply as it streams and return the turn's metrics."""
+        dropped = self.history.add("user", user_input)
+        messages = self.history.messages()
+        stats: Dict[str, Any] = {}
+        reply = []
+        start = time.perf_counter()
+        first_token = None
+        stream = self.client.stream_chat(messages, temperature=self.temperature, max_tokens=self.max_tokens,
+                                         stats=stats, num_ctx=self.num_ctx, seed=self.seed)
+        try:
+            for chunk in stream:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                reply.append(chunk)
+                if self.echo:
+                    sys.stdout.write(chunk)
+                    sys.stdout.flush()
+        except KeyboardInterrupt:
+            stream.close()
+            stats["interrupted"] = True
+        elapsed = time.perf_counter() - start
+        if self.echo:
+            sys.stdout.write("\n")
+        text = "".join(reply)
+        failed = not text or text.startswith("Error:") or stats.get("interrupted", False)
+        if failed:
+            # Nothing was added, so the exchanges dropped to make room come back
+            self.history.pop(dropped)
+        else:
+            self.history.add("assistant", text, stats.get("eval_count"))
+        return self._metrics(stats, elapsed, first_token and first_token - start, len(messages), failed)
+
+    def _metrics(self, stats: Dict[str, Any], elapsed: float, ttft: Optional[float],
+                 message_count: int, failed: bool) -> Dict[str, Any]:
+        eval_count = stats.get("eval_count", 0)
+        eval_seconds = stats.get("eval_duration", 0) / 1e9
+        return {
+            "ok": not failed,
+            "interrupted": stats.get("interrupted", False),
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "total_ms": round(elapsed * 1000, 1),
+            "tokens": eval_count,
+            "tokens_per_second": round(eval_count / eval_seconds, 1) if eval_seconds else None,
+            "prompt_tokens": stats.get("prompt_eval_count"),
+            "load_ms": round(stats.get("load_duration", 0) / 1e6, 1),
+            "prefill_ms": round(stats.get("prompt_eval_duration", 0) / 1e6, 1),
+            "messages_sent": message_count,
+            "history_tokens": self.history.tokens
+        }
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in results if r["ok"]]
+    summary: Dict[str, Any] = {"turns": len(results), "failed": len(results) - len(ok)}
+    for key in ("ttft_ms", "total_ms", "tokens_per_second"):
+        values = [r[key] for r in ok if r[key] is not None]
+        if values:
+            summary[key] = {
+                "mean": round(statistics.mean(values), 1),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95)
+            }
+    return summary
+
+
+def run_interactive(cli: ChatCLI):
+    print("Welcome to the AI Chatbot! Type 'exit' to quit, '/reset' to clear the conversation.")
+    while True:
+        try:
+            user_input = input("You: ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not user_input:
+            continue
+        if user_input.lower() in ("exit", "quit"):
+            break
+        if user_input == "/reset":
+            cli.history.clear()
+            print("[*] Conversation cleared")
+            continue
+        sys.stdout.write("Bot: ")
+        sys.stdout.flush()
+        cli.turn(user_input)
+
+
+def run_benchmark(cli: ChatCLI, prompts: List[str], runs: int, keep_history: bool, as_json: bool) -> int:
+    """Send every prompt ``runs`` times, printing per-turn metrics and a summary.
+
+    Ctrl+C stops the whole run and summarizes the turns completed so far.
+    """
+    results = []
+    interrupted = False
+    try:
+        for run in range(runs):
+            for prompt in prompts:
+                if not keep_history:
+                    cli.history.clear()
+                metrics = cli.turn(prompt)
+                if metrics["interrupted"]:
+                    raise KeyboardInterrupt
+                metrics.update(run=run, prompt=prompt[:60])
+                results.append(metrics)
+                if as_json:
+                    print(json.dumps(metrics))
+                else:
+                    print(f"[*] ttft {metrics['ttft_ms']}ms, {metrics['tokens']} tokens at "
+                          f"{metrics['tokens_per_second']} tok/s, total {metrics['total_ms']}ms")
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f"[!] Interrupted after {len(results)} turns", file=sys.stderr)
+    summary = summarize(results)
+    print(json.dumps({"summary": summary, "pool": cli.client.pool_stats()}, indent=None if as_json else 2))
+    if interrupted:
+        return 130
+    return 0 if summary["failed"] == 0 else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chat with an Ollama model in the terminal, or benchmark it")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--server", default=DEFAULT_SERVER)
+    parser.add_argument("--system", help="System prompt")
+    parser.add_argument("--max-tokens", type=int, default=512, help="Reply length limit")
+    parser.add_argument("--num-ctx", type=int, default=2048, help="Model context window")
+    parser.add_argument("--history-tokens", type=int,
+                        help="History budget in tokens (default: context window minus reply limit)")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--seed", type=int)
+    bench = parser.add_argument_group("benchmark")
+    bench.add_argument("--prompt", action="append", default=[], help="Send this prompt instead of chatting; repeatable")
+    bench.add_argument("--prompts-file", help="Send each non-empty line of this file as a prompt")
+    bench.add_argument("--runs", type=int, default=1, help="Repeat the prompt list this many times")
+    bench.add_argument("--independent", action="store_true", help="Send each prompt without earlier turns")
+    bench.add_argument("--quiet", action="store_true", help="Don't print replies")
+    bench.add_argument("--json", action="store_true", help="Print one JSON object per turn")
+    args = parser.parse_args(argv)
+
+    prompts = list(args.prompt)
+    if args.prompts_file:
+        with open(args.prompts_file, "r", encoding="utf-8") as f:
+            prompts.extend(line.strip() for line in f if line.strip())
+
+    budget = args.history_tokens or max(256, args.num_ctx - args.max_tokens)
+    client = OllamaClient(model_name=args.model, base_url=args.server, pool_size=2)
+    cli = ChatCLI(client, ChatHistory(budget, args.system), max_tokens=args.max_tokens,
+                  temperature=args.temperature, num_ctx=args.num_ctx, seed=args.seed,
+                  echo=not (prompts and (args.quiet or args.json)))
+    if prompts:
+        return run_benchmark(cli, prompts, args.runs, not args.independent, args.json)
+    if not client.check_connection():
+        return 1
+    run_interactive(cli)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,21 @@
-from flask import Flask, request, jsonify, Response, send_from_directory, send_file
+from flask import Flask, Blueprint, request, jsonify, Response, abort, g
 from flask_cors import CORS
-from ollama_client import OllamaClient
+from ollama_client import OllamaClient, StreamAbort
+from static_assets import StaticAssetStore
+from ollama_supervisor import OllamaSupervisor
+from stream_buffers import GenerationBufferRegistry
+from rate_limiter import TokenRateLimiter
+from shared_state import SharedCache, SharedRecords, create_state_backend
+from model_cache import ModelResponseCache, normalize_model_name
+from embedding_batcher import EmbeddingBatcher
+from document_index import DocumentIndex, build_prompt, is_within
+from model_catalog import ModelCatalog, MODEL_CATEGORIES
+from chat_history import ChatHistoryStore, ExchangeIndexWriter
+from chat_socket import ChatSocketSession, TOKEN, SOURCES, DONE, ERROR
+from request_trace import RequestTrace
+from sampling_profiler import SamplingProfiler
+from performance_tiers import TierSelector, smallest_variant
+import numpy as np
 import os
 import json
 import threading
@@ -11,59 +26,20 @@ import requests
 import logging
 import sys
 import platform
+import atexit
+import uuid
+import hmac
+import socket
+import re
 from typing import Dict, List, Any, Optional
 from threading import RLock
 from concurrent.futures import ThreadPoolExecutor
 
-class SimpleCache:
-    """A simple in-memory cache implementation."""
-    
-    def __init__(self, default_timeout=300):
-        self.cache = {}
-        self.timeouts = {}
-        self.default_timeout = default_timeout
-        self._lock = RLock()
-    
-    def get(self, key):
-        """Look up key in the cache and return the value if it exists and hasn't expired."""
-        with self._lock:
-            if key not in self.cache:
-                return None
-            if key in self.timeouts:
-                expiry = self.timeouts[key]
-                if expiry is not None and expiry <= time.time():
-                    del self.cache[key]
-                    del self.timeouts[key]
-                    return None
-            return self.cache[key]
-    
-    def set(self, key, value, timeout=None):
-        """Add a new key/value to the cache with optional expiry."""
-        with self._lock:
-            self.cache[key] = value
-            if timeout is None:
-                timeout = self.default_timeout
-            if timeout > 0:
-                self.timeouts[key] = time.time() + timeout
-            else:
-                self.timeouts[key] = None
-            return True
-    
-    def delete(self, key):
-        """Delete a key from the cache."""
-        with self._lock:
-            if key in self.cache:
-                del self.cache[key]
-                if key in self.timeouts:
-                    del self.timeouts[key]
-                return True
-            return False
-    
-    def clear(self):
-        """Clear the entire cache."""
-        with self._lock:
-            self.cache.clear()
-            self.timeouts.clear()
+try:
+    from flask_sock import Sock
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
 
 logging.basicConfig(
     level=logging.INFO,
@@ -72,12 +48,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger("chat_handler")
 
-app = Flask(__name__)
-CORS(app)
+bp = Blueprint("chat_handler", __name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
 
-app.config['KEEP_ALIVE_TIMEOUT'] = 120
+state_backend = None
+response_cache: Optional[ModelResponseCache] = None
+active_generations: Optional[SharedRecords] = None
+model_downloads: Optional[SharedRecords] = None
+shared_settings: Optional[SharedCache] = None
+chat_history: Optional[ChatHistoryStore] = None
+exchange_writer: Optional[ExchangeIndexWriter] = None
 
-response_cache = SimpleCache(default_timeout=600)
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
+static_assets = StaticAssetStore(FRONTEND_DIR, url_prefix="/frontend").load()
 
 worker_pool = ThreadPoolExecutor(max_workers=4)
 
@@ -90,10 +74,39 @@ print(f"Initial model setting: {model_name or 'Will select first available model
 FAST_MODE = os.environ.get("FAST_MODE", "0") == "1"
 if FAST_MODE:
     print("⚡ FAST MODE ENABLED: Optimizing for speed over quality")
+# Tier used when the host is not under pressure; FAST_MODE=1 is shorthand for PERFORMANCE_TIER=fast
+PERFORMANCE_TIER = os.environ.get("PERFORMANCE_TIER", "fast" if FAST_MODE else "balanced")
+
+DETERMINISTIC_DEFAULT = os.environ.get("DETERMINISTIC_MODE", "0") == "1"
+DETERMINISTIC_SEED = int(os.environ.get("DETERMINISTIC_SEED", "42"))
+SAMPLED_TEMPERATURE = float(os.environ.get("SAMPLED_TEMPERATURE", "0.7"))
+SAMPLE_POOL_SIZE = max(1, int(os.environ.get("SAMPLE_POOL_SIZE", "3")))
+MAX_COMPARE_MODELS = int(os.environ.get("MAX_COMPARE_MODELS", "4"))
+
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "nomic-embed-text")
+
+RAG_INDEX_DIR = os.environ.get("RAG_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_index"))
+# Server-side files /documents/ingest may read; paths are resolved inside it
+DOCUMENTS_ROOT = os.path.abspath(os.environ.get("DOCUMENTS_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "documents")))
+RAG_DEFAULT = os.environ.get("RAG_ENABLED", "1") == "1"
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", "4"))
+RAG_MIN_SCORE = float(os.environ.get("RAG_MIN_SCORE", "0.3"))
 
-active_generations = {}
+rate_limiter = TokenRateLimiter(
+    tokens_per_minute=int(os.environ.get("RATE_LIMIT_TOKENS_PER_MINUTE", "20000")),
+    burst=int(os.environ.get("RATE_LIMIT_BURST", "0")) or None,
+    api_keys=[key.strip() for key in os.environ.get("API_KEYS", "").split(",") if key.strip()]
+)
+
+stream_buffers = GenerationBufferRegistry(
+    ttl=float(os.environ.get("STREAM_BUFFER_TTL", "120")),
+    max_events=int(os.environ.get("STREAM_BUFFER_EVENTS", "4096"))
+)
+
+model_catalog = ModelCatalog(os.environ.get("MODEL_CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ollama_models.json")))
 
-model_downloads = {}
+embedding_batcher: Optional[EmbeddingBatcher] = None
+document_index: Optional[DocumentIndex] = None
 
 model = None
 model_loading = False
@@ -104,13 +117,35 @@ model_state = {
     "loading": False,
     "instance": None,
     "last_used": 0,
-    "error": None
+    "error": None,
+    "phase": "starting"
 }
 
-def is_ollama_running() -> bool:
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+MAX_PROFILE_SECONDS = float(os.environ.get("MAX_PROFILE_SECONDS", "60"))
+tier_selector = TierSelector(
+    PERFORMANCE_TIER,
+    queue_depth=int(os.environ.get("TIER_QUEUE_DEPTH", "4")),
+    min_memory=float(os.environ.get("TIER_MIN_MEMORY", "0.15")),
+    recovery_delay=float(os.environ.get("TIER_RECOVERY_SECONDS", "30")),
+    in_flight=lambda: model.generations_in_flight if model else 0
+)
+profiler = SamplingProfiler(interval=float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000)
+
+# Requests one worker process serves at once (e.g. gunicorn --threads); sizes the Ollama connection pool
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "32"))
+
+OLLAMA_REQUEST_TIMEOUT = float(os.environ.get("OLLAMA_REQUEST_TIMEOUT", "5"))
+
+KEEP_WARM_INTERVAL = 300
+MODEL_LIST_INTERVAL = float(os.environ.get("MODEL_LIST_INTERVAL", "15"))
+
+ollama_supervisor: Optional[OllamaSupervisor] = None
+
+def is_ollama_running(timeout: float = 2) -> bool:
     """Check if Ollama service is currently running."""
     try:
-        response = requests.get(f"{ollama_server}/api/version", timeout=2)
+        response = requests.get(f"{ollama_server}/api/version", timeout=timeout)
         if response.status_code == 200:
             logger.info("Ollama service is already running")
             return True
@@ -144,34 +179,32 @@ def find_ollama_executable() -> Optional[str]:
     return None
 
 def start_ollama_service() -> bool:
-        
+    """Launch 'ollama serve' under a supervisor and wait for it to answer."""
+    global ollama_supervisor
     try:
         if platform.system() == "Windows":
             ollama_path = find_ollama_executable()
             if not ollama_path:
                 print("Please download and install Ollama from https://ollama.com/\n")
                 return False
-            
-            logger.info(f"Starting Ollama from: {ollama_path}")
-            print(f"\n🚀 Starting Ollama server from: {ollama_path}\n")
-            
-            subprocess.Popen([ollama_path, "serve"], 
-                              creationflags=subprocess.CREATE_NEW_CONSOLE)
         else:
-            logger.info("Starting Ollama service with 'ollama serve'")
-            print("\n🚀 Starting Ollama server...\n")
-            
-            subprocess.Popen(["ollama", "serve"], 
-                              stdout=subprocess.PIPE, 
-                              stderr=subprocess.PIPE)
+            ollama_path = "ollama"
+        
+        logger.info(f"Starting Ollama from: {ollama_path}")
+        print(f"\n🚀 Starting Ollama server from: {ollama_path}\n")
+        
+        ollama_supervisor = OllamaSupervisor(
+            [ollama_path, "serve"],
+            base_url=ollama_server,
+            log_file=os.environ.get("OLLAMA_LOG_FILE", "ollama_serve.log")
+        )
+        ollama_supervisor.start()
+        atexit.register(ollama_supervisor.stop)
         
         print("Waiting for Ollama to start...")
-        for i in range(15):
-            time.sleep(1)
-            print(f"Checking Ollama status ({i+1}/15)...")
-            if is_ollama_running():
-                logger.info("Ollama service started successfully")
-                return True
+        if ollama_supervisor.wait_until_ready(timeout=15):
+            logger.info("Ollama service started successfully")
+            return True
                 
         return False
         
@@ -179,14 +212,20 @@ def start_ollama_service() -> bool:
         logger.error(f"Failed to start Ollama service: {str(e)}")
         return False
 
-if not is_ollama_running():
-    logger.info("Ollama is not running, attempting to start it...")
-    start_ollama_service()
+def current_model_name() -> str:
+    """Return the model selected for all workers, syncing this worker's client to it."""
+    global model_name
+    shared_name = shared_settings.get("model_name") if shared_settings else None
+    if shared_name and shared_name != model_name:
+        model_name = shared_name
+        if model:
+            model.model_name = shared_name
+    return model_name
 
 def fetch_available_models():
     """Fetch available models directly from Ollama API"""
     try:
-        response = requests.get(f"{ollama_server}/api/tags")
+        response = requests.get(f"{ollama_server}/api/tags", timeout=OLLAMA_REQUEST_TIMEOUT)
         if response.status_code == 200:
             models_data = response.json().get("models", [])
             available_models = [m["name"] for m in models_data]
@@ -200,12 +239,29 @@ def fetch_available_models():
         return [], []
 
 def load_model_async():
+    """Discover or start Ollama, then create the client, off the request path."""
     global model, model_loading, model_error, model_name
     try:
         print("Starting Ollama client initialization...")
         
+        model_state["phase"] = "discovering_ollama"
+        if not is_ollama_running():
+            model_state["phase"] = "starting_ollama"
+            if state_backend.acquire_lease("ollama-launcher", WORKER_ID, ttl=60):
+                logger.info("Ollama is not running, attempting to start it...")
+                start_ollama_service()
+            else:
+                logger.info("Another worker is starting Ollama, waiting for it...")
+                for _ in range(30):
+                    time.sleep(0.5)
+                    if is_ollama_running(timeout=1):
+                        break
+        
+        model_state["phase"] = "listing_models"
         models_data, available_models = fetch_available_models()
+        response_cache.refresh_digests(models_data)
         
+        model_name = shared_settings.get("model_name") or model_name
         if not model_name:
             if available_models:
                 model_name = available_models[0]
@@ -214,12 +270,16 @@ def load_model_async():
                 model_name = "llama2"
                 print(f"No models available, falling back to default: {model_name}")
         
+        if not shared_settings.get("model_name"):
+            shared_settings.set("model_name", model_name)
+        
         temp_model = OllamaClient(
             model_name=model_name,
             base_url=ollama_server,
-            fast_mode=FAST_MODE,
-            cache_size=100
+            # Background threads (keep-warm, embedding batches) need connections too
+            pool_size=int(os.environ.get("OLLAMA_POOL_SIZE", SERVER_THREADS + 4))
         )
+        temp_model.check_connection(timeout=OLLAMA_REQUEST_TIMEOUT)
         
         if models_data and model_name not in available_models:
             print(f"Warning: Model '{model_name}' not found in Ollama.")
@@ -232,6 +292,7 @@ def load_model_async():
         model_state["loading"] = False
         model_state["last_used"] = time.time()
         model_state["error"] = None
+        model_state["phase"] = "ready"
         
         print(f"Ollama client initialized for model: {model_name}")
         model_error = None
@@ -242,6 +303,7 @@ def load_model_async():
         model_error = str(e)
         model_state["error"] = str(e)
         model_state["loading"] = False
+        model_state["phase"] = "failed"
         
         if "Connection" in str(e) and "refused" in str(e):
             model_error = "Could not connect to Ollama server. Please make sure Ollama is installed and running.\n"
@@ -249,13 +311,99 @@ def load_model_async():
     finally:
         model_loading = False
 
-print("Starting Ollama client in background...")
-model_loading = True
-loading_thread = threading.Thread(target=load_model_async)
-loading_thread.daemon = True
-loading_thread.start()
+# Installed and loaded models for picking tier variants, polled by refresh_model_lists(),
+# which also keeps the response cache's model digests current
+_model_lists = {"installed": [], "running": []}
+
+def refresh_model_lists():
+    """Poll Ollama's installed and running models so requests never wait on /api/tags or /api/ps."""
+    while True:
+        if model is None or model_loading:
+            time.sleep(1)
+            continue
+        try:
+            installed = model.list_models()
+            # An empty answer is usually a failed call; the last known list is the better guess
+            if installed:
+                _model_lists["installed"] = installed
+                response_cache.refresh_digests(installed)
+            _model_lists["running"] = model.running_models()
+        except Exception as e:
+            print(f"Error refreshing model lists: {e}")
+        time.sleep(MODEL_LIST_INTERVAL)
+
+def installed_models():
+    return _model_lists["installed"]
+
+def is_model_loaded(name, num_ctx):
+    """Whether Ollama already runs ``name`` with this context size, so using it starts no new runner."""
+    for running in _model_lists["running"]:
+        if normalize_model_name(running.get("name", "")) == normalize_model_name(name):
+            # Older Ollama versions don't report the context length
+            return running.get("context_length") in (None, num_ctx)
+    return False
+
+def tier_model(tier):
+    if tier.model:
+        return tier.model
+    if tier.use_small_variant:
+        return smallest_variant(current_model_name(), installed_models())
+    return current_model_name()
+
+def parse_flag(value, name):
+    """Read a JSON boolean flag strictly, so the string "false" isn't taken as true."""
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1) and not isinstance(value, float):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "false", "1", "0"):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError(f"{name} must be true or false")
 
-@app.route("/chat", methods=["POST"])
+def generation_settings(payload):
+    """Pick the request's performance tier; returns (tier, generation options, sample pool size, deterministic)."""
+    requested = payload.get("tier")
+    tier = tier_selector.select(requested)
+    deterministic = parse_flag(payload.get("deterministic", DETERMINISTIC_DEFAULT), "deterministic")
+    try:
+        max_tokens = min(int(payload.get("max_tokens", 512)), tier.max_tokens)
+    except (TypeError, ValueError):
+        raise ValueError("max_tokens must be an integer")
+    if max_tokens < 1:
+        # Ollama reads a negative num_predict as "no limit", which would slip past the rate limiter
+        raise ValueError("max_tokens must be at least 1")
+    model_for_tier, num_ctx = tier_model(tier), tier.num_ctx
+    if requested in (None, "auto") and tier is not tier_selector.base_tier:
+        base = tier_selector.base_tier
+        base_model = tier_model(base)
+        if (model_for_tier, num_ctx) != (base_model, base.num_ctx) and not is_model_loaded(model_for_tier, num_ctx):
+            # Loading another runner under pressure costs more than it saves; only shorten the answer
+            model_for_tier, num_ctx = base_model, base.num_ctx
+    # Deterministic answers are exact cache hits; sampled answers rotate through a pool
+    gen_options = {
+        "max_tokens": max_tokens,
+        "temperature": 0.0 if deterministic else SAMPLED_TEMPERATURE,
+        "seed": DETERMINISTIC_SEED if deterministic else None,
+        "num_ctx": num_ctx,
+        "model": model_for_tier
+    }
+    return tier, gen_options, 1 if deterministic else SAMPLE_POOL_SIZE, deterministic
+
+def retrieve_context(user_input, use_documents):
+    """Ground the prompt in indexed documents when any are relevant; returns (prompt, sources)."""
+    if not use_documents or document_index is None or not len(document_index):
+        return user_input, []
+    try:
+        passages = document_index.search_text(user_input, RAG_TOP_K, RAG_MIN_SCORE)
+    except Exception as e:
+        print(f"Document retrieval failed, answering without context: {e}")
+        return user_input, []
+    if not passages:
+        return user_input, []
+    sources = [{"source": p["source"], "score": round(p["score"], 3)} for p in passages]
+    return build_prompt(user_input, passages), sources
+
+@bp.route("/chat", methods=["POST"])
 def chat():
     global model, model_loading, model_error
     
@@ -283,104 +431,681 @@ def chat():
     
     user_input = request.json.get("message", "")
     stream_mode = request.json.get("stream", True)
-    max_tokens = min(int(request.json.get("max_tokens", 512)), 6144)  # Increased from 1024 to 6144 (6x)
+    try:
+        tier, gen_options, pool_size, deterministic = generation_settings(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    g.tier = tier.name
+    max_tokens = gen_options["max_tokens"]
     
     if not user_input:
         return jsonify({"error": "Message is required"}), 400
+    
+    trace = RequestTrace()
+    g.trace = trace
+    # Reserve the budget first so limited clients don't cost an embedding and vector search
+    rate_limit = rate_limiter.acquire(rate_limiter.client_key(request), max_tokens)
+    g.rate_limit = rate_limit
+    if not rate_limit.allowed:
+        return jsonify({
+            "error": "Rate limit exceeded. Please wait before sending another request.",
+            "retry_after": round(rate_limit.retry_after, 1)
+        }), 429
+
+    with trace.span("retrieval", "Document retrieval"):
+        prompt, sources = retrieve_context(user_input, request.json.get("use_documents", RAG_DEFAULT))
+    owner = history_owner()
 
-    request_id = str(time.time())
+    request_id = uuid.uuid4().hex
+    start_time = time.time()
     active_generations[request_id] = {
         "status": "processing",
-        "start_time": time.time()
+        "start_time": start_time,
+        "worker": WORKER_ID
     }
     
-    cache_key = f"{model_name}:{user_input}:{max_tokens}"
-    if not stream_mode:
-        cached_response = response_cache.get(cache_key)
-        if cached_response:
-            print(f"Using cached response for: {user_input[:30]}...")
-            active_generations[request_id]["status"] = "completed (cached)"
-            active_generations[request_id]["end_time"] = time.time()
-            
-            processing_time = active_generations[request_id]["end_time"] - active_generations[request_id]["start_time"]
-            
-            return jsonify({
-                "response": cached_response,
-                "processing_time": f"{processing_time:.2f}s",
-                "cached": True
-            })
+    cache_model = gen_options["model"]
+    cache_key = ModelResponseCache.make_key(prompt, max_tokens, gen_options["temperature"],
+                                            seed=gen_options["seed"], num_ctx=gen_options["num_ctx"])
+    cache_entry = (cache_model, cache_key, pool_size)
+    with trace.span("cache", "Response cache lookup"):
+        cached_response = response_cache.get_sample(cache_model, cache_key, pool_size)
+    if cached_response:
+        print(f"Using cached response for: {user_input[:30]}...")
+        active_generations.patch(request_id, status="completed (cached)", end_time=time.time())
+        rate_limiter.settle(rate_limit, 0)
+        
+        processing_time = time.time() - start_time
+        
+        if stream_mode:
+            generation = stream_buffers.create(request_id)
+            if sources:
+                generation.append({'sources': sources})
+            generation.append({'chunk': cached_response})
+            generation.append({'done': True, 'processing_time': f'{processing_time:.2f}s', 'cached': True,
+                               'timings': trace.to_dict()})
+            generation.finish()
+            return Response(stream_generation_events(generation), mimetype='text/event-stream', headers=SSE_HEADERS)
+        
+        return jsonify({
+            "response": cached_response,
+            "processing_time": f"{processing_time:.2f}s",
+            "cached": True,
+            "deterministic": deterministic,
+            "tier": tier.name,
+            "sources": sources
+        })
     
     try:
         if stream_mode:
-            def generate_stream():
-                try:
-                    response_chunks = []
-                    batch_chunk = ""
-                    full_response = ""
-                    
-                    for chunk in model.stream(user_input, max_tokens=max_tokens):
-                        batch_chunk += chunk
-                        response_chunks.append(chunk)
-                        full_response += chunk
-                        
-                        if len(response_chunks) >= 5:
-                            yield f"data: {json.dumps({'chunk': batch_chunk})}\n\n"
-                            batch_chunk = ""
-                            response_chunks = []
-                    
-                    if batch_chunk:
-                        yield f"data: {json.dumps({'chunk': batch_chunk})}\n\n"
-                    
-                    if full_response:
-                        response_cache.set(cache_key, full_response)
-                    
-                    processing_time = time.time() - active_generations[request_id]["start_time"]
-                    completion_data = {
-                        'done': True, 
-                        'processing_time': f'{processing_time:.2f}s'
-                    }
-                    
-                    active_generations[request_id]["status"] = "completed"
-                    active_generations[request_id]["end_time"] = time.time()
-                    yield f"data: {json.dumps(completion_data)}\n\n"
-                    
-                except Exception as e:
-                    print(f"Streaming error: {e}")
-                    active_generations[request_id]["status"] = "failed"
-                    active_generations[request_id]["error"] = str(e)
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            
-            headers = {
-                'Content-Type': 'text/event-stream', 
-                'Cache-Control': 'no-cache, no-transform',
-                'Connection': 'keep-alive',
-                'X-Accel-Buffering': 'no',
-                'Transfer-Encoding': 'chunked'
-            }
-            return Response(generate_stream(), mimetype='text/event-stream', headers=headers)
+            generation = stream_buffers.create(request_id)
+            if sources:
+                generation.append({'sources': sources})
+            generation_thread = threading.Thread(
+                target=run_stream_generation,
+                args=(generation, request_id, user_input, prompt, gen_options, cache_entry, rate_limit, trace, owner),
+                daemon=True
+            )
+            generation_thread.start()
+            return Response(stream_generation_events(generation), mimetype='text/event-stream', headers=SSE_HEADERS)
         else:
-            response = model.infer(user_input, max_tokens=max_tokens)
+            generation_stats = {}
+            response = model.infer(prompt, stats=generation_stats, **gen_options)
+            trace.add_ollama_stats(generation_stats)
+            rate_limiter.settle(rate_limit, generation_stats.get("eval_count", 0))
             
-            response_cache.set(cache_key, response)
+            if not response.startswith("Error:"):
+                response_cache.add_sample(cache_model, cache_key, response, pool_size)
+                record_exchange(owner, user_input, response, cache_model)
             
-            active_generations[request_id]["status"] = "completed"
-            active_generations[request_id]["end_time"] = time.time()
+            active_generations.patch(request_id, status="completed", end_time=time.time())
             
-            processing_time = active_generations[request_id]["end_time"] - active_generations[request_id]["start_time"]
+            processing_time = time.time() - start_time
             
             result = {
                 "response": response,
-                "processing_time": f"{processing_time:.2f}s"
+                "processing_time": f"{processing_time:.2f}s",
+                "deterministic": deterministic,
+                "tier": tier.name,
+                "sources": sources
             }
                 
             return jsonify(result)
     except Exception as e:
         print(f"Inference error: {e}")
-        active_generations[request_id]["status"] = "failed"
-        active_generations[request_id]["error"] = str(e)
+        rate_limiter.settle(rate_limit, 0)
+        active_generations.patch(request_id, status="failed", error=str(e))
         return jsonify({"error": str(e)}), 500
 
-@app.route("/status", methods=["GET"])
+def socket_generation(message, client_key, owner, generation):
+    """Frames for one WebSocket chat turn; cancelling ``generation`` aborts the upstream stream."""
+    if model is None or model_loading:
+        yield ERROR, "Ollama client is not ready"
+        return
+    user_input = message.get("message", "")
+    if not isinstance(user_input, str) or not user_input:
+        yield ERROR, "Message is required"
+        return
+    try:
+        tier, gen_options, pool_size, _ = generation_settings(message)
+    except (TypeError, ValueError) as e:
+        yield ERROR, str(e)
+        return
+    max_tokens = gen_options["max_tokens"]
+    
+    rate_limit = rate_limiter.acquire(client_key, max_tokens)
+    if not rate_limit.allowed:
+        yield ERROR, f"Rate limit exceeded, retry in {rate_limit.retry_after:.1f}s"
+        return
+    prompt, sources = retrieve_context(user_input, message.get("use_documents", RAG_DEFAULT))
+    
+    model_state["last_used"] = time.time()
+    request_id = uuid.uuid4().hex
+    start_time = time.time()
+    active_generations[request_id] = {"status": "processing", "start_time": start_time, "worker": WORKER_ID}
+    cache_model = gen_options["model"]
+    cache_key = ModelResponseCache.make_key(prompt, max_tokens, gen_options["temperature"],
+                                            seed=gen_options["seed"], num_ctx=gen_options["num_ctx"])
+    generation_stats = {}
+    status = "cancelled"
+    upstream = None
+    try:
+        if sources:
+            yield SOURCES, sources
+        cached_response = response_cache.get_sample(cache_model, cache_key, pool_size)
+        if cached_response:
+            yield TOKEN, cached_response
+            status = "completed (cached)"
+            yield DONE, {"time": round(time.time() - start_time, 3), "cached": True, "tier": tier.name}
+            return
+        full_response = ""
+        abort = StreamAbort()
+        generation.on_cancel(abort.set)
+        upstream = model.stream(prompt, stats=generation_stats, abort=abort, **gen_options)
+        for chunk in upstream:
+            full_response += chunk
+            yield TOKEN, chunk
+        if abort.is_set():
+            return
+        if full_response and not full_response.startswith("Error:"):
+            response_cache.add_sample(cache_model, cache_key, full_response, pool_size)
+            record_exchange(owner, user_input, full_response, cache_model)
+        status = "completed"
+        yield DONE, {"time": round(time.time() - start_time, 3), "tokens": generation_stats.get("eval_count", 0),
+                     "tier": tier.name}
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        if upstream is not None:
+            # Closes the streaming HTTP response, which stops Ollama generating
+            upstream.close()
+        rate_limiter.settle(rate_limit, generation_stats.get("eval_count", 0))
+        active_generations.patch(request_id, status=status, end_time=time.time())
+
+if WEBSOCKETS_AVAILABLE:
+    sock = Sock()
+    
+    @sock.route("/chat/ws", bp=bp)
+    def chat_socket(ws):
+        """Chat over one WebSocket; see ChatSocketSession for the message format."""
+        client_key, owner = rate_limiter.client_key(request), history_owner()
+        session = ChatSocketSession(
+            ws.send,
+            lambda message, generation: socket_generation(message, client_key, owner, generation),
+            max_active=int(os.environ.get("WS_MAX_GENERATIONS", "4")),
+            pause_timeout=float(os.environ.get("WS_PAUSE_TIMEOUT", "120"))
+        )
+        try:
+            while True:
+                session.handle(ws.receive())
+        finally:
+            session.close()
+
+@bp.after_request
+def add_rate_limit_headers(response):
+    rate_limit = g.get("rate_limit")
+    if rate_limit is not None and rate_limiter.enabled:
+        response.headers.update(rate_limiter.refresh(rate_limit).headers())
+    # Streamed responses only carry the spans finished before the first byte
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers["Server-Timing"] = trace.server_timing()
+    if g.get("tier"):
+        response.headers["X-Performance-Tier"] = g.tier
+    return response
+
+def is_admin_request():
+    """Admin routes need ADMIN_TOKEN to be set and sent back in X-Admin-Token; without it they are off."""
+    if not ADMIN_TOKEN:
+        return False
+    # A reverse proxy makes every client look like loopback, so the address is never trusted
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode("utf-8"),
+                               ADMIN_TOKEN.encode("utf-8"))
+
+@bp.route("/admin/profile", methods=["POST"])
+def profile_server():
+    """Sample every thread's stack for ``seconds`` and return the profile.
+
+    Requires the X-Admin-Token header, and is disabled unless ADMIN_TOKEN
+    is set. ``format=collapsed`` returns flamegraph input as text.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Profiling is disabled; set ADMIN_TOKEN to enable it"}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Admin access required"}), 403
+    try:
+        seconds = float(request.args.get("seconds", 10))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({"error": f"seconds must be between 0 and {MAX_PROFILE_SECONDS:g}"}), 400
+    try:
+        result = profiler.profile(seconds)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    if request.args.get("format") == "collapsed":
+        return Response(result["collapsed"] + "\n", mimetype="text/plain")
+    return jsonify(result)
+
+SSE_HEADERS = {
+    'Content-Type': 'text/event-stream', 
+    'Cache-Control': 'no-cache, no-transform',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no',
+    'Transfer-Encoding': 'chunked'
+}
+
+CLIENT_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+def history_owner():
+    """Who owns the caller's chat history: a configured API key, else the browser's random X-Client-Id.
+
+    Returns None when the caller sends neither. The IP address is never
+    used, since everyone behind one NAT or proxy shares it.
+    """
+    client_key = rate_limiter.client_key(request)
+    if client_key.startswith("key:"):
+        return client_key
+    # Browsers can't set headers on a WebSocket handshake, so it may come as a query parameter
+    client_id = request.headers.get("X-Client-Id") or request.args.get("client_id", "")
+    if CLIENT_ID_PATTERN.fullmatch(client_id):
+        return f"client:{client_id}"
+    return None
+
+def record_exchange(owner, user_input, response, model_used):
+    """Queue a completed prompt/response pair for ``owner``'s search index."""
+    if exchange_writer is not None and owner:
+        exchange_writer.add(user_input, response, model_used, owner)
+
+def run_stream_generation(generation, request_id, user_input, prompt, gen_options, cache_entry, rate_limit, trace,
+                          owner):
+    """Produce a streamed answer into its buffer, independent of any client connection.
+
+    Stops early, closing the upstream stream, when the generation is
+    cancelled or nobody has read its buffer for the buffer TTL.
+    """
+    cache_model, cache_key, pool_size = cache_entry
+    generation_stats = {}
+    upstream = None
+    full_response = ""
+    try:
+        response_chunks = []
+        batch_chunk = ""
+        
+        upstream = model.stream(prompt, stats=generation_stats, **gen_options)
+        for chunk in upstream:
+            if generation.should_stop(stream_buffers.ttl):
+                break
+            if not full_response:
+                trace.mark("ttft", "Time to first token")
+            batch_chunk += chunk
+            response_chunks.append(chunk)
+            full_response += chunk
+            
+            if len(response_chunks) >= 5:
+                generation.append({'chunk': batch_chunk})
+                batch_chunk = ""
+                response_chunks = []
+        
+        if generation.should_stop(stream_buffers.ttl):
+            upstream.close()
+            active_generations.patch(request_id, status="cancelled", end_time=time.time())
+            generation.append({'error': 'Generation cancelled', 'cancelled': True})
+            return
+        
+        if batch_chunk:
+            generation.append({'chunk': batch_chunk})
+        
+        if full_response and not full_response.startswith("Error:"):
+            response_cache.add_sample(cache_model, cache_key, full_response, pool_size)
+            record_exchange(owner, user_input, full_response, cache_model)
+        
+        processing_time = time.time() - generation.created_at
+        trace.add_ollama_stats(generation_stats)
+        completion_data = {
+            'done': True, 
+            'processing_time': f'{processing_time:.2f}s',
+            'timings': trace.to_dict()
+        }
+        
+        active_generations.patch(request_id, status="completed", end_time=time.time())
+        generation.append(completion_data)
+        
+    except Exception as e:
+        print(f"Streaming error: {e}")
+        active_generations.patch(request_id, status="failed", error=str(e))
+        generation.append({'error': str(e)})
+    finally:
+        if upstream is not None:
+            upstream.close()
+        # A stopped stream has no final stats; charge roughly what was generated
+        rate_limiter.settle(rate_limit, generation_stats.get("eval_count", len(full_response) // 4))
+        generation.finish()
+
+@bp.route("/chat/cancel", methods=["POST"])
+def cancel_generation():
+    """Stop a streamed generation by the id in its SSE event ids."""
+    request_id = (request.json or {}).get("request_id", "")
+    generation = stream_buffers.get(request_id) if request_id else None
+    if generation is None:
+        return jsonify({"error": "Generation not found on this worker"}), 404
+    if generation.done:
+        return jsonify({"success": False, "status": "finished"})
+    generation.cancel()
+    return jsonify({"success": True})
+
+@bp.route("/chat/compare", methods=["POST"])
+def compare_models():
+    """Stream one prompt's answers from several models at once.
+
+    Every chunk frame names its model. The final frame has each model's
+    time to first token, decode speed and memory footprint. Ollama queues
+    models it can't hold in memory together, which shows in their
+    first-token and load times.
+    """
+    if model is None or model_loading:
+        return jsonify({"error": "Ollama client is not ready"}), 503
+    payload = request.json or {}
+    user_input = payload.get("message", "")
+    models = payload.get("models")
+    if not user_input:
+        return jsonify({"error": "Message is required"}), 400
+    if (not isinstance(models, list) or not all(isinstance(m, str) and m for m in models)
+            or len(set(models)) != len(models)):
+        return jsonify({"error": "models must be a list of distinct model names"}), 400
+    if not 2 <= len(models) <= MAX_COMPARE_MODELS:
+        return jsonify({"error": f"Compare between 2 and {MAX_COMPARE_MODELS} models"}), 400
+    try:
+        tier, gen_options, _, _ = generation_settings(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    rate_limit = rate_limiter.acquire(rate_limiter.client_key(request), gen_options["max_tokens"] * len(models))
+    g.rate_limit = rate_limit
+    if not rate_limit.allowed:
+        return jsonify({
+            "error": "Rate limit exceeded. Please wait before sending another request.",
+            "retry_after": round(rate_limit.retry_after, 1)
+        }), 429
+    prompt, sources = retrieve_context(user_input, payload.get("use_documents", RAG_DEFAULT))
+    
+    model_state["last_used"] = time.time()
+    request_id = uuid.uuid4().hex
+    active_generations[request_id] = {"status": "processing", "start_time": time.time(), "worker": WORKER_ID,
+                                      "models": models}
+    generation = stream_buffers.create(request_id)
+    if sources:
+        generation.append({'sources': sources})
+    threading.Thread(
+        target=run_comparison,
+        args=(generation, request_id, prompt, models, gen_options, rate_limit),
+        daemon=True
+    ).start()
+    return Response(stream_generation_events(generation), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+def run_comparison(generation, request_id, prompt, models, gen_options, rate_limit):
+    """Stream every model's answer into one buffer concurrently, then append their metrics."""
+    results = {}
+    
+    def run_one(compare_model):
+        stats = {}
+        start = time.perf_counter()
+        first_token = None
+        error = None
+        upstream = None
+        try:
+            upstream = model.stream(prompt, stats=stats, **dict(gen_options, model=compare_model))
+            for chunk in upstream:
+                if generation.should_stop(stream_buffers.ttl):
+                    error = "cancelled"
+                    break
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    if chunk.startswith("Error:") and "eval_count" not in stats:
+                        error = chunk[len("Error:"):].strip()
+                generation.append({'model': compare_model, 'chunk': chunk})
+        except Exception as e:
+            # One failing model must not take the others' results down with it
+            print(f"Comparison error for {compare_model}: {e}")
+            error = str(e)
+        finally:
+            if upstream is not None:
+                upstream.close()
+        eval_seconds = stats.get("eval_duration", 0) / 1e9
+        results[compare_model] = {
+            "model": compare_model,
+            "error": error,
+            "ttft_ms": round((first_token - start) * 1000, 1) if first_token else None,
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+            "tokens": stats.get("eval_count", 0),
+            "tokens_per_second": round(stats["eval_count"] / eval_seconds, 1) if eval_seconds else None,
+            "load_ms": round(stats.get("load_duration", 0) / 1e6, 1),
+            "prefill_ms": round(stats.get("prompt_eval_duration", 0) / 1e6, 1)
+        }
+    
+    status = "failed"
+    try:
+        threads = [threading.Thread(target=run_one, args=(m,), daemon=True) for m in models]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # A model Ollama already unloaded to make room for another reports no footprint
+        running = {normalize_model_name(m["name"]): m for m in model.running_models()}
+        for compare_model, result in results.items():
+            loaded = running.get(normalize_model_name(compare_model))
+            result["memory"] = {"size": loaded.get("size"), "size_vram": loaded.get("size_vram")} if loaded else None
+        generation.append({'done': True, 'results': results})
+        status = "completed"
+    except Exception as e:
+        print(f"Comparison error: {e}")
+        generation.append({'error': str(e)})
+    finally:
+        rate_limiter.settle(rate_limit, sum(r["tokens"] for r in results.values()))
+        active_generations.patch(request_id, status=status, end_time=time.time())
+        generation.finish()
+
+def stream_generation_events(generation, after=0):
+    """Yield SSE frames from a generation buffer, starting after sequence ``after``."""
+    generation.attach()
+    try:
+        while True:
+            events, done = generation.read(after, timeout=15)
+            for seq, payload in events:
+                yield generation.format_event(seq, payload)
+                after = seq
+            if done and after + 1 >= generation.next_seq:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+    finally:
+        generation.detach()
+
+@bp.route("/chat/stream", methods=["GET"])
+def resume_stream():
+    """Resume a streamed generation from the SSE Last-Event-ID."""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id", "")
+    generation_id, after = GenerationBufferRegistry.parse_event_id(last_event_id)
+    if not generation_id:
+        return jsonify({"error": "A valid Last-Event-ID is required"}), 400
+    
+    generation = stream_buffers.get(generation_id)
+    if generation is None:
+        return jsonify({"error": "Generation not found or expired"}), 404
+    if not generation.can_resume(after):
+        return jsonify({"error": "Resume point is no longer buffered"}), 410
+    
+    return Response(stream_generation_events(generation, after), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@bp.route("/embed", methods=["POST"])
+def embed():
+    """Embed one or more texts, batched with concurrent requests.
+
+    Returns JSON by default. With "format": "binary" or an
+    ``Accept: application/octet-stream`` header the vectors are returned as
+    a little-endian float32 matrix, preceded by uint32 count and dimension.
+    """
+    if model is None:
+        return jsonify({"error": "Ollama client not initialized"}), 503
+    
+    texts = request.json.get("input", [])
+    if isinstance(texts, str):
+        texts = [texts]
+    if not texts or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "Input must be a string or a list of strings"}), 400
+    embed_model = request.json.get("model", EMBED_MODEL)
+    
+    try:
+        vectors = embedding_batcher.embed(embed_model, texts)
+    except Exception as e:
+        print(f"Embedding error: {e}")
+        return jsonify({"error": str(e)}), 502
+    
+    wants_binary = (request.json.get("format") == "binary" or
+                    request.accept_mimetypes.best == "application/octet-stream")
+    if wants_binary:
+        try:
+            matrix = np.asarray(vectors, dtype="<f4")
+        except ValueError:
+            # Vectors of different lengths can't form a matrix
+            matrix = None
+        if matrix is None or matrix.ndim != 2 or len(matrix) != len(texts) or not matrix.shape[1]:
+            shape = "ragged vectors" if matrix is None else f"shape {matrix.shape}"
+            return jsonify({"error": f"Expected {len(texts)} embeddings of one dimension, got {shape}"}), 502
+        header = np.asarray(matrix.shape, dtype="<u4").tobytes()
+        return Response(header + matrix.tobytes(), mimetype="application/octet-stream", headers={
+            "X-Embedding-Count": str(matrix.shape[0]),
+            "X-Embedding-Dim": str(matrix.shape[1])
+        })
+    
+    return jsonify({"model": embed_model, "embeddings": vectors})
+
+@bp.route("/documents", methods=["GET"])
+def list_documents():
+    """List indexed documents."""
+    if document_index is None:
+        return jsonify({"error": "Document index not initialized"}), 503
+    return jsonify({
+        "documents": [{"source": source, "chunks": len(doc["rows"]), "mtime": doc.get("mtime")}
+                      for source, doc in document_index.documents.items()],
+        **document_index.stats()
+    })
+
+@bp.route("/documents/ingest", methods=["POST"])
+def ingest_documents():
+    """Index files or directories under DOCUMENTS_ROOT, or a posted text under a source name.
+
+    Admin only. Relative paths are taken from DOCUMENTS_ROOT, and anything
+    resolving outside it is rejected.
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Admin access required"}), 403
+    if document_index is None or model is None:
+        return jsonify({"error": "Document index not initialized"}), 503
+    
+    paths = request.json.get("paths", [])
+    text = request.json.get("text")
+    if not paths and text is None:
+        return jsonify({"error": "Provide 'paths' or 'source' and 'text'"}), 400
+    
+    results = []
+    try:
+        for path in paths:
+            full_path = os.path.join(DOCUMENTS_ROOT, path)
+            if not is_within(full_path, DOCUMENTS_ROOT):
+                return jsonify({"error": f"Path is outside the documents root: {path}"}), 403
+            if not os.path.exists(full_path):
+                return jsonify({"error": f"Path not found: {path}"}), 404
+            results.extend(document_index.ingest_path(full_path, root=DOCUMENTS_ROOT))
+        if text is not None:
+            source = request.json.get("source")
+            if not source:
+                return jsonify({"error": "'source' is required with 'text'"}), 400
+            results.append(document_index.ingest_text(source, text))
+    except Exception as e:
+        print(f"Ingestion error: {e}")
+        return jsonify({"error": str(e), "ingested": results}), 500
+    
+    return jsonify({"ingested": results, **document_index.stats()})
+
+@bp.route("/documents/delete", methods=["POST"])
+def delete_document():
+    """Remove a document's chunks from the index. Admin only."""
+    if not is_admin_request():
+        return jsonify({"error": "Admin access required"}), 403
+    if document_index is None:
+        return jsonify({"error": "Document index not initialized"}), 503
+    source = request.json.get("source", "")
+    if not document_index.remove(source):
+        return jsonify({"error": f"Document not indexed: {source}"}), 404
+    return jsonify({"success": True, **document_index.stats()})
+
+def page_limit(default, maximum=200):
+    try:
+        return min(max(1, int(request.args.get("limit", default))), maximum)
+    except ValueError:
+        return default
+
+HISTORY_OWNER_REQUIRED = "Send a configured API key or an X-Client-Id header to use chat history"
+
+@bp.route("/history/conversations", methods=["GET"])
+def list_conversations():
+    """Page through the caller's conversations, most recently updated first."""
+    owner = history_owner()
+    if owner is None:
+        return jsonify({"error": HISTORY_OWNER_REQUIRED}), 401
+    before = request.args.get("before", type=float)
+    conversations, next_before = chat_history.conversations(before, page_limit(20), owner=owner)
+    return jsonify({"conversations": conversations, "next_before": next_before})
+
+@bp.route("/history/conversations", methods=["POST"])
+def create_conversation():
+    owner = history_owner()
+    if owner is None:
+        return jsonify({"error": HISTORY_OWNER_REQUIRED}), 401
+    conversation = chat_history.create_conversation((request.json or {}).get("title", ""), owner=owner)
+    return jsonify(conversation), 201
+
+@bp.route("/history/conversations/<conversation_id>/messages", methods=["GET"])
+def conversation_messages(conversation_id):
+    """Page through a conversation's messages, newest first; pass ``next_before`` back as ``before``."""
+    owner = history_owner()
+    if owner is None:
+        return jsonify({"error": HISTORY_OWNER_REQUIRED}), 401
+    if chat_history.owner_of(conversation_id) != owner:
+        return jsonify({"error": "Conversation not found"}), 404
+    before = request.args.get("before", type=int)
+    messages, next_before = chat_history.messages(conversation_id, before, page_limit(50))
+    return jsonify({"messages": messages, "next_before": next_before})
+
+@bp.route("/history/conversations/<conversation_id>/messages", methods=["POST"])
+def append_message(conversation_id):
+    """Append a single message to a conversation."""
+    owner = history_owner()
+    if owner is None:
+        return jsonify({"error": HISTORY_OWNER_REQUIRED}), 401
+    role = request.json.get("role", "")
+    content = request.json.get("content", "")
+    if not isinstance(content, str) or not content:
+        return jsonify({"error": "Message content is required"}), 400
+    try:
+        message = chat_history.append(conversation_id, role, content, owner=owner)
+    except KeyError:
+        return jsonify({"error": "Conversation not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(message), 201
+
+@bp.route("/history/search", methods=["GET"])
+def search_history():
+    """Rank past prompt/response pairs against ``q``, with matches marked in [brackets]."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required"}), 400
+    owner = history_owner()
+    if owner is None:
+        return jsonify({"error": HISTORY_OWNER_REQUIRED}), 401
+    if not chat_history.search_enabled:
+        return jsonify({"error": "Full-text search is not available in this SQLite build"}), 501
+    start_time = time.time()
+    results = chat_history.search(query, page_limit(20, maximum=100), owner=owner)
+    return jsonify({
+        "query": query,
+        "results": results,
+        "search_time": f"{(time.time() - start_time) * 1000:.1f}ms"
+    })
+
+@bp.route("/history/conversations/<conversation_id>", methods=["DELETE"])
+def delete_conversation(conversation_id):
+    owner = history_owner()
+    if owner is None:
+        return jsonify({"error": HISTORY_OWNER_REQUIRED}), 401
+    if not chat_history.delete_conversation(conversation_id, owner=owner):
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify({"success": True})
+
+@bp.route("/status", methods=["GET"])
 def status():
     global model, model_loading, model_error
     
@@ -391,7 +1116,7 @@ def status():
             to_remove.append(req_id)
     
     for req_id in to_remove:
-        del active_generations[req_id]
+        active_generations.pop(req_id, None)
     
     available_models = []
     if model:
@@ -402,12 +1127,23 @@ def status():
             print(f"Error fetching model list: {e}")
     
     status_info = {
-        "model": model_name,
+        "model": current_model_name(),
+        "worker": WORKER_ID,
         "status": "loading" if model_loading else ("ready" if model else "not loaded"),
+        "phase": model_state["phase"],
         "active_generations": len(active_generations),
+        "buffered_streams": len(stream_buffers),
         "fast_mode": FAST_MODE,
+        "performance_tier": tier_selector.stats(),
+        "deterministic_default": DETERMINISTIC_DEFAULT,
+        "sample_pool_size": SAMPLE_POOL_SIZE,
         "available_models": available_models,
-        "server": ollama_server
+        "server": ollama_server,
+        "ollama_pool": model.pool_stats() if model else {},
+        "ollama_process": ollama_supervisor.stats() if ollama_supervisor else {"managed": False},
+        "embeddings": embedding_batcher.stats() if embedding_batcher else {},
+        "documents": document_index.stats() if document_index else {},
+        "history_index": exchange_writer.stats() if exchange_writer else {}
     }
     
     if model_error:
@@ -415,7 +1151,7 @@ def status():
     
     return jsonify(status_info)
 
-@app.route("/models", methods=["GET"])
+@bp.route("/models", methods=["GET"])
 def list_models():
     global model
     
@@ -430,7 +1166,7 @@ def list_models():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/change_model", methods=["POST"])
+@bp.route("/change_model", methods=["POST"])
 def change_model():
     global model, model_name
     
@@ -446,43 +1182,101 @@ def change_model():
     try:
         model.model_name = new_model
         model_name = new_model
+        shared_settings.set("model_name", new_model)
         return jsonify({"success": True, "model": new_model})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/models/list", methods=["GET"])
+def catalog_response(payload, etag):
+    """JSON response that clients can revalidate with If-None-Match."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers=headers)
+    response = jsonify(payload)
+    response.headers.update(headers)
+    return response
+
+@bp.route("/models/list", methods=["GET"])
 def list_available_models():
     """Return the list of available models from ollama_models.json"""
     try:
-        with open("ollama_models.json", "r", encoding="utf-8") as f:
-            models_data = json.load(f)
-        return jsonify({"models": models_data})
+        model_catalog.refresh()
+        return catalog_response({"models": model_catalog.models}, model_catalog.etag)
     except Exception as e:
         print(f"Error loading models list: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/models/download", methods=["POST"])
+@bp.route("/models/search", methods=["GET"])
+def search_catalog():
+    """Search the model catalog by name/description tokens and categories.
+
+    Query parameters: ``q``, repeated ``category``, ``page`` and ``per_page``.
+    """
+    query = request.args.get("q", "")
+    categories = sorted(set(request.args.getlist("category")))
+    unknown = [c for c in categories if c not in MODEL_CATEGORIES]
+    if unknown:
+        return jsonify({"error": f"Unknown categories: {', '.join(unknown)}",
+                        "categories": list(MODEL_CATEGORIES)}), 400
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        per_page = min(max(1, int(request.args.get("per_page", 20))), 100)
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+    
+    try:
+        model_catalog.refresh()
+    except Exception as e:
+        print(f"Error loading models list: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    etag = model_catalog.search_etag(query.strip().lower(), categories, page, per_page)
+    if etag in request.headers.get("If-None-Match", ""):
+        return catalog_response(None, etag)
+    
+    total, models = model_catalog.search(query, categories, offset=(page - 1) * per_page, limit=per_page)
+    return catalog_response({
+        "query": query,
+        "categories": categories,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page,
+        "models": models
+    }, etag)
+
+# Holds the id of the download in progress, so starting one is a single atomic step across workers
+DOWNLOAD_CLAIM_NAMESPACE = "download_claim"
+
+@bp.route("/models/download", methods=["POST"])
 def download_model():
     """Start downloading a model using ollama pull"""
     model_name = request.json.get("model")
     if not model_name:
         return jsonify({"error": "Model name is required"}), 400
     
-    active_downloads = [d for d in model_downloads.values() if d.get("status") == "downloading"]
-    if active_downloads:
+    download_id = f"dl_{uuid.uuid4().hex}"
+    
+    def claim(current):
+        # Runs inside the backend's transaction, so two workers can't both start a download
+        running = model_downloads.get(current) if current else None
+        if running and running.get("status") == "downloading":
+            return current
+        model_downloads[download_id] = {
+            "model": model_name,
+            "status": "downloading",
+            "progress": 0,
+            "start_time": time.time()
+        }
+        return download_id
+    
+    holder = state_backend.modify(DOWNLOAD_CLAIM_NAMESPACE, "active", claim)
+    if holder != download_id:
         return jsonify({
             "error": "Another download is already in progress", 
-            "current_download": active_downloads[0]
+            "current_download": model_downloads.get(holder)
         }), 409
     
-    download_id = f"dl_{time.time()}"
-    model_downloads[download_id] = {
-        "model": model_name,
-        "status": "downloading",
-        "progress": 0,
-        "start_time": time.time()
-    }
-    
     download_thread = threading.Thread(
         target=download_model_thread,
         args=(download_id, model_name)
@@ -518,7 +1312,7 @@ def download_model_thread(download_id, model_name):
                     try:
                         progress_str = line.split("%")[0].split(" ")[-1].strip()
                         progress = float(progress_str)
-                        model_downloads[download_id]["progress"] = progress
+                        model_downloads.patch(download_id, progress=progress)
                     except ValueError:
                         print(f"Could not parse progress from line: {line.strip()}")
                 
@@ -531,21 +1325,40 @@ def download_model_thread(download_id, model_name):
         return_code = process.wait()
         
         if return_code == 0:
-            model_downloads[download_id]["status"] = "completed"
-            model_downloads[download_id]["progress"] = 100
+            model_downloads.patch(download_id, status="completed", progress=100)
+            response_cache.refresh_digests()
             print(f"Download of {model_name} completed successfully")
         else:
-            model_downloads[download_id]["status"] = "failed"
-            model_downloads[download_id]["error"] = f"Process exited with code {return_code}"
+            model_downloads.patch(download_id, status="failed", error=f"Process exited with code {return_code}")
             print(f"Download of {model_name} failed with code {return_code}")
     
     except Exception as e:
-        model_downloads[download_id]["status"] = "failed"
-        model_downloads[download_id]["error"] = f"Download error: {str(e)}"
+        model_downloads.patch(download_id, status="failed", error=f"Download error: {str(e)}")
         print(f"Error downloading model {model_name}: {e}")
         print(traceback.format_exc())
 
-@app.route("/models/download/status", methods=["GET"])
+@bp.route("/models/delete", methods=["POST"])
+def delete_model():
+    """Delete a downloaded model through the Ollama API and drop its cached responses"""
+    model_name = request.json.get("model")
+    if not model_name:
+        return jsonify({"error": "Model name is required"}), 400
+    
+    try:
+        response = requests.delete(
+            f"{ollama_server}/api/delete",
+            json={"model": model_name, "name": model_name},
+            timeout=OLLAMA_REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            return jsonify({"error": f"Ollama API returned status code {response.status_code}"}), response.status_code
+        response_cache.invalidate_model(model_name)
+        return jsonify({"success": True, "model": model_name})
+    except Exception as e:
+        print(f"Error deleting model {model_name}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/models/download/status", methods=["GET"])
 def get_download_status():
     """Get the status of all model downloads"""
     current_time = time.time()
@@ -555,29 +1368,59 @@ def get_download_status():
             to_remove.append(dl_id)
     
     for dl_id in to_remove:
-        del model_downloads[dl_id]
+        model_downloads.pop(dl_id, None)
     
-    return jsonify({"downloads": model_downloads})
+    return jsonify({"downloads": model_downloads.to_dict()})
 
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 def health_check():
     return jsonify({
         "status": "Server is running", 
         "model_status": "loading" if model_loading else ("ready" if model else "not loaded"),
-        "model": model_name,
+        "model": current_model_name(),
         "ollama_server": ollama_server
     })
 
-@app.route("/frontend/<path:path>")
+@bp.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness probe: the process is up and serving requests."""
+    return jsonify({"status": "alive", "phase": model_state["phase"]})
+
+@bp.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness probe: the selected model can be used for generation."""
+    if model_loading or model is None:
+        return jsonify({
+            "status": "not ready",
+            "phase": model_state["phase"],
+            "error": model_error
+        }), 503
+    
+    model_name = current_model_name()
+    available_models = [m["name"] for m in model.list_models()]
+    if not available_models:
+        # An empty list is also what list_models returns when the request failed
+        if not is_ollama_running(timeout=OLLAMA_REQUEST_TIMEOUT):
+            return jsonify({"status": "not ready", "reason": "Ollama server unreachable"}), 503
+        return jsonify({"status": "not ready", "reason": "No models are installed in Ollama"}), 503
+    if model_name not in available_models and f"{model_name}:latest" not in available_models:
+        return jsonify({"status": "not ready", "reason": f"Model '{model_name}' is not downloaded"}), 503
+    
+    return jsonify({"status": "ready", "model": model_name})
+
+@bp.route("/frontend/<path:path>")
 def serve_frontend(path):
-    return send_from_directory("../frontend", path)
+    response = static_assets.serve(path)
+    if response is None:
+        abort(404)
+    return response
     
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>")
+@bp.route("/", defaults={"path": ""})
+@bp.route("/<path:path>")
 def catch_all(path):
-    return send_file("../frontend/static/index.html")
+    return static_assets.serve("static/index.html")
 
-@app.route("/models/available", methods=["GET"])
+@bp.route("/models/available", methods=["GET"])
 def available_models():
     """Return the list of available models directly from Ollama API"""
     try:
@@ -587,29 +1430,112 @@ def available_models():
         print(f"Error loading models list: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/models/current", methods=["GET"])
+@bp.route("/models/current", methods=["GET"])
 def get_current_model():
     """Return the currently loaded model"""
-    return jsonify({"model": model_name})
+    return jsonify({"model": current_model_name()})
 
 def keep_model_warm():
     """Periodically ping the model to keep it loaded in memory"""
     while True:
         try:
-            time.sleep(300)
+            time.sleep(KEEP_WARM_INTERVAL)
+            
+            # Outlive the sleep so the holder renews the lease before another worker can take it
+            if not state_backend.acquire_lease("keep-warm", WORKER_ID, ttl=KEEP_WARM_INTERVAL * 2):
+                continue
             
             if model_state["loaded"] and (time.time() - model_state["last_used"]) > 600:
-                print("Keeping model warm with test request...")
-                model.infer("Hello", max_tokens=10)
+                print("Keeping model warm...")
+                model.load(current_model_name())
                 model_state["last_used"] = time.time()
                 
         except Exception as e:
             print(f"Error in keep_model_warm: {e}")
 
-warming_thread = threading.Thread(target=keep_model_warm, daemon=True)
-warming_thread.start()
+_background_started = False
+_background_lock = RLock()
+
+def start_background_tasks():
+    """Start this process's loader and keep-warm threads, once per process."""
+    global _background_started, model_loading, loading_thread, warming_thread, embedding_batcher, document_index
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    
+    embedding_batcher = EmbeddingBatcher(
+        lambda embed_model, texts: model.embed(texts, model=embed_model),
+        max_batch_size=int(os.environ.get("EMBED_MAX_BATCH", "32")),
+        max_wait=float(os.environ.get("EMBED_MAX_WAIT_MS", "10")) / 1000,
+        cache_size=int(os.environ.get("EMBED_CACHE_SIZE", "10000"))
+    )
+    document_index = DocumentIndex(
+        RAG_INDEX_DIR,
+        lambda texts: embedding_batcher.embed(EMBED_MODEL, texts),
+        workers=int(os.environ.get("RAG_EMBED_WORKERS", "4"))
+    )
+    
+    print("Starting Ollama client in background...")
+    model_loading = True
+    loading_thread = threading.Thread(target=load_model_async)
+    loading_thread.daemon = True
+    loading_thread.start()
+    
+    warming_thread = threading.Thread(target=keep_model_warm, daemon=True)
+    warming_thread.start()
+    
+    threading.Thread(target=refresh_model_lists, daemon=True).start()
+
+def configure_shared_state(backend):
+    """Point the response cache, rate limits, generation and download records at ``backend``."""
+    global state_backend, response_cache, active_generations, model_downloads, shared_settings
+    state_backend = backend
+    rate_limiter.backend = backend
+    response_cache = ModelResponseCache(
+        backend,
+        fetch_tags=lambda: fetch_available_models()[0],
+        default_timeout=600
+    )
+    active_generations = SharedRecords(backend, "generations")
+    model_downloads = SharedRecords(backend, "downloads")
+    shared_settings = SharedCache(backend, "settings", default_timeout=0)
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """Build the Flask app and start this process's background work.
+
+    With STATE_BACKEND=sqlite every worker process shares its response cache,
+    generation and download records and model selection through one SQLite
+    database, so the app can run under a multi-process server, e.g.
+    ``gunicorn -w 4 --threads 8 'chat_handler:create_app()'``.
+    """
+    global chat_history, exchange_writer
+    app = Flask(__name__)
+    app.config['KEEP_ALIVE_TIMEOUT'] = 120
+    app.config['STATE_BACKEND'] = os.environ.get("STATE_BACKEND", "memory")
+    app.config['STATE_DB_PATH'] = os.environ.get("STATE_DB_PATH", "chat_state.db")
+    app.config['HISTORY_DB_PATH'] = os.environ.get("HISTORY_DB_PATH", "chat_history.db")
+    app.config['START_BACKGROUND_TASKS'] = True
+    if config:
+        app.config.update(config)
+    
+    CORS(app)
+    configure_shared_state(create_state_backend(app.config['STATE_BACKEND'], app.config['STATE_DB_PATH']))
+    chat_history = ChatHistoryStore(app.config['HISTORY_DB_PATH'])
+    exchange_writer = ExchangeIndexWriter(
+        chat_history,
+        batch_size=int(os.environ.get("HISTORY_INDEX_BATCH", "64")),
+        max_wait=float(os.environ.get("HISTORY_INDEX_WAIT_MS", "1000")) / 1000
+    )
+    app.register_blueprint(bp)
+    
+    if app.config['START_BACKGROUND_TASKS']:
+        start_background_tasks()
+    return app
 
 if __name__ == "__main__":
+    app = create_app()
+    
     print("\n" + "="*60)
     print("STARTING FLASK SERVER ON PORT 5000")
     print("="*60)
@@ -0,0 +1,271 @@
+import os
+import time
+import uuid
+import queue
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("chat_history")
+
+ROLES = ("user", "assistant", "system")
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+class ChatHistoryStore:
+    """Conversations and their messages in SQLite, appended one message at a time.
+
+    Pages are read newest first with keyset cursors (``before``), so loading
+    an older page costs the same however long the conversation is. Every
+    conversation and indexed exchange records the ``owner`` that created it,
+    and listings and searches given an owner only return that owner's rows.
+    """
+
+    def __init__(self, path: str = "chat_history.db"):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id, id);
+        """)
+        if "owner" not in self._columns(conn, "conversations"):
+            conn.execute("ALTER TABLE conversations ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        conn.execute("DROP INDEX IF EXISTS conversations_updated")
+        conn.execute("CREATE INDEX IF NOT EXISTS conversations_owner_updated ON conversations (owner, updated_at)")
+        try:
+            self._create_exchanges(conn)
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search disabled, SQLite was built without FTS5: {e}")
+            self.search_enabled = False
+
+    @staticmethod
+    def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    def _create_exchanges(self, conn: sqlite3.Connection):
+        legacy = self._columns(conn, "exchanges")
+        if legacy and "owner" not in legacy:
+            # FTS5 tables can't gain columns; rebuild, leaving old exchanges ownerless
+            conn.execute("ALTER TABLE exchanges RENAME TO exchanges_legacy")
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS exchanges USING fts5(
+                prompt, response, model UNINDEXED, created_at UNINDEXED, owner UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        """)
+        if legacy and "owner" not in legacy:
+            conn.execute("""
+                INSERT INTO exchanges (prompt, response, model, created_at, owner)
+                SELECT prompt, response, model, created_at, '' FROM exchanges_legacy
+            """)
+            conn.execute("DROP TABLE exchanges_legacy")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create_conversation(self, title: str = "", owner: str = "") -> Dict[str, Any]:
+        now = time.time()
+        conversation = {"id": uuid.uuid4().hex, "title": title, "created_at": now, "updated_at": now}
+        self._connection().execute(
+            "INSERT INTO conversations (id, title, created_at, updated_at, owner) "
+            "VALUES (:id, :title, :created_at, :updated_at, :owner)",
+            dict(conversation, owner=owner)
+        )
+        return conversation
+
+    def owner_of(self, conversation_id: str) -> Optional[str]:
+        """Return the conversation's owner, or None if it doesn't exist."""
+        row = self._connection().execute(
+            "SELECT owner FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return row["owner"] if row else None
+
+    def append(self, conversation_id: str, role: str, content: str, owner: str = "") -> Dict[str, Any]:
+        """Add one message, creating the conversation on first use.
+
+        Raises KeyError if the conversation belongs to another owner.
+        """
+        if role not in ROLES:
+            raise ValueError(f"Role must be one of {', '.join(ROLES)}")
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute("SELECT owner FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if existing is not None and existing["owner"] != owner:
+                raise KeyError(conversation_id)
+            # The first user message becomes the conversation's title
+            conn.execute("""
+                INSERT INTO conversations (id, title, created_at, updated_at, owner) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    updated_at = excluded.updated_at,
+                    title = CASE WHEN conversations.title = '' THEN excluded.title ELSE conversations.title END
+            """, (conversation_id, content[:80] if role == "user" else "", now, now, owner))
+            cursor = conn.execute(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"id": cursor.lastrowid, "conversation_id": conversation_id, "role": role,
+                "content": content, "created_at": now}
+
+    def messages(self, conversation_id: str, before: Optional[int] = None,
+                 limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to ``limit`` messages older than ``before``, newest first, and the next cursor."""
+        rows = self._connection().execute("""
+            SELECT id, role, content, created_at FROM messages
+            WHERE conversation_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+        """, (conversation_id, before if before is not None else 2 ** 63 - 1, limit + 1)).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        return page, (page[-1]["id"] if len(rows) > limit else None)
+
+    def conversations(self, before: Optional[float] = None, limit: int = 20,
+                      owner: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """Return conversations updated before ``before``, most recent first, and the next cursor."""
+        rows = self._connection().execute("""
+            SELECT c.id, c.title, c.created_at, c.updated_at,
+                   (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id) AS message_count
+            FROM conversations c
+            WHERE c.updated_at < ? AND (? IS NULL OR c.owner = ?)
+            ORDER BY c.updated_at DESC LIMIT ?
+        """, (before if before is not None else float("inf"), owner, owner, limit + 1)).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        return page, (page[-1]["updated_at"] if len(rows) > limit else None)
+
+    def delete_conversation(self, conversation_id: str, owner: Optional[str] = None) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM conversations WHERE id = ? AND (? IS NULL OR owner = ?)", (conversation_id, owner, owner)
+        )
+        return cursor.rowcount > 0
+
+    def add_exchanges(self, exchanges: List[Tuple[str, str, str, float, str]]):
+        """Index (prompt, response, model, created_at, owner) rows in one transaction."""
+        if not self.search_enabled or not exchanges:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO exchanges (prompt, response, model, created_at, owner) VALUES (?, ?, ?, ?, ?)",
+                exchanges
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def search(self, query: str, limit: int = 20, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return the best-matching prompt/response pairs, each with highlighted snippets."""
+        match = fts_query(query)
+        if not self.search_enabled or not match:
+            return []
+        rows = self._connection().execute("""
+            SELECT rowid AS id, model, created_at,
+                   snippet(exchanges, 0, '[', ']', '…', 16) AS prompt,
+                   snippet(exchanges, 1, '[', ']', '…', 32) AS response,
+                   bm25(exchanges, 2.0, 1.0) AS score
+            FROM exchanges WHERE exchanges MATCH ? AND (? IS NULL OR owner = ?)
+            ORDER BY score LIMIT ?
+        """, (match, owner, owner, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class ExchangeIndexWriter:
+    """Indexes completed prompt/response pairs off the request path.
+
+    ``add`` only queues the pair. A single worker thread waits for the first
+    pending pair, collects more for up to ``max_wait`` seconds or until
+    ``batch_size`` are queued, and writes them in one transaction.
+    """
+
+    def __init__(self, store: ChatHistoryStore, batch_size: int = 64, max_wait: float = 1.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batches_written = 0
+        self.exchanges_written = 0
+        self._queue: "queue.Queue[Tuple[str, str, str, float, str]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def add(self, prompt: str, response: str, model: str = "", owner: str = ""):
+        self._queue.put((prompt, response, model, time.time(), owner))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything queued so far is written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                self._queue.all_tasks_done.wait(remaining)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize(),
+            "batches_written": self.batches_written,
+            "exchanges_written": self.exchanges_written
+        }
+
+    def _collect_batch(self) -> List[Tuple[str, str, str, float, str]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self.store.add_exchanges(batch)
+                self.batches_written += 1
+                self.exchanges_written += len(batch)
+            except Exception as e:
+                logger.error(f"Failed to index {len(batch)} exchanges: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
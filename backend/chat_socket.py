@@ -0,0 +1,163 @@
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("chat_socket")
+
+# Server frames are JSON arrays: [type, generation_id] or [type, generation_id, payload]
+TOKEN = "t"
+SOURCES = "s"
+DONE = "d"
+ERROR = "e"
+CANCELLED = "c"
+PAUSED = "p"
+RESUMED = "r"
+
+
+class SocketGeneration:
+    """One generation running on a socket, with its cancel and pause flags."""
+
+    def __init__(self, generation_id: str):
+        self.id = generation_id
+        self.cancelled = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self._on_cancel: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run ``callback`` when the generation is cancelled, or now if it already is."""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._on_cancel.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            callbacks, self._on_cancel = self._on_cancel, []
+        self.running.set()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Cancel callback of generation {self.id} failed: {e}")
+
+
+GenerateFn = Callable[[Dict[str, Any], SocketGeneration], Iterator[Tuple[str, Any]]]
+
+
+class ChatSocketSession:
+    """Multiplexes chat generations over one WebSocket connection.
+
+    Clients send JSON objects: ``{"op": "chat", "id": ..., "message": ...}``
+    starts a generation and ``{"op": "cancel" | "pause" | "resume", "id": ...}``
+    controls one. Each generation runs on its own thread, reading frames from
+    ``generate_fn(message, generation)``, which registers ``on_cancel``
+    callbacks to cut its upstream Ollama request off immediately, even while
+    the thread is blocked waiting for the first token. Pausing stops reading
+    the generator, so the upstream stream stalls on backpressure until
+    resumed; a generation paused for longer than ``pause_timeout`` seconds
+    (0 for no limit) is cancelled so it doesn't hold an Ollama slot forever.
+    """
+
+    def __init__(self, send: Callable[[str], None], generate_fn: GenerateFn, max_active: int = 4,
+                 pause_timeout: float = 120):
+        self._send = send
+        self.generate_fn = generate_fn
+        self.max_active = max_active
+        self.pause_timeout = pause_timeout
+        self.generations: Dict[str, SocketGeneration] = {}
+        self.closed = False
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def send(self, frame_type: str, generation_id: Optional[str], payload: Any = None):
+        frame = [frame_type, generation_id] if payload is None else [frame_type, generation_id, payload]
+        data = json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+        with self._send_lock:
+            if self.closed:
+                return
+            try:
+                self._send(data)
+            except Exception:
+                self.closed = True
+                raise
+
+    def handle(self, raw: str):
+        """Dispatch one client message."""
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            self.send(ERROR, None, "Messages must be JSON objects")
+            return
+        if not isinstance(message, dict):
+            self.send(ERROR, None, "Messages must be JSON objects")
+            return
+        op = message.get("op")
+        generation_id = message.get("id")
+        generation_id = None if generation_id is None else str(generation_id)
+        if op == "chat":
+            self.start(generation_id, message)
+            return
+        if op not in ("cancel", "pause", "resume"):
+            self.send(ERROR, generation_id, f"Unknown op: {op}")
+            return
+        generation = self.generations.get(generation_id)
+        if generation is None:
+            self.send(ERROR, generation_id, "Unknown or finished generation")
+        elif op == "cancel":
+            generation.cancel()
+        elif op == "pause":
+            generation.running.clear()
+            self.send(PAUSED, generation_id)
+        else:
+            generation.running.set()
+            self.send(RESUMED, generation_id)
+
+    def start(self, generation_id: Optional[str], message: Dict[str, Any]):
+        with self._lock:
+            if not generation_id or generation_id in self.generations:
+                error = "Each generation needs a unique id"
+            elif len(self.generations) >= self.max_active:
+                error = f"At most {self.max_active} generations can run at once"
+            else:
+                error = None
+                generation = SocketGeneration(generation_id)
+                self.generations[generation_id] = generation
+        if error:
+            self.send(ERROR, generation_id, error)
+            return
+        threading.Thread(target=self._run, args=(generation, message), daemon=True).start()
+
+    def close(self):
+        """Stop every generation; called when the connection goes away."""
+        with self._send_lock:
+            self.closed = True
+        with self._lock:
+            generations = list(self.generations.values())
+        for generation in generations:
+            generation.cancel()
+
+    def _run(self, generation: SocketGeneration, message: Dict[str, Any]):
+        events = self.generate_fn(message, generation)
+        reason = None
+        try:
+            for frame_type, payload in events:
+                if not generation.running.wait(self.pause_timeout or None):
+                    reason = "Paused for too long"
+                    generation.cancel()
+                if generation.cancelled.is_set():
+                    break
+                self.send(frame_type, generation.id, payload)
+        except Exception as e:
+            logger.error(f"Socket generation {generation.id} failed: {e}")
+            self.send(ERROR, generation.id, str(e))
+        finally:
+            events.close()
+            with self._lock:
+                self.generations.pop(generation.id, None)
+        if generation.cancelled.is_set():
+            self.send(CANCELLED, generation.id, reason)
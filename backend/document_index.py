@@ -0,0 +1,318 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from threading import RLock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("document_index")
+
+TEXT_EXTENSIONS = {".txt", ".md", ".rst", ".py", ".js", ".html", ".css", ".json", ".csv", ".log"}
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """Split text into overlapping chunks, preferring paragraph and line breaks."""
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        if end < len(text):
+            # Break at the last paragraph, line or sentence end in the second half of the chunk
+            for separator in ("\n\n", "\n", ". "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def is_within(path: str, root: str) -> bool:
+    """Whether ``path`` resolves, symlinks included, to ``root`` or somewhere below it."""
+    real_root = os.path.realpath(root)
+    return os.path.commonpath([os.path.realpath(path), real_root]) == real_root
+
+
+def build_prompt(question: str, passages: List[Dict[str, Any]]) -> str:
+    """Prefix ``question`` with the retrieved passages."""
+    context = "\n\n".join(f"[{i}] ({p['source']})\n{p['text']}" for i, p in enumerate(passages, 1))
+    return ("Use the following excerpts from local documents to answer the question. "
+            "If they are not relevant, answer from your own knowledge.\n\n"
+            f"{context}\n\nQuestion: {question}")
+
+
+class DocumentIndex:
+    """Chunk embeddings of local documents in a memory-mapped float32 matrix.
+
+    ``vectors.f32`` holds one L2-normalized row per chunk and is mapped
+    rather than read at startup; ``manifest.json`` records each source's
+    content hash and rows, and the chunk texts live in a ``chunks.db``
+    SQLite table keyed by row, read only for search hits. Re-ingesting a
+    changed source frees its old rows and writes the new chunks into free
+    or appended rows, so the rest of the index is never rebuilt.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    MANIFEST_FILE = "manifest.json"
+    CHUNKS_FILE = "chunks.db"
+
+    def __init__(self, index_dir: str, embed_fn: Callable[[List[str]], List[List[float]]],
+                 chunk_size: int = 1000, chunk_overlap: int = 200,
+                 workers: int = 4, embed_batch_size: int = 16):
+        self.index_dir = index_dir
+        self.embed_fn = embed_fn
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch_size = embed_batch_size
+        self.vectors_path = os.path.join(index_dir, self.VECTORS_FILE)
+        self.manifest_path = os.path.join(index_dir, self.MANIFEST_FILE)
+        self.chunks_path = os.path.join(index_dir, self.CHUNKS_FILE)
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = RLock()
+        self._vectors: Optional[np.memmap] = None
+        self._manifest_mtime = None
+        os.makedirs(index_dir, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, source TEXT NOT NULL, text TEXT NOT NULL)"
+        )
+        self._load()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.chunks_path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write_chunks(self, released: List[int], chunks: List[Any]):
+        """Delete the texts of ``released`` rows and store ``(row, source, text)`` chunks in one transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in released])
+            conn.executemany("INSERT OR REPLACE INTO chunks (row, source, text) VALUES (?, ?, ?)", chunks)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _load(self):
+        """Read the manifest and map the vector file."""
+        with self._lock:
+            manifest = {}
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+            self.dim: Optional[int] = manifest.get("dim")
+            self.capacity: int = manifest.get("capacity", 0)
+            self.rows: int = manifest.get("rows", 0)
+            self.free: List[int] = manifest.get("free", [])
+            self.documents: Dict[str, Dict[str, Any]] = manifest.get("documents", {})
+            self.active = np.zeros(self.capacity, dtype=bool)
+            for doc in self.documents.values():
+                self.active[doc["rows"]] = True
+            self._vectors = None
+            if self.dim and self.capacity:
+                self._vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r+",
+                                          shape=(self.capacity, self.dim))
+            # Indexes written before the texts moved out of the manifest
+            legacy = manifest.get("chunks")
+            if legacy and self._vectors is not None:
+                self._write_chunks([], [(row, chunk[0], chunk[1]) for row, chunk in enumerate(legacy) if chunk])
+                self._save()
+
+    def _save(self):
+        self._vectors.flush()
+        manifest = {
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "rows": self.rows,
+            "free": self.free,
+            "documents": self.documents
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _reload_if_changed(self):
+        """Pick up ingestion done by another process."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._manifest_mtime:
+            self._load()
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity and self._vectors is not None:
+            return
+        new_capacity = max(needed, self.capacity * 2, 256)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "w+b") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r+", shape=(new_capacity, self.dim))
+        self.active = np.concatenate([self.active, np.zeros(new_capacity - len(self.active), dtype=bool)])
+        self.capacity = new_capacity
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in parallel batches and return normalized float32 rows."""
+        batches = [texts[i:i + self.embed_batch_size] for i in range(0, len(texts), self.embed_batch_size)]
+        vectors = [v for batch in self._executor.map(self.embed_fn, batches) for v in batch]
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got shape {matrix.shape}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _release(self, source: str) -> List[int]:
+        rows = self.documents.pop(source, {}).get("rows", [])
+        for row in rows:
+            self.active[row] = False
+            self.free.append(row)
+        return rows
+
+    def ingest_text(self, source: str, text: str, mtime: Optional[float] = None) -> Dict[str, Any]:
+        """Index ``text`` under ``source``, replacing its previous chunks if the content changed."""
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._reload_if_changed()
+            existing = self.documents.get(source)
+            if existing and existing["hash"] == content_hash:
+                if mtime is not None and existing.get("mtime") != mtime:
+                    existing["mtime"] = mtime
+                    self._save()
+                return {"source": source, "chunks": len(existing["rows"]), "updated": False}
+
+        chunks = chunk_text(text, self.chunk_size, self.chunk_overlap)
+        matrix = self._embed(chunks) if chunks else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        with self._lock:
+            if chunks:
+                if self.dim is None:
+                    self.dim = matrix.shape[1]
+                elif matrix.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match the index ({self.dim}); "
+                                     "use a new index directory after changing the embedding model")
+            released = self._release(source)
+            rows = []
+            for _ in chunks:
+                if self.free:
+                    rows.append(self.free.pop())
+                else:
+                    rows.append(self.rows)
+                    self.rows += 1
+            if rows:
+                self._ensure_capacity(self.rows)
+                self._vectors[rows] = matrix
+                self.active[rows] = True
+            self._write_chunks(released, [(row, source, chunk) for row, chunk in zip(rows, chunks)])
+            self.documents[source] = {"hash": content_hash, "mtime": mtime, "rows": rows}
+            if self._vectors is not None:
+                self._save()
+        logger.info(f"Indexed {source}: {len(chunks)} chunks")
+        return {"source": source, "chunks": len(chunks), "updated": True}
+
+    def ingest_file(self, path: str, root: Optional[str] = None) -> Dict[str, Any]:
+        """Index a text file, skipping it if its modification time is unchanged.
+
+        With ``root`` set the source is named by its path relative to it,
+        so server paths never reach clients.
+        """
+        full_path = os.path.abspath(path)
+        source = os.path.relpath(full_path, root).replace(os.sep, "/") if root else full_path
+        mtime = os.path.getmtime(full_path)
+        with self._lock:
+            self._reload_if_changed()
+            existing = self.documents.get(source)
+            if existing and existing.get("mtime") == mtime:
+                return {"source": source, "chunks": len(existing["rows"]), "updated": False}
+        if root and full_path in self.documents:
+            # Indexed before sources were made relative to the root
+            self.remove(full_path)
+        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        return self.ingest_text(source, text, mtime)
+
+    def ingest_path(self, path: str, root: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Index a file, or every text file under a directory.
+
+        With ``root`` set, files that resolve outside it (e.g. through a
+        symlink) are skipped.
+        """
+        if os.path.isfile(path):
+            return [self.ingest_file(path, root)]
+        results = []
+        for dirpath, _, files in os.walk(path):
+            for name in sorted(files):
+                file_path = os.path.join(dirpath, name)
+                if os.path.splitext(name)[1].lower() not in TEXT_EXTENSIONS:
+                    continue
+                if root and not is_within(file_path, root):
+                    logger.warning(f"Skipping {file_path}: it resolves outside {root}")
+                    continue
+                results.append(self.ingest_file(file_path, root))
+        return results
+
+    def remove(self, source: str) -> bool:
+        with self._lock:
+            self._reload_if_changed()
+            if source not in self.documents:
+                return False
+            self._write_chunks(self._release(source), [])
+            if self._vectors is not None:
+                self._save()
+            return True
+
+    def search(self, query_vector, k: int = 4, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """Return the ``k`` chunks with the highest cosine similarity to ``query_vector``."""
+        with self._lock:
+            self._reload_if_changed()
+            if self._vectors is None or not self.active[:self.rows].any():
+                return []
+            query = np.asarray(query_vector, dtype=np.float32)
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            scores = self._vectors[:self.rows] @ query
+            scores[~self.active[:self.rows]] = -np.inf
+            k = min(k, int(self.active[:self.rows].sum()))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = [int(row) for row in top[np.argsort(-scores[top])] if scores[row] >= min_score]
+            if not top:
+                return []
+            texts = {row: (source, text) for row, source, text in self._connection().execute(
+                f"SELECT row, source, text FROM chunks WHERE row IN ({','.join('?' * len(top))})", top
+            )}
+        return [{"source": texts[row][0], "text": texts[row][1], "score": float(scores[row])}
+                for row in top if row in texts]
+
+    def search_text(self, query: str, k: int = 4, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        return self.search(self.embed_fn([query])[0], k, min_score)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.documents),
+            "chunks": int(self.active[:self.rows].sum()) if self.rows else 0,
+            "dim": self.dim,
+            "capacity": self.capacity
+        }
+
+    def __len__(self):
+        return len(self.documents)
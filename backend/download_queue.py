@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import queue
+import shlex
+import logging
+import threading
+from threading import RLock
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from ollama_client import StreamAbort
+
+logger = logging.getLogger("download_queue")
+
+OLLAMA_SERVER = os.environ.get("OLLAMA_SERVER", "http://localhost:11434")
+# Longest silence between two pull events; Ollama sends none while it verifies a layer's digest
+PULL_READ_TIMEOUT = float(os.environ.get("PULL_READ_TIMEOUT", "900"))
+
+QUEUED, DOWNLOADING, COMPLETED, FAILED, CANCELLED = "queued", "downloading", "completed", "failed", "cancelled"
+
+
+def parse_pull_command(command: str) -> str:
+    """Return the model spec from 'ollama pull <model>' (or 'ollama run <model>', or a bare model)."""
+    parts = shlex.split(command)
+    if len(parts) == 3 and parts[0] == "ollama" and parts[1] in ("pull", "run"):
+        return parts[2]
+    if len(parts) == 1 and not parts[0].startswith("-"):
+        return parts[0]
+    raise ValueError(f"Expected 'ollama pull <model>', got: {command}")
+
+
+def stream_pull(model_name: str, timeout: float = PULL_READ_TIMEOUT,
+                abort: Optional[StreamAbort] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the JSON progress events of Ollama's streaming /api/pull.
+
+    The read timeout is long, since verifying the digest of a large layer
+    can take minutes. Setting ``abort`` from another thread shuts the
+    connection down, so a stalled pull stops without waiting for it.
+    """
+    with requests.post(f"{OLLAMA_SERVER}/api/pull", json={"model": model_name, "name": model_name, "stream": True},
+                       stream=True, timeout=(5, timeout)) as response:
+        if abort is not None:
+            abort.bind(response.raw.connection)
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama API returned status code {response.status_code}")
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+class Download:
+    """Progress of one queued pull, summed over the layers Ollama reports."""
+
+    def __init__(self, download_id: int, model_name: str):
+        self.id = download_id
+        self.model_name = model_name
+        self.state = QUEUED
+        self.status = "Queued"
+        self.completed = 0
+        self.total = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancelled = StreamAbort()
+        self._layers: Dict[str, List[int]] = {}
+
+    def apply(self, event: Dict[str, Any]):
+        """Fold one /api/pull event into the totals."""
+        if event.get("error"):
+            raise RuntimeError(event["error"])
+        self.status = event.get("status", self.status)
+        digest = event.get("digest")
+        if digest and event.get("total"):
+            self._layers[digest] = [event.get("completed", 0), event["total"]]
+            self.completed = sum(layer[0] for layer in self._layers.values())
+            self.total = sum(layer[1] for layer in self._layers.values())
+
+    @property
+    def fraction(self) -> float:
+        if self.state == COMPLETED:
+            return 1.0
+        return self.completed / self.total if self.total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "model": self.model_name,
+            "state": self.state,
+            "status": self.status,
+            "completed": self.completed,
+            "total": self.total,
+            "error": self.error
+        }
+
+
+class DownloadQueue:
+    """Runs queued pulls on up to ``max_concurrent`` worker threads.
+
+    Workers only update Download records; nothing is pushed to the caller
+    per event. A UI polls ``changes()`` on a timer, which returns each
+    download that changed since the previous poll once, so however fast a
+    pull reports progress the UI sees at most one update per download per
+    tick.
+    """
+
+    def __init__(self, max_concurrent: int = 2,
+                 pull_fn: Callable[..., Iterator[Dict[str, Any]]] = stream_pull):
+        self.pull_fn = pull_fn
+        self.downloads: Dict[int, Download] = {}
+        self._pending: "queue.Queue[Download]" = queue.Queue()
+        self._dirty = set()
+        self._next_id = 1
+        self._lock = RLock()
+        for _ in range(max_concurrent):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def enqueue(self, model_name: str) -> Download:
+        with self._lock:
+            download = Download(self._next_id, model_name)
+            self._next_id += 1
+            self.downloads[download.id] = download
+            self._dirty.add(download.id)
+        self._pending.put(download)
+        return download
+
+    def cancel(self, download_id: int):
+        download = self.downloads.get(download_id)
+        if download and download.state in (QUEUED, DOWNLOADING):
+            download.cancelled.set()
+            if download.state == QUEUED:
+                self._finish(download, CANCELLED, "Cancelled")
+
+    def stop(self):
+        """Cancel every queued and running download, e.g. before the application exits."""
+        for download_id in list(self.downloads):
+            self.cancel(download_id)
+
+    def changes(self) -> List[Download]:
+        """Downloads updated since the last call."""
+        with self._lock:
+            changed = [self.downloads[i] for i in sorted(self._dirty)]
+            self._dirty.clear()
+            return changed
+
+    def active_count(self) -> int:
+        return sum(1 for d in self.downloads.values() if d.state in (QUEUED, DOWNLOADING))
+
+    def _touch(self, download: Download):
+        with self._lock:
+            self._dirty.add(download.id)
+
+    def _finish(self, download: Download, state: str, status: str, error: Optional[str] = None):
+        download.state = state
+        download.status = status
+        download.error = error
+        download.finished_at = time.time()
+        self._touch(download)
+
+    def _worker(self):
+        while True:
+            download = self._pending.get()
+            if download.state != QUEUED or download.cancelled.is_set():
+                continue
+            download.state = DOWNLOADING
+            download.started_at = time.time()
+            self._touch(download)
+            try:
+                for event in self.pull_fn(download.model_name, abort=download.cancelled):
+                    if download.cancelled.is_set():
+                        break
+                    download.apply(event)
+                    self._touch(download)
+                if download.cancelled.is_set():
+                    self._finish(download, CANCELLED, "Cancelled")
+                elif download.status != "success":
+                    self._finish(download, FAILED, "Failed", f"Pull ended early: {download.status}")
+                else:
+                    self._finish(download, COMPLETED, "Completed")
+            except Exception as e:
+                if download.cancelled.is_set():
+                    # Cancelling shuts the connection down, which surfaces here as a read error
+                    self._finish(download, CANCELLED, "Cancelled")
+                    continue
+                logger.error(f"Pull of {download.model_name} failed: {e}")
+                self._finish(download, FAILED, "Failed", str(e))
@@ -0,0 +1,131 @@
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import RLock
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("embedding_batcher")
+
+
+class EmbeddingLRUCache:
+    """Bounded text-to-vector cache, keyed by (model, text)."""
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get((model, text))
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((model, text))
+            self.hits += 1
+            return vector
+
+    def set(self, model: str, text: str, vector: List[float]):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[(model, text)] = vector
+            self._entries.move_to_end((model, text))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EmbeddingBatcher:
+    """Gathers concurrent embedding requests into micro-batches.
+
+    Callers get a Future per text. A single worker thread waits for the first
+    pending text, then keeps collecting for up to ``max_wait`` seconds or
+    until ``max_batch_size`` texts are queued, and sends each model's texts
+    to ``embed_fn`` in one call.
+    """
+
+    def __init__(self, embed_fn: Callable[[str, List[str]], List[List[float]]],
+                 max_batch_size: int = 32, max_wait: float = 0.01, cache_size: int = 10000):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cache = EmbeddingLRUCache(cache_size)
+        self.batches_sent = 0
+        self.texts_embedded = 0
+        self._queue: "queue.Queue[Tuple[str, str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def embed(self, model: str, texts: List[str], timeout: Optional[float] = 60) -> List[List[float]]:
+        """Embed ``texts`` with ``model``, sharing upstream calls with concurrent callers."""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending: Dict[int, Future] = {}
+        for i, text in enumerate(texts):
+            cached = self.cache.get(model, text)
+            if cached is not None:
+                results[i] = cached
+            else:
+                future = Future()
+                self._queue.put((model, text, future))
+                pending[i] = future
+        for i, future in pending.items():
+            results[i] = future.result(timeout=timeout)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches_sent": self.batches_sent,
+            "texts_embedded": self.texts_embedded,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses
+        }
+
+    def _collect_batch(self) -> List[Tuple[str, str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            by_model: Dict[str, Dict[str, List[Future]]] = {}
+            for model, text, future in batch:
+                by_model.setdefault(model, {}).setdefault(text, []).append(future)
+            for model, futures_by_text in by_model.items():
+                self._send(model, futures_by_text)
+
+    def _send(self, model: str, futures_by_text: Dict[str, List[Future]]):
+        texts = list(futures_by_text)
+        try:
+            vectors = self.embed_fn(model, texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+            for futures in futures_by_text.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        self.batches_sent += 1
+        self.texts_embedded += len(texts)
+        for text, vector in zip(texts, vectors):
+            self.cache.set(model, text, vector)
+            for future in futures_by_text[text]:
+                future.set_result(vector)
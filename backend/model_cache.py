@@ -0,0 +1,124 @@
+import json
+import hashlib
+import logging
+from threading import RLock
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("model_cache")
+
+DIGEST_NAMESPACE = "model_digests"
+
+
+def normalize_model_name(name: str) -> str:
+    """Ollama treats 'llama2' and 'llama2:latest' as the same model."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class ModelResponseCache:
+    """Response cache partitioned by the digest of the model that produced each answer.
+
+    Entries live in a ``responses:<digest>`` namespace of the state backend,
+    so switching models or re-pulling new weights under the same name can
+    never return an answer from different weights. Digests come from
+    Ollama's ``/api/tags`` through ``refresh_digests``, which the owner calls
+    off the request path; lookups only read the last known digests.
+    Namespaces of digests that disappear are cleared.
+    """
+
+    def __init__(self, backend, fetch_tags: Callable[[], List[Dict[str, Any]]], default_timeout: float = 600):
+        self.backend = backend
+        self.fetch_tags = fetch_tags
+        self.default_timeout = default_timeout
+        self._digests: Dict[str, str] = {}
+        self._lock = RLock()
+
+    @staticmethod
+    def _namespace(digest: str) -> str:
+        return f"responses:{digest}"
+
+    @staticmethod
+    def make_key(prompt: str, max_tokens: int, temperature: float, **options) -> str:
+        payload = json.dumps([prompt, max_tokens, temperature, options], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def digest_for(self, model_name: str) -> Optional[str]:
+        """Return the digest of ``model_name`` as of the last refresh, or None if Ollama didn't have it."""
+        return self._digests.get(normalize_model_name(model_name))
+
+    def refresh_digests(self, models_data: Optional[List[Dict[str, Any]]] = None):
+        """Reload digests from Ollama and drop the cache of any model whose weights changed."""
+        if models_data is None:
+            models_data = self.fetch_tags()
+        if not models_data:
+            return
+        with self._lock:
+            current = {normalize_model_name(m["name"]): m.get("digest", "") for m in models_data if m.get("digest")}
+            previous = dict(self.backend.items(DIGEST_NAMESPACE))
+            for name, digest in previous.items():
+                if current.get(name) != digest:
+                    logger.info(f"Model {name} changed or was removed, invalidating its cached responses")
+                    self.backend.clear(self._namespace(digest))
+                    self.backend.delete(DIGEST_NAMESPACE, name)
+            for name, digest in current.items():
+                if previous.get(name) != digest:
+                    self.backend.set(DIGEST_NAMESPACE, name, digest)
+            self._digests = current
+
+    def invalidate_model(self, model_name: str):
+        """Drop every cached response produced by ``model_name``."""
+        name = normalize_model_name(model_name)
+        with self._lock:
+            digest = self._digests.pop(name, None) or self.backend.get(DIGEST_NAMESPACE, name)
+            if digest:
+                self.backend.clear(self._namespace(digest))
+            self.backend.delete(DIGEST_NAMESPACE, name)
+
+    def get(self, model_name: str, key: str) -> Any:
+        digest = self.digest_for(model_name)
+        if not digest:
+            return None
+        return self.backend.get(self._namespace(digest), key)
+
+    def set(self, model_name: str, key: str, value: Any, timeout: Optional[float] = None) -> bool:
+        digest = self.digest_for(model_name)
+        if not digest:
+            return False
+        self.backend.set(self._namespace(digest), key, value,
+                         self.default_timeout if timeout is None else timeout)
+        return True
+
+    def get_sample(self, model_name: str, key: str, pool_size: int = 1) -> Optional[str]:
+        """Return the next stored sample for ``key`` once its pool holds ``pool_size`` samples.
+
+        With ``pool_size`` 1 this is a plain exact-match lookup. Larger pools
+        report misses until ``pool_size`` answers have been generated, then
+        rotate through the distinct ones so repeated prompts don't all get the
+        identical answer.
+        """
+        digest = self.digest_for(model_name)
+        if not digest:
+            return None
+        namespace = self._namespace(digest)
+        pool = self.backend.get(namespace, key)
+        if not pool or pool.get("generated", 0) < pool_size:
+            return None
+        index = pool["next"] % len(pool["samples"])
+        self.backend.update(namespace, key, {"next": index + 1})
+        return pool["samples"][index]
+
+    def add_sample(self, model_name: str, key: str, value: str, pool_size: int = 1) -> bool:
+        """Add a distinct generated answer to the pool for ``key``."""
+        digest = self.digest_for(model_name)
+        if not digest:
+            return False
+
+        def add(pool):
+            pool = pool or {"samples": [], "next": 0, "generated": 0}
+            pool["generated"] = pool.get("generated", 0) + 1
+            if value not in pool["samples"]:
+                pool["samples"] = (pool["samples"] + [value])[-pool_size:]
+            return pool
+
+        # One transaction, so workers finishing the same prompt together don't drop each other's samples
+        self.backend.modify(self._namespace(digest), key, add, self.default_timeout)
+        return True
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import bisect
+import hashlib
+import logging
+from threading import RLock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger("model_catalog")
+
+MODEL_CATEGORIES = {
+    "Vision": ["vision", "image", "visual", "multimodal", "llava", "bakllava", "v-", "-v"],
+    "Coding": ["code", "coder", "coding", "programming", "developer", "codellama", "starcoder"],
+    "Math": ["math", "mathematics", "calculation", "reasoning"],
+    "Tools": ["tool", "function", "api", "call", "tool-use"],
+    "Medical": ["medical", "healthcare", "medicine", "meditron", "medllama"],
+    "Uncensored": ["uncensored", "unfiltered"],
+    "Reasoning": ["reasoning", "logic", "thinker", "deepthought", "reflect"],
+    "Embed": ["embed", "embedding", "vector"]
+}
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ollama_models.json")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+
+def categorize_model(model: Dict[str, Any]) -> List[str]:
+    """Return the MODEL_CATEGORIES whose keywords appear in a model's name, description or capabilities."""
+    model_text = " ".join([model.get("name", ""), model.get("description", "")] +
+                          model.get("capabilities", [])).lower()
+    return [category for category, keywords in MODEL_CATEGORIES.items()
+            if any(keyword in model_text for keyword in keywords)]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; version numbers like '3.1' stay whole."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class ModelCatalog:
+    """The scraped model list, loaded once and indexed for search.
+
+    The JSON file is re-read only when its modification time changes. Each
+    load tags every model with its categories and builds an inverted index
+    from name and description tokens to model positions. Query tokens match
+    indexed tokens by prefix, so 'llam' finds 'llama3.2'.
+    """
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH):
+        self.path = path
+        self.models: List[Dict[str, Any]] = []
+        self.etag = '""'
+        self._mtime = None
+        self._name_tokens: List[List[str]] = []
+        self._text_index: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []
+        self._category_index: Dict[str, Set[int]] = {}
+        self._lock = RLock()
+
+    def refresh(self) -> "ModelCatalog":
+        """Reload the catalog if the file changed since the last load."""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return self
+        with self._lock:
+            if mtime == self._mtime:
+                return self
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            self._build(json.loads(raw.decode("utf-8")))
+            self.etag = f'"{hashlib.sha256(raw).hexdigest()[:16]}"'
+            self._mtime = mtime
+            logger.info(f"Loaded {len(self.models)} models from {self.path}")
+        return self
+
+    def _build(self, models: List[Dict[str, Any]]):
+        name_tokens: List[List[str]] = []
+        text_index: Dict[str, Set[int]] = {}
+        category_index: Dict[str, Set[int]] = {category: set() for category in MODEL_CATEGORIES}
+        entries = []
+        for i, model in enumerate(models):
+            entry = dict(model, categories=categorize_model(model))
+            entries.append(entry)
+            name_tokens.append(tokenize(entry.get("name", "")))
+            for token in tokenize(entry.get("name", "") + " " + entry.get("description", "")):
+                text_index.setdefault(token, set()).add(i)
+            for category in entry["categories"]:
+                category_index[category].add(i)
+        self.models = entries
+        self._name_tokens = name_tokens
+        self._text_index = text_index
+        self._vocabulary = sorted(text_index)
+        self._category_index = category_index
+
+    def _prefix_matches(self, prefix: str) -> Iterable[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _rank(self, i: int, query: str, tokens: List[str]) -> Tuple[int, int]:
+        name = self.models[i].get("name", "").lower()
+        if name == query:
+            score = 0
+        elif name.startswith(query):
+            score = 1
+        elif all(any(t.startswith(q) for t in self._name_tokens[i]) for q in tokens):
+            score = 2
+        else:
+            score = 3
+        return score, i
+
+    def search(self, query: str = "", categories: Optional[List[str]] = None,
+               offset: int = 0, limit: int = 50) -> Tuple[int, List[Dict[str, Any]]]:
+        """Return the total match count and one page of models.
+
+        Every query token must match; any of ``categories`` may match. Name
+        matches rank ahead of description matches, and ties keep catalog order.
+        """
+        self.refresh()
+        with self._lock:
+            query = query.strip().lower()
+            tokens = tokenize(query)
+            matches: Optional[Set[int]] = None
+            for token in tokens:
+                ids: Set[int] = set()
+                for indexed in self._prefix_matches(token):
+                    ids |= self._text_index[indexed]
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    return 0, []
+            if matches is None:
+                matches = set(range(len(self.models)))
+            if categories:
+                in_categories: Set[int] = set()
+                for category in categories:
+                    in_categories |= self._category_index.get(category, set())
+                matches &= in_categories
+            if tokens:
+                ordered = sorted(matches, key=lambda i: self._rank(i, query, tokens))
+            else:
+                ordered = sorted(matches)
+            return len(ordered), [self.models[i] for i in ordered[offset:offset + limit]]
+
+    def search_etag(self, *params: Any) -> str:
+        """ETag for a search response: the catalog version plus the normalized parameters."""
+        key = json.dumps([self.etag, params], sort_keys=True)
+        return f'"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]}"'
@@ -1,56 +1,250 @@
 import os
 import json
+import socket
 import requests
 import time
+import threading
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 from typing import Dict, List, Generator, Optional, Any, Union
-from functools import lru_cache
+
+OLLAMA_POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "32"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "3.05"))
+# Longest wait between two streamed chunks, not for a whole generation
+OLLAMA_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "300"))
+OLLAMA_IDLE_TIMEOUT = float(os.environ.get("OLLAMA_IDLE_TIMEOUT", "60"))
+
+# Only requests that are safe to send twice are retried after a failure mid-request;
+# connection failures are retried for every method since nothing reached Ollama
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+STATS_FIELDS = (
+    "eval_count",
+    "prompt_eval_count",
+    "total_duration",
+    "load_duration",
+    "prompt_eval_duration",
+    "eval_duration"
+)
+
+# The StreamAbort of the request this thread is about to send, if any
+_pending_abort = threading.local()
+
+
+class StreamAbort:
+    """Aborts a streaming request from another thread.
+
+    The request binds its pooled connection here once it has been sent.
+    ``set()`` shuts that socket down, so a read blocked while Ollama is
+    still evaluating the prompt fails at once, and Ollama stops the
+    generation when it sees the connection close.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def bind(self, connection):
+        with self._lock:
+            self._connection = connection
+            if self._event.is_set():
+                self._shutdown()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            self._shutdown()
+
+    def _shutdown(self):
+        sock = getattr(self._connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _AbortableConnectionMixin:
+    def request(self, *args, **kwargs):
+        result = super().request(*args, **kwargs)
+        # Bound once sent, when the socket exists; Ollama's reply is awaited after this
+        abort = getattr(_pending_abort, "abort", None)
+        if abort is not None:
+            abort.bind(self)
+        return result
+
+
+class _AbortableHTTPConnection(_AbortableConnectionMixin, HTTPConnection):
+    pass
+
+
+class _AbortableHTTPSConnection(_AbortableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _AbortableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _AbortableHTTPConnection
+
+
+class _AbortableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _AbortableHTTPSConnection
+
+
+class _AbortableAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections can be bound to a StreamAbort."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _AbortableHTTPConnectionPool,
+            "https": _AbortableHTTPSConnectionPool
+        }
 
 class OllamaClient:
-    def __init__(self, model_name="llama2", base_url="http://localhost:11434", fast_mode=False, cache_size=50):
+    """Client for one Ollama server, sharing a pool of keep-alive connections.
+
+    ``pool_size`` should cover the number of requests the server handles at
+    once; beyond it, extra connections are opened and discarded after use.
+    Connections unused for ``idle_timeout`` seconds are dropped before the
+    next request, since generation POSTs are never retried on a connection
+    the server has already closed.
+    """
+
+    def __init__(self, model_name="llama2", base_url="http://localhost:11434",
+                 pool_size: int = OLLAMA_POOL_SIZE, connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout: float = OLLAMA_READ_TIMEOUT, idle_timeout: float = OLLAMA_IDLE_TIMEOUT):
         self.model_name = model_name
         self.base_url = base_url
         self.api_generate_url = f"{base_url}/api/generate"
         self.api_chat_url = f"{base_url}/api/chat"
+        self.api_embed_url = f"{base_url}/api/embed"
         self._ctx_size = 1024
-        self._session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(
-            pool_connections=5,
-            pool_maxsize=10,
-            max_retries=3
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.idle_timeout = idle_timeout
+        self._adapter = _AbortableAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, connect=3, read=2, status=0, backoff_factor=0.2,
+                              allowed_methods=SAFE_METHODS, raise_on_status=False)
         )
-        self._session.mount('http://', adapter)
-        self._session.mount('https://', adapter)
+        self._session = requests.Session()
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
         self._session.headers.update({
             'Connection': 'keep-alive'
         })
-        self.cache_size = cache_size
-        if cache_size > 0:
-            self.infer = self._cache_decorator(self.infer)
+        self._pool_lock = threading.Lock()
+        self._last_used = time.monotonic()
+        self._in_flight = 0
+        self._generations = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._idle_resets = 0
+
+    @contextmanager
+    def _pooled(self, generation: bool = False):
+        """Count a request against the pool for its whole duration, including streaming."""
+        with self._pool_lock:
+            now = time.monotonic()
+            # Closing the pool under a running stream would cut it off, so only reset when nothing is open
+            if self.idle_timeout and self._in_flight == 0 and now - self._last_used > self.idle_timeout:
+                self._adapter.close()
+                self._idle_resets += 1
+            self._last_used = now
+            self._in_flight += 1
+            if generation:
+                self._generations += 1
+            self._requests += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
         try:
-            response = self._session.get(f"{base_url}/api/version", timeout=1)
+            yield self._session
+        finally:
+            with self._pool_lock:
+                self._in_flight -= 1
+                if generation:
+                    self._generations -= 1
+                self._last_used = time.monotonic()
+
+    @property
+    def in_flight(self) -> int:
+        """Requests currently open against Ollama, including streams being read."""
+        return self._in_flight
+
+    @property
+    def generations_in_flight(self) -> int:
+        """Generate and chat requests currently open, leaving out listings, embeddings and loads."""
+        return self._generations
+
+    def pool_stats(self) -> Dict[str, Any]:
+        pools = []
+        manager = self._adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            pools.append({
+                "host": f"{pool.host}:{pool.port}",
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle_connections": idle
+            })
+        with self._pool_lock:
+            return {
+                "pool_size": self.pool_size,
+                "in_flight": self._in_flight,
+                "generations_in_flight": self._generations,
+                "peak_in_flight": self._peak_in_flight,
+                "requests": self._requests,
+                "idle_resets": self._idle_resets,
+                "connect_timeout": self.timeout[0],
+                "read_timeout": self.timeout[1],
+                "idle_timeout": self.idle_timeout,
+                "pools": pools
+            }
+
+    def check_connection(self, timeout: float = 1) -> bool:
+        try:
+            with self._pooled() as session:
+                response = session.get(f"{self.base_url}/api/version", timeout=timeout)
             if response.status_code == 200:
                 version_info = response.json()
                 print(f"Connected to Ollama server version {version_info.get('version')}")
-            else:
-                print(f"Warning: Ollama server returned status code {response.status_code}")
-        except requests.exceptions.ConnectionError:
-            print(f"Warning: Could not connect to Ollama server at {base_url}")
+                return True
+            print(f"Warning: Ollama server returned status code {response.status_code}")
+        except requests.exceptions.RequestException:
+            print(f"Warning: Could not connect to Ollama server at {self.base_url}")
             print("Please ensure Ollama is installed and running.")
             print("Visit https://ollama.com/ for installation instructions.")
+        return False
     
-    def _cache_decorator(self, func):
-        @lru_cache(maxsize=self.cache_size)
-        def cached_request(prompt, max_tokens, temperature):
-            return func(prompt, max_tokens, temperature)
-        
-        def wrapper(prompt, max_tokens=1024, temperature=0.7):
-            return cached_request(prompt, max_tokens, temperature)
-            
-        return wrapper
+    @staticmethod
+    def _collect_stats(chunk: Dict[str, Any], stats: Optional[Dict[str, Any]]):
+        """Copy token counts and timings from Ollama's final chunk into ``stats``."""
+        if stats is None:
+            return
+        for field in STATS_FIELDS:
+            if field in chunk:
+                stats[field] = chunk[field]
+    
+    @staticmethod
+    def _record_first_byte(request_start: float, stats: Optional[Dict[str, Any]]):
+        """Store the time until Ollama's response headers arrived, in nanoseconds like its own timings."""
+        if stats is not None:
+            stats["first_byte_duration"] = int((time.perf_counter() - request_start) * 1e9)
     
     def list_models(self) -> List[Dict[str, str]]:
         try:
-            response = self._session.get(f"{self.base_url}/api/tags", timeout=2)
+            with self._pooled() as session:
+                response = session.get(f"{self.base_url}/api/tags", timeout=2)
             if response.status_code == 200:
                 return response.json().get("models", [])
             else:
@@ -60,64 +254,115 @@ class OllamaClient:
             print(f"Error listing models: {e}")
             return []
     
+    def running_models(self) -> List[Dict[str, Any]]:
+        """Models Ollama currently holds in memory, with their size and size_vram in bytes."""
+        try:
+            with self._pooled() as session:
+                response = session.get(f"{self.base_url}/api/ps", timeout=2)
+            if response.status_code == 200:
+                return response.json().get("models", [])
+            print(f"Error listing running models: {response.status_code}")
+        except Exception as e:
+            print(f"Error listing running models: {e}")
+        return []
+    
+    def load(self, model: Optional[str] = None) -> bool:
+        """Load a model into memory (or keep it there) without generating anything."""
+        try:
+            with self._pooled() as session:
+                response = session.post(self.api_generate_url, json={"model": model or self.model_name},
+                                        timeout=self.timeout)
+            return response.status_code == 200
+        except requests.exceptions.RequestException as e:
+            print(f"Error loading model: {e}")
+            return False
+
     def _format_prompt(self, text: str) -> str:
         return text.strip()
     
-    def infer(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7) -> str:
+    def infer(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7,
+              stats: Optional[Dict[str, Any]] = None, seed: Optional[int] = None,
+              num_ctx: Optional[int] = None, model: Optional[str] = None) -> str:
         formatted_prompt = self._format_prompt(prompt)
         try:
             params = {
-                "model": self.model_name,
+                "model": model or self.model_name,
                 "prompt": formatted_prompt,
-                "temperature": temperature,
-                "num_predict": max_tokens,
                 "options": {
-                    "num_ctx": self._ctx_size,
+                    "temperature": temperature,
+                    "num_predict": max_tokens,
+                    "num_ctx": num_ctx or self._ctx_size,
                     "num_thread": 4
                 }
             }
-            response = self._session.post(
+            if seed is not None:
+                params["options"]["seed"] = seed
+            request_start = time.perf_counter()
+            with self._pooled(generation=True) as session, session.post(
                 self.api_generate_url, 
                 json=params, 
-                timeout=30,
+                timeout=self.timeout,
                 stream=True
-            )
-            if response.status_code == 200:
-                full_response = ""
-                for line in response.iter_lines():
-                    if line:
-                        chunk = json.loads(line)
-                        full_response += chunk.get("response", "")
-                        if chunk.get("done", False):
-                            break
-                return full_response.strip()
-            else:
-                return f"Error: Ollama API returned status code {response.status_code}"
+            ) as response:
+                self._record_first_byte(request_start, stats)
+                if response.status_code == 200:
+                    full_response = ""
+                    for line in response.iter_lines():
+                        if line:
+                            chunk = json.loads(line)
+                            full_response += chunk.get("response", "")
+                            if chunk.get("done", False):
+                                self._collect_stats(chunk, stats)
+                                break
+                    return full_response.strip()
+                else:
+                    return f"Error: Ollama API returned status code {response.status_code}"
         except Exception as e:
             print(f"Error during inference: {e}")
             return f"Error: {str(e)}"
     
-    def stream(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7) -> Generator[str, None, None]:
+    @contextmanager
+    def _post_stream(self, session: requests.Session, params: Dict[str, Any], abort: Optional[StreamAbort]):
+        """POST a streaming generation that ``abort`` can cut off until its response is closed."""
+        _pending_abort.abort = abort
+        try:
+            response = session.post(self.api_generate_url, json=params, stream=True, timeout=self.timeout)
+        except Exception:
+            if abort is not None:
+                abort.bind(None)
+            raise
+        finally:
+            _pending_abort.abort = None
+        try:
+            yield response
+        finally:
+            if abort is not None:
+                # Unbind before the connection goes back to the pool for someone else's request
+                abort.bind(None)
+            response.close()
+
+    def stream(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7,
+               stats: Optional[Dict[str, Any]] = None, seed: Optional[int] = None,
+               num_ctx: Optional[int] = None, model: Optional[str] = None,
+               abort: Optional[StreamAbort] = None) -> Generator[str, None, None]:
+        """Stream the reply in small batches of tokens; ``abort`` stops it from another thread."""
         formatted_prompt = self._format_prompt(prompt)
         try:
             params = {
-                "model": self.model_name,
+                "model": model or self.model_name,
                 "prompt": formatted_prompt,
-                "temperature": temperature,
-                "num_predict": max_tokens,
                 "stream": True,
                 "options": {
-                    "num_ctx": self._ctx_size,
+                    "temperature": temperature,
+                    "num_predict": max_tokens,
+                    "num_ctx": num_ctx or self._ctx_size,
                     "num_thread": 4,
-                    "seed": int(time.time())
+                    "seed": int(time.time()) if seed is None else seed
                 }
             }
-            with self._session.post(
-                self.api_generate_url, 
-                json=params, 
-                stream=True, 
-                timeout=30
-            ) as response:
+            request_start = time.perf_counter()
+            with self._pooled(generation=True) as session, self._post_stream(session, params, abort) as response:
+                self._record_first_byte(request_start, stats)
                 if response.status_code == 200:
                     buffer = []
                     buffer_size = 5
@@ -132,8 +377,7 @@ class OllamaClient:
                                         yield ''.join(buffer)
                                         buffer = []
                                 if chunk.get("done", False):
-                                    if buffer:
-                                        yield ''.join(buffer)
+                                    self._collect_stats(chunk, stats)
                                     break
                             except json.JSONDecodeError:
                                 print(f"Error parsing JSON: {line}")
@@ -142,9 +386,23 @@ class OllamaClient:
                 else:
                     yield f"Error: Ollama API returned status code {response.status_code}"
         except Exception as e:
+            if abort is not None and abort.is_set():
+                return
             print(f"Error during streaming: {e}")
             yield f"Error: {str(e)}"
 
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Embed a batch of texts in one /api/embed call."""
+        with self._pooled() as session:
+            response = session.post(
+                self.api_embed_url,
+                json={"model": model or self.model_name, "input": texts},
+                timeout=self.timeout
+            )
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama API returned status code {response.status_code}")
+        return response.json().get("embeddings", [])
+
     def chat(self, 
              messages: List[Dict[str, str]], 
              temperature: float = 0.7, 
@@ -153,13 +411,15 @@ class OllamaClient:
             params = {
                 "model": self.model_name,
                 "messages": messages,
-                "temperature": temperature,
+                "stream": False,
                 "options": {
+                    "temperature": temperature,
                     "num_ctx": 2048,
                     "num_predict": max_tokens
                 }
             }
-            response = requests.post(self.api_chat_url, json=params)
+            with self._pooled(generation=True) as session:
+                response = session.post(self.api_chat_url, json=params, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -172,19 +432,27 @@ class OllamaClient:
     def stream_chat(self, 
                    messages: List[Dict[str, str]], 
                    temperature: float = 0.7,
-                   max_tokens: int = 2048) -> Generator[str, None, None]:
+                   max_tokens: int = 2048,
+                   stats: Optional[Dict[str, Any]] = None,
+                   num_ctx: int = 2048,
+                   seed: Optional[int] = None) -> Generator[str, None, None]:
         try:
             params = {
                 "model": self.model_name,
                 "messages": messages,
-                "temperature": temperature,
                 "stream": True,
                 "options": {
-                    "num_ctx": 2048,
+                    "temperature": temperature,
+                    "num_ctx": num_ctx,
                     "num_predict": max_tokens
                 }
             }
-            with requests.post(self.api_chat_url, json=params, stream=True) as response:
+            if seed is not None:
+                params["options"]["seed"] = seed
+            request_start = time.perf_counter()
+            with self._pooled(generation=True) as session, session.post(self.api_chat_url, json=params, stream=True,
+                                                         timeout=self.timeout) as response:
+                self._record_first_byte(request_start, stats)
                 if response.status_code == 200:
                     for line in response.iter_lines():
                         if line:
@@ -194,6 +462,7 @@ class OllamaClient:
                                 if content:
                                     yield content
                                 if chunk.get("done", False):
+                                    self._collect_stats(chunk, stats)
                                     break
                             except json.JSONDecodeError:
                                 print(f"Error parsing JSON: {line}")
@@ -1,22 +1,23 @@
 import sys
 import os
 import json
-import subprocess
 import threading
 import platform
 import importlib.util
 import webbrowser
 import traceback
+import requests
 from datetime import datetime
 
-from PyQt6.QtCore import Qt, QUrl, QThread, pyqtSignal, QSize, QTimer, QMimeData
+from PyQt6.QtCore import (Qt, QUrl, QThread, pyqtSignal, QSize, QTimer, QMimeData, QSortFilterProxyModel,
+                          QObject, QRunnable, QThreadPool)
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, 
                             QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, 
                             QPushButton, QLineEdit, QTextEdit, QTreeWidget, 
                             QTreeWidgetItem, QGroupBox, QStatusBar, QCheckBox, 
                             QMessageBox, QSplitter, QFrame, QStyle, QProgressDialog,
-                            QComboBox, QApplication)
-from PyQt6.QtGui import QFont, QIcon, QAction, QClipboard
+                            QComboBox, QApplication, QTreeView, QProgressBar)
+from PyQt6.QtGui import QFont, QIcon, QAction, QClipboard, QStandardItemModel, QStandardItem
 
 try:
     from PyQt6.QtWebEngineWidgets import QWebEngineView
@@ -26,53 +27,112 @@ except ImportError:
     print("QtWebEngine not available. Will use system browser instead.")
     WEB_ENGINE_AVAILABLE = False
 
-MODEL_CATEGORIES = {
-    "Vision": ["vision", "image", "visual", "multimodal", "llava", "bakllava", "v-", "-v"],
-    "Coding": ["code", "coder", "coding", "programming", "developer", "codellama", "starcoder"],
-    "Math": ["math", "mathematics", "calculation", "reasoning"],
-    "Tools": ["tool", "function", "api", "call", "tool-use"],
-    "Medical": ["medical", "healthcare", "medicine", "meditron", "medllama"],
-    "Uncensored": ["uncensored", "unfiltered"],
-    "Reasoning": ["reasoning", "logic", "thinker", "deepthought", "reflect"],
-    "Embed": ["embed", "embedding", "vector"]
-}
-
-class DownloadThread(QThread):
-    progress_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal(bool, int)
+from model_catalog import MODEL_CATEGORIES, ModelCatalog
+from variant_cache import VariantCache
+from download_queue import DownloadQueue, parse_pull_command, COMPLETED, FAILED
+
+OLLAMA_SERVER = os.environ.get("OLLAMA_SERVER", "http://localhost:11434")
+
+ollama_http = requests.Session()
+
+def fetch_downloaded_models():
+    """List local models through Ollama's /api/tags."""
+    response = ollama_http.get(f"{OLLAMA_SERVER}/api/tags", timeout=10)
+    response.raise_for_status()
+    return response.json().get("models", [])
+
+def delete_downloaded_model(model_name):
+    """Delete a local model through Ollama's /api/delete."""
+    response = ollama_http.delete(
+        f"{OLLAMA_SERVER}/api/delete",
+        json={"model": model_name, "name": model_name},
+        timeout=60
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Ollama API returned status code {response.status_code}: {response.text.strip()}")
+    return model_name
+
+def format_size(num_bytes):
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB"):
+        if size < 1000:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} GB"
+
+class JobSignals(QObject):
+    finished = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+class BackgroundJob(QRunnable):
+    """Runs one blocking call on a pool thread and reports back through signals."""
     
-    def __init__(self, command):
+    def __init__(self, name, fn, *args):
         super().__init__()
-        self.command = command
-        
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.signals = JobSignals()
+    
     def run(self):
         try:
-            process = subprocess.Popen(
-                self.command, 
-                shell=True, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT,
-                text=False,
-                bufsize=1
-            )
-            
-            while True:
-                line = process.stdout.readline()
-                if not line:
-                    break
-                    
-                try:
-                    decoded_line = line.decode('utf-8', errors='replace').strip()
-                    self.progress_signal.emit(decoded_line)
-                except Exception as e:
-                    self.progress_signal.emit(f"Warning: Could not decode output line: {e}")
-            
-            process.wait()
-            self.finished_signal.emit(process.returncode == 0, process.returncode)
-                
+            result = self.fn(*self.args)
         except Exception as e:
-            self.progress_signal.emit(f"Error during download: {e}")
-            self.finished_signal.emit(False, -1)
+            self.signals.failed.emit(self.name, str(e))
+            return
+        self.signals.finished.emit(self.name, result)
+
+class JobRunner:
+    """Thread pool for the manager's Ollama calls; callbacks run on the UI thread."""
+    
+    def __init__(self, max_workers=4):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_workers)
+        self._jobs = set()
+    
+    def submit(self, name, fn, *args, on_finished=None, on_failed=None):
+        job = BackgroundJob(name, fn, *args)
+        # Keep the job's signals alive until it reports back
+        self._jobs.add(job)
+        job.signals.finished.connect(lambda *_: self._jobs.discard(job))
+        job.signals.failed.connect(lambda *_: self._jobs.discard(job))
+        if on_finished:
+            job.signals.finished.connect(on_finished)
+        if on_failed:
+            job.signals.failed.connect(on_failed)
+        self.pool.start(job)
+        return job
+    
+    def wait(self, timeout_ms=5000):
+        self.pool.waitForDone(timeout_ms)
+
+SEARCH_TEXT_ROLE = Qt.ItemDataRole.UserRole + 1
+CATEGORIES_ROLE = Qt.ItemDataRole.UserRole + 2
+
+class ModelFilterProxy(QSortFilterProxyModel):
+    """Shows only catalog rows matching the search text and any selected category."""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.search_term = ""
+        self.categories = set()
+    
+    def set_filter(self, search_term, categories):
+        search_term = search_term.strip().lower()
+        categories = set(categories)
+        if search_term == self.search_term and categories == self.categories:
+            return
+        self.search_term = search_term
+        self.categories = categories
+        self.invalidateFilter()
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        index = self.sourceModel().index(source_row, 0, source_parent)
+        if self.search_term and self.search_term not in index.data(SEARCH_TEXT_ROLE):
+            return False
+        if self.categories and self.categories.isdisjoint(index.data(CATEGORIES_ROLE)):
+            return False
+        return True
 
 class ScraperThread(QThread):
     finished_signal = pyqtSignal(bool, str)
@@ -105,6 +165,15 @@ class OllamaModelManager(QMainWindow):
             
             self.browser_mode = "Embedded QtWebEngine" if WEB_ENGINE_AVAILABLE else "System Default Browser"
             
+            self.catalog = ModelCatalog(self.json_file)
+            self.jobs = JobRunner()
+            self.variant_cache = VariantCache()
+            self.variant_refreshes = set()
+            self.download_queue = DownloadQueue(max_concurrent=int(os.environ.get("MANAGER_MAX_DOWNLOADS", "2")))
+            self.download_items = {}
+            self.refresh_pending = False
+            self.pending_deletes = set()
+            self.delete_failures = []
             self.models = []
             self.current_model_url = ""
             
@@ -164,9 +233,15 @@ class OllamaModelManager(QMainWindow):
             control_layout.addWidget(QLabel("Search:"))
             self.search_input = QLineEdit()
             self.search_input.setMinimumWidth(300)
-            self.search_input.textChanged.connect(self.filter_models)
             control_layout.addWidget(self.search_input)
             
+            # Filter once typing pauses rather than on every keystroke
+            self.search_timer = QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(200)
+            self.search_timer.timeout.connect(self.filter_models)
+            self.search_input.textChanged.connect(lambda _: self.search_timer.start())
+            
             control_layout.addStretch(1)
             
             reset_btn = QPushButton("Reset Filters")
@@ -204,12 +279,20 @@ class OllamaModelManager(QMainWindow):
             models_layout = QVBoxLayout(models_widget)
             models_layout.setContentsMargins(0, 0, 0, 0)
             
-            self.models_tree = QTreeWidget()
-            self.models_tree.setHeaderLabels(["Name", "Description", "Categories"])
+            self.models_model = QStandardItemModel(0, 3, self)
+            self.models_model.setHorizontalHeaderLabels(["Name", "Description", "Categories"])
+            self.models_proxy = ModelFilterProxy(self)
+            self.models_proxy.setSourceModel(self.models_model)
+            
+            self.models_tree = QTreeView()
+            self.models_tree.setModel(self.models_proxy)
+            self.models_tree.setRootIsDecorated(False)
+            self.models_tree.setUniformRowHeights(True)
+            self.models_tree.setEditTriggers(QTreeView.EditTrigger.NoEditTriggers)
             self.models_tree.setColumnWidth(0, 150)
             self.models_tree.setColumnWidth(1, 500)
             self.models_tree.setColumnWidth(2, 150)
-            self.models_tree.itemSelectionChanged.connect(self.on_model_select)
+            self.models_tree.selectionModel().selectionChanged.connect(self.on_model_select)
             self.models_tree.setAlternatingRowColors(True)
             models_layout.addWidget(self.models_tree)
             
@@ -264,9 +347,25 @@ class OllamaModelManager(QMainWindow):
             download_layout.addWidget(progress_group, 1)
             progress_layout = QVBoxLayout(progress_group)
             
-            self.progress_text = QTextEdit()
-            self.progress_text.setReadOnly(True)
-            progress_layout.addWidget(self.progress_text)
+            self.downloads_tree = QTreeWidget()
+            self.downloads_tree.setHeaderLabels(["Model", "Status", "Progress", "Size"])
+            self.downloads_tree.setColumnWidth(0, 200)
+            self.downloads_tree.setColumnWidth(1, 180)
+            self.downloads_tree.setColumnWidth(2, 250)
+            self.downloads_tree.setRootIsDecorated(False)
+            progress_layout.addWidget(self.downloads_tree)
+            
+            cancel_layout = QHBoxLayout()
+            progress_layout.addLayout(cancel_layout)
+            cancel_layout.addStretch(1)
+            cancel_btn = QPushButton("Cancel Selected")
+            cancel_btn.clicked.connect(self.cancel_selected_download)
+            cancel_layout.addWidget(cancel_btn)
+            
+            # Progress is polled a few times per second instead of signalled per event
+            self.download_timer = QTimer(self)
+            self.download_timer.setInterval(250)
+            self.download_timer.timeout.connect(self.update_download_progress)
             
             splitter.addWidget(download_widget)
             
@@ -282,16 +381,16 @@ class OllamaModelManager(QMainWindow):
             control_layout = QHBoxLayout()
             downloaded_layout.addLayout(control_layout)
             
-            delete_btn = QPushButton("Delete Selected")
-            delete_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_TrashIcon))
-            delete_btn.clicked.connect(self.delete_selected_model)
-            control_layout.addWidget(delete_btn)
+            self.delete_btn = QPushButton("Delete Selected")
+            self.delete_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_TrashIcon))
+            self.delete_btn.clicked.connect(self.delete_selected_model)
+            control_layout.addWidget(self.delete_btn)
             
             control_layout.addStretch(1)
             
-            refresh_btn = QPushButton("Refresh List")
-            refresh_btn.clicked.connect(self.refresh_downloaded_models)
-            control_layout.addWidget(refresh_btn)
+            self.refresh_btn = QPushButton("Refresh List")
+            self.refresh_btn.clicked.connect(self.refresh_downloaded_models)
+            control_layout.addWidget(self.refresh_btn)
             
             self.downloaded_tree = QTreeWidget()
             self.downloaded_tree.setHeaderLabels(["Name", "Size", "Modified"])
@@ -299,7 +398,7 @@ class OllamaModelManager(QMainWindow):
             self.downloaded_tree.setColumnWidth(1, 100)
             self.downloaded_tree.setColumnWidth(2, 200)
             self.downloaded_tree.setAlternatingRowColors(True)
-            self.downloaded_tree.setSelectionMode(QTreeWidget.SelectionMode.SingleSelection)
+            self.downloaded_tree.setSelectionMode(QTreeWidget.SelectionMode.ExtendedSelection)
             downloaded_layout.addWidget(self.downloaded_tree)
         
         except Exception as e:
@@ -331,27 +430,29 @@ class OllamaModelManager(QMainWindow):
 
     def load_models(self):
         try:
-            with open(self.json_file, "r", encoding="utf-8") as f:
-                self.models = json.load(f)
+            self.models = self.catalog.refresh().models
+            self.variant_cache.seed(self.models, os.path.getmtime(self.json_file))
             self.populate_models_tree(self.models)
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Could not load models: {e}\nThe models list will be empty.")
             self.models = []
 
     def populate_models_tree(self, models):
+        """Fill the item model once per catalog load; filtering only hides rows."""
         try:
-            self.models_tree.clear()
+            self.models_model.removeRows(0, self.models_model.rowCount())
             
             for model in models:
-                categories = self.categorize_model(model)
-                categories_str = ", ".join(categories)
-                
-                item = QTreeWidgetItem(self.models_tree)
-                item.setText(0, model["name"])
-                item.setText(1, model["description"])
-                item.setText(2, categories_str)
+                name_item = QStandardItem(model["name"])
+                name_item.setData(model, Qt.ItemDataRole.UserRole)
+                name_item.setData(f"{model['name']} {model['description']}".lower(), SEARCH_TEXT_ROLE)
+                name_item.setData(model["categories"], CATEGORIES_ROLE)
                 
-                item.setData(0, Qt.ItemDataRole.UserRole, model)
+                self.models_model.appendRow([
+                    name_item,
+                    QStandardItem(model["description"]),
+                    QStandardItem(", ".join(model["categories"]))
+                ])
                 
             self.models_tree.resizeColumnToContents(0)
             
@@ -360,64 +461,34 @@ class OllamaModelManager(QMainWindow):
 
     def filter_models(self):
         try:
-            search_term = self.search_input.text().lower()
-            
             selected_categories = [cat for cat, checkbox in self.category_checkboxes.items() 
                                   if checkbox.isChecked()]
             
-            filtered_models = []
-            
-            for model in self.models:
-                if search_term and not (search_term in model["name"].lower() or 
-                                        search_term in model["description"].lower()):
-                    continue
-                
-                if selected_categories:
-                    model_categories = self.categorize_model(model)
-                    
-                    if not any(cat in selected_categories for cat in model_categories):
-                        continue
-                
-                filtered_models.append(model)
-            
-            self.populate_models_tree(filtered_models)
+            self.models_proxy.set_filter(self.search_input.text(), selected_categories)
             
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error filtering models: {e}")
 
-    def categorize_model(self, model):
-        try:
-            categories = []
-            model_text = (model["name"] + " " + model["description"]).lower()
-            
-            for category, keywords in MODEL_CATEGORIES.items():
-                for keyword in keywords:
-                    if keyword.lower() in model_text:
-                        categories.append(category)
-                        break
-                        
-            return categories
-        except Exception as e:
-            print(f"Error categorizing model {model.get('name', 'unknown')}: {e}")
-            return []
-
     def reset_filters(self):
         try:
+            self.search_input.blockSignals(True)
             self.search_input.clear()
+            self.search_input.blockSignals(False)
             for checkbox in self.category_checkboxes.values():
+                checkbox.blockSignals(True)
                 checkbox.setChecked(False)
+                checkbox.blockSignals(False)
             self.filter_models()
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Failed to reset filters: {e}")
 
     def on_model_select(self):
         try:
-            selected_items = self.models_tree.selectedItems()
-            if not selected_items:
+            selected_rows = self.models_tree.selectionModel().selectedRows(0)
+            if not selected_rows:
                 return
                 
-            item = selected_items[0]
-            model_data = item.data(0, Qt.ItemDataRole.UserRole)
+            model_data = selected_rows[0].data(Qt.ItemDataRole.UserRole)
             
             if model_data:
                 model_name = model_data["name"]
@@ -427,22 +498,56 @@ class OllamaModelManager(QMainWindow):
                 
                 self.extracted_commands = []
                 
-                self.variant_combo.clear()
-                self.variant_combo.addItem("Loading variants...", "")
-                
                 self.command_text.setText(f"ollama pull {model_name}")
                 
                 self.download_btn.setEnabled(True)
                 
                 self.current_model_url = model_data["url"]
                 
-                if WEB_ENGINE_AVAILABLE and self.current_model_url:
-                    self.web_view.setUrl(QUrl(self.current_model_url))
-                    self.statusBar.showMessage(f"Loading variants for {model_name}...", 3000)
+                # Show cached variants at once; stale or missing ones are refreshed in the background
+                variants, fresh = self.variant_cache.get(model_name)
+                if variants:
+                    self.update_variant_options(variants)
+                else:
+                    self.variant_combo.clear()
+                    self.variant_combo.addItem("Loading variants...", "")
+                
+                if not fresh and model_name not in self.variant_refreshes:
+                    self.variant_refreshes.add(model_name)
+                    self.statusBar.showMessage(f"Updating variants for {model_name}...", 3000)
+                    self.jobs.submit(model_name, self.variant_cache.refresh, model_name,
+                                     on_finished=self.on_variants_refreshed,
+                                     on_failed=self.on_variants_failed)
         
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error selecting model: {e}")
     
+    def on_variants_refreshed(self, model_name, variants):
+        self.variant_refreshes.discard(model_name)
+        if model_name != getattr(self, "current_base_model", None):
+            return
+        if variants:
+            self.update_variant_options(variants)
+            self.statusBar.showMessage(f"Variants loaded for {model_name}", 3000)
+        else:
+            self.load_live_variants()
+
+    def on_variants_failed(self, model_name, error):
+        self.variant_refreshes.discard(model_name)
+        if model_name != getattr(self, "current_base_model", None):
+            return
+        self.statusBar.showMessage(f"Could not update variants for {model_name}: {error}", 5000)
+        if not self.variant_cache.get(model_name)[0]:
+            self.load_live_variants()
+
+    def load_live_variants(self):
+        """Fall back to extracting variants from the live model page."""
+        if WEB_ENGINE_AVAILABLE and self.current_model_url:
+            self.web_view.setUrl(QUrl(self.current_model_url))
+            self.statusBar.showMessage(f"Loading variants for {self.current_base_model} from its page...", 3000)
+        else:
+            self.update_variant_options([])
+
     def update_variant_options(self, extracted_variants=None):
         try:
             self.variant_combo.clear()
@@ -451,7 +556,12 @@ class OllamaModelManager(QMainWindow):
             
             if extracted_variants:
                 for variant in extracted_variants:
-                    if ':' in variant:
+                    if isinstance(variant, dict):
+                        label = variant["tag"]
+                        if variant.get("size"):
+                            label += f"  ({variant['size']})"
+                        self.variant_combo.addItem(label, variant["name"])
+                    elif ':' in variant:
                         model_name, tag = variant.split(':', 1)
                         if model_name == self.current_base_model:
                             self.variant_combo.addItem(f"{tag}", variant)
@@ -520,72 +630,97 @@ class OllamaModelManager(QMainWindow):
                 QMessageBox.warning(self, "Error", "Please enter a command to download the model.")
                 return
             
-            self.progress_text.clear()
+            try:
+                model_spec = parse_pull_command(cmd)
+            except ValueError as e:
+                QMessageBox.warning(self, "Error", str(e))
+                return
             
-            self.log_progress(f"Starting download: {cmd}")
+            download = self.download_queue.enqueue(model_spec)
             
-            self.download_btn.setEnabled(False)
+            item = QTreeWidgetItem(self.downloads_tree)
+            item.setText(0, model_spec)
+            item.setData(0, Qt.ItemDataRole.UserRole, download.id)
+            progress_bar = QProgressBar()
+            progress_bar.setRange(0, 1000)
+            progress_bar.setTextVisible(True)
+            self.downloads_tree.setItemWidget(item, 2, progress_bar)
+            self.download_items[download.id] = (item, progress_bar)
             
-            self.download_thread = DownloadThread(cmd)
-            self.download_thread.progress_signal.connect(self.log_progress)
-            self.download_thread.finished_signal.connect(self.on_download_finished)
-            self.download_thread.start()
+            self.update_download_progress()
+            self.download_timer.start()
+            self.statusBar.showMessage(f"Queued download of {model_spec}", 3000)
             
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error starting download: {e}")
-            self.download_btn.setEnabled(True)
 
-    def on_download_finished(self, success, return_code):
+    def update_download_progress(self):
         try:
-            if (success):
-                self.log_progress("Download completed successfully!")
-                self.tab_widget.setCurrentIndex(1)
+            finished = False
+            # Read before draining, so a download that finishes in between is still drained next tick
+            active = self.download_queue.active_count()
+            for download in self.download_queue.changes():
+                item, progress_bar = self.download_items[download.id]
+                item.setText(1, download.error or download.status)
+                progress_bar.setValue(int(download.fraction * 1000))
+                progress_bar.setFormat(f"{download.fraction * 100:.1f}%")
+                if download.total:
+                    item.setText(3, f"{format_size(download.completed)} / {format_size(download.total)}")
+                if download.state == COMPLETED:
+                    finished = True
+                    self.statusBar.showMessage(f"Downloaded {download.model_name}", 3000)
+                elif download.state == FAILED:
+                    self.statusBar.showMessage(f"Download of {download.model_name} failed: {download.error}", 5000)
+            
+            if finished:
                 self.refresh_downloaded_models()
-            else:
-                self.log_progress(f"Download failed with return code: {return_code}")
+            if not active:
+                self.download_timer.stop()
                 
-            self.download_btn.setEnabled(True)
-            
         except Exception as e:
-            QMessageBox.warning(self, "Error", f"Error handling download completion: {e}")
-            self.download_btn.setEnabled(True)
+            print(f"Error updating download progress: {e}")
 
-    def log_progress(self, message):
-        try:
-            self.progress_text.append(message)
-            cursor = self.progress_text.textCursor()
-            cursor.movePosition(cursor.MoveOperation.End)
-            self.progress_text.setTextCursor(cursor)
-        except Exception as e:
-            print(f"Error logging progress: {e}")
+    def cancel_selected_download(self):
+        for item in self.downloads_tree.selectedItems():
+            self.download_queue.cancel(item.data(0, Qt.ItemDataRole.UserRole))
+        self.update_download_progress()
 
     def refresh_downloaded_models(self):
+        if self.refresh_pending:
+            return
+        self.refresh_pending = True
+        self.refresh_btn.setEnabled(False)
+        self.statusBar.showMessage("Refreshing downloaded models...")
+        self.jobs.submit("tags", fetch_downloaded_models,
+                         on_finished=self.on_downloaded_models_loaded,
+                         on_failed=self.on_downloaded_models_failed)
+
+    def on_downloaded_models_loaded(self, _, models):
         try:
+            self.refresh_pending = False
+            self.refresh_btn.setEnabled(True)
             self.downloaded_tree.clear()
             
-            result = subprocess.run(
-                ["ollama", "list"], 
-                capture_output=True, 
-                text=True,
-                check=True
-            )
-            
-            lines = result.stdout.strip().split('\n')
-            if lines and len(lines) > 1:
-                for line in lines[1:]:
-                    parts = line.split()
-                    if len(parts) >= 3:
-                        name = parts[0]
-                        size = parts[1]
-                        modified = " ".join(parts[2:])
-                        
-                        item = QTreeWidgetItem(self.downloaded_tree)
-                        item.setText(0, name)
-                        item.setText(1, size)
-                        item.setText(2, modified)
+            for model in models:
+                modified = model.get("modified_at", "")
+                try:
+                    modified = datetime.fromisoformat(modified[:26].rstrip("Z")).strftime("%Y-%m-%d %H:%M")
+                except ValueError:
+                    pass
+                
+                item = QTreeWidgetItem(self.downloaded_tree)
+                item.setText(0, model.get("name", ""))
+                item.setText(1, format_size(model.get("size", 0)))
+                item.setText(2, modified)
             
+            self.statusBar.showMessage(f"{len(models)} downloaded models", 3000)
         except Exception as e:
-            QMessageBox.warning(self, "Error", f"Could not get downloaded models: {e}")
+            QMessageBox.warning(self, "Error", f"Could not show downloaded models: {e}")
+
+    def on_downloaded_models_failed(self, _, error):
+        self.refresh_pending = False
+        self.refresh_btn.setEnabled(True)
+        self.statusBar.showMessage(f"Could not get downloaded models: {error}", 5000)
 
     def update_models(self):
         try:
@@ -625,6 +760,8 @@ class OllamaModelManager(QMainWindow):
                 url = selected_model["url"]
                 
                 if WEB_ENGINE_AVAILABLE:
+                    if self.web_view.url().toString() != url:
+                        self.web_view.setUrl(QUrl(url))
                     self.tab_widget.setCurrentIndex(2)
                     self.statusBar.showMessage(f"Viewing {model_name} page", 3000)
                 else:
@@ -717,57 +854,61 @@ class OllamaModelManager(QMainWindow):
 
     def delete_selected_model(self):
         try:
-            selected_items = self.downloaded_tree.selectedItems()
-            if not selected_items:
+            model_names = [item.text(0) for item in self.downloaded_tree.selectedItems()]
+            if not model_names:
                 QMessageBox.information(self, "Select Model", 
                                       "Please select a model to delete")
                 return
-                
-            model_name = selected_items[0].text(0)
+            if self.pending_deletes:
+                QMessageBox.information(self, "Busy", "Please wait for the current deletion to finish")
+                return
             
+            names_text = "\n".join(f"  {name}" for name in model_names)
             confirm = QMessageBox.question(
                 self,
                 "Confirm Deletion",
-                f"Are you sure you want to delete the model '{model_name}'?\nThis action cannot be undone.",
+                f"Are you sure you want to delete these models?\n{names_text}\nThis action cannot be undone.",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                 QMessageBox.StandardButton.No
             )
             
             if confirm == QMessageBox.StandardButton.Yes:
-                cmd = f"ollama rm {model_name}"
-                
-                progress_dialog = QProgressDialog("Deleting model...", "Cancel", 0, 0, self)
-                progress_dialog.setWindowTitle("Deleting Model")
-                progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-                progress_dialog.show()
-                
-                try:
-                    result = subprocess.run(
-                        cmd, 
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    
-                    progress_dialog.close()
-                    
-                    QMessageBox.information(self, "Success", f"Model '{model_name}' was deleted successfully")
-                    
-                    self.refresh_downloaded_models()
-                    
-                except subprocess.CalledProcessError as e:
-                    progress_dialog.close()
-                    QMessageBox.warning(
-                        self, 
-                        "Error", 
-                        f"Failed to delete model. Error: {e.stderr}"
-                    )
+                self.pending_deletes = set(model_names)
+                self.delete_failures = []
+                self.delete_btn.setEnabled(False)
+                self.statusBar.showMessage(f"Deleting {len(model_names)} model(s)...")
+                for model_name in model_names:
+                    self.jobs.submit(model_name, delete_downloaded_model, model_name,
+                                     on_finished=self.on_model_deleted,
+                                     on_failed=self.on_model_delete_failed)
                     
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error during model deletion: {e}")
 
+    def on_model_deleted(self, model_name, _):
+        self.finish_delete(model_name)
+
+    def on_model_delete_failed(self, model_name, error):
+        self.delete_failures.append(f"{model_name}: {error}")
+        self.finish_delete(model_name)
+
+    def finish_delete(self, model_name):
+        self.pending_deletes.discard(model_name)
+        if self.pending_deletes:
+            self.statusBar.showMessage(f"Deleted {model_name}; {len(self.pending_deletes)} remaining...")
+            return
+        
+        self.delete_btn.setEnabled(True)
+        if self.delete_failures:
+            QMessageBox.warning(self, "Error", "Failed to delete:\n" + "\n".join(self.delete_failures))
+        else:
+            self.statusBar.showMessage("Selected models were deleted successfully", 3000)
+        self.refresh_downloaded_models()
+
     def closeEvent(self, event):
+        # Shut pulls down first, so Ollama sees their connections close even if one has stalled
+        self.download_queue.stop()
+        self.jobs.wait()
         event.accept()
 
 def main():
@@ -0,0 +1,175 @@
+import time
+import logging
+import threading
+import subprocess
+import platform
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional, Any
+
+import requests
+
+logger = logging.getLogger("ollama_supervisor")
+
+
+class OllamaSupervisor:
+    """Owns the ``ollama serve`` child process.
+
+    The child's combined stdout/stderr is drained continuously into a rotating
+    log file so the server can never block on a full pipe. A monitor thread
+    probes ``/api/version``; when the process exits or stops answering for
+    ``max_failed_probes`` probes in a row it is killed and restarted with
+    exponential backoff.
+    """
+
+    def __init__(self,
+                 command: List[str],
+                 base_url: str = "http://localhost:11434",
+                 log_file: str = "ollama_serve.log",
+                 probe_interval: float = 5,
+                 probe_timeout: float = 3,
+                 max_failed_probes: int = 3,
+                 max_backoff: float = 60,
+                 stable_after: float = 120):
+        self.command = command
+        self.base_url = base_url
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.max_failed_probes = max_failed_probes
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+
+        self.process: Optional[subprocess.Popen] = None
+        self.restart_count = 0
+        self.started_at: Optional[float] = None
+        self.last_exit_code: Optional[int] = None
+        self.last_restart_reason: Optional[str] = None
+        self._backoff = 1.0
+        self._lock = threading.RLock()
+        self._stopping = threading.Event()
+        self._monitor_thread: Optional[threading.Thread] = None
+
+        self.output_logger = logging.getLogger("ollama_serve")
+        self.output_logger.propagate = False
+        if not self.output_logger.handlers:
+            handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+            self.output_logger.addHandler(handler)
+        self.output_logger.setLevel(logging.INFO)
+
+    def start(self):
+        """Launch the child process and begin monitoring it."""
+        with self._lock:
+            self._stopping.clear()
+            self._spawn()
+            if not self._monitor_thread or not self._monitor_thread.is_alive():
+                self._monitor_thread = threading.Thread(target=self._monitor, daemon=True)
+                self._monitor_thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Stop monitoring and terminate the child process."""
+        self._stopping.set()
+        with self._lock:
+            self._terminate(timeout)
+
+    def is_healthy(self) -> bool:
+        try:
+            response = requests.get(f"{self.base_url}/api/version", timeout=self.probe_timeout)
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def wait_until_ready(self, timeout: float = 15) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline and not self._stopping.is_set():
+            if self.is_healthy():
+                return True
+            time.sleep(0.5)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = self.process is not None and self.process.poll() is None
+            return {
+                "managed": True,
+                "running": running,
+                "pid": self.process.pid if running else None,
+                "uptime": round(time.time() - self.started_at, 1) if running and self.started_at else 0,
+                "restart_count": self.restart_count,
+                "last_exit_code": self.last_exit_code,
+                "last_restart_reason": self.last_restart_reason
+            }
+
+    def _spawn(self):
+        kwargs = {}
+        if platform.system() == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        logger.info(f"Launching {' '.join(self.command)}")
+        self.process = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            **kwargs
+        )
+        self.started_at = time.time()
+        drain_thread = threading.Thread(target=self._drain, args=(self.process,), daemon=True)
+        drain_thread.start()
+
+    def _drain(self, process: subprocess.Popen):
+        try:
+            for line in iter(process.stdout.readline, b""):
+                self.output_logger.info(line.decode("utf-8", errors="replace").rstrip())
+        except Exception as e:
+            logger.error(f"Error draining Ollama output: {e}")
+        finally:
+            process.stdout.close()
+
+    def _terminate(self, timeout: float = 10):
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def _monitor(self):
+        failed_probes = 0
+        while not self._stopping.wait(self.probe_interval):
+            with self._lock:
+                process = self.process
+                exit_code = process.poll() if process else None
+
+            reason = None
+            if process is None or exit_code is not None:
+                reason = f"process exited with code {exit_code}"
+            elif self.is_healthy():
+                failed_probes = 0
+                if self.started_at and time.time() - self.started_at > self.stable_after:
+                    self._backoff = 1.0
+            else:
+                failed_probes += 1
+                if failed_probes >= self.max_failed_probes:
+                    reason = f"no response to {failed_probes} health probes"
+
+            if reason and not self._stopping.is_set():
+                failed_probes = 0
+                self._restart(reason, exit_code)
+
+    def _restart(self, reason: str, exit_code: Optional[int]):
+        logger.warning(f"Restarting Ollama ({reason}); backing off {self._backoff:.0f}s")
+        with self._lock:
+            self._terminate()
+            self.last_exit_code = exit_code if exit_code is not None else (self.process.returncode if self.process else None)
+            self.last_restart_reason = reason
+        if self._stopping.wait(self._backoff):
+            return
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+        with self._lock:
+            try:
+                self._spawn()
+                self.restart_count += 1
+            except OSError as e:
+                logger.error(f"Failed to relaunch Ollama: {e}")
@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+from threading import RLock
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger("performance_tiers")
+
+
+class PerformanceTier:
+    """Generation settings traded between answer quality and speed."""
+
+    def __init__(self, name: str, num_ctx: int, max_tokens: int, use_small_variant: bool = False,
+                 model: Optional[str] = None):
+        self.name = name
+        self.num_ctx = num_ctx
+        self.max_tokens = max_tokens
+        self.use_small_variant = use_small_variant
+        self.model = model
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "num_ctx": self.num_ctx,
+            "max_tokens": self.max_tokens,
+            "model": self.model or ("smallest installed variant" if self.use_small_variant else None)
+        }
+
+
+# Ordered from best answers to fastest; "balanced" matches the client's long-standing defaults
+TIERS = [
+    PerformanceTier("quality", num_ctx=int(os.environ.get("TIER_QUALITY_CTX", "4096")), max_tokens=6144,
+                    model=os.environ.get("TIER_QUALITY_MODEL") or None),
+    PerformanceTier("balanced", num_ctx=int(os.environ.get("TIER_BALANCED_CTX", "1024")), max_tokens=6144,
+                    model=os.environ.get("TIER_BALANCED_MODEL") or None),
+    PerformanceTier("fast", num_ctx=int(os.environ.get("TIER_FAST_CTX", "1024")),
+                    max_tokens=int(os.environ.get("TIER_FAST_MAX_TOKENS", "256")), use_small_variant=True,
+                    model=os.environ.get("TIER_FAST_MODEL") or None)
+]
+TIER_NAMES = [tier.name for tier in TIERS]
+
+
+def smallest_variant(model_name: str, installed: List[Dict[str, Any]]) -> str:
+    """The smallest installed model of the same family (e.g. 'llama3.2:1b' for 'llama3.2:3b')."""
+    family = model_name.split(":", 1)[0]
+    candidates = [m for m in installed if m.get("name", "").split(":", 1)[0] == family and m.get("size")]
+    if not candidates:
+        return model_name
+    return min(candidates, key=lambda m: m["size"])["name"]
+
+
+def memory_available_fraction() -> Optional[float]:
+    """Share of host memory still available, or None where it can't be read."""
+    if PSUTIL_AVAILABLE:
+        memory = psutil.virtual_memory()
+        return memory.available / memory.total
+    try:
+        with open("/proc/meminfo", "r") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if ":" in line}
+        return fields["MemAvailable"] / fields["MemTotal"]
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+class TierSelector:
+    """Chooses the tier for each request, stepping down under load and back up after it.
+
+    Load is the number of generations in flight to Ollama and the share of
+    host memory still available. Crossing ``queue_depth`` or ``min_memory``
+    drops one tier below ``base``; crossing twice the depth or half the
+    memory drops two. Load is sampled at most every ``sample_interval``
+    seconds, and the tier only steps back up one level at a time after the
+    lower pressure has lasted ``recovery_delay`` seconds, so it doesn't flap.
+    """
+
+    def __init__(self, base: str = "balanced", queue_depth: int = 4, min_memory: float = 0.15,
+                 recovery_delay: float = 30, sample_interval: float = 1.0,
+                 in_flight: Callable[[], int] = lambda: 0,
+                 memory: Callable[[], Optional[float]] = memory_available_fraction):
+        if base not in TIER_NAMES:
+            raise ValueError(f"Unknown tier '{base}', expected one of {', '.join(TIER_NAMES)}")
+        self.base = TIER_NAMES.index(base)
+        self.queue_depth = queue_depth
+        self.min_memory = min_memory
+        self.recovery_delay = recovery_delay
+        self.sample_interval = sample_interval
+        self.in_flight = in_flight
+        self.memory = memory
+        self.level = self.base
+        self.switches = 0
+        self._last_load: Dict[str, Any] = {}
+        self._sampled_at = 0.0
+        self._calm_since: Optional[float] = None
+        self._lock = RLock()
+
+    def _pressure(self, depth: int, memory: Optional[float]) -> int:
+        pressure = 0
+        if self.queue_depth > 0:
+            if depth >= 2 * self.queue_depth:
+                pressure = 2
+            elif depth >= self.queue_depth:
+                pressure = 1
+        if memory is not None and self.min_memory > 0:
+            if memory < self.min_memory / 2:
+                pressure = 2
+            elif memory < self.min_memory:
+                pressure = max(pressure, 1)
+        return pressure
+
+    def _update(self):
+        now = time.monotonic()
+        if now - self._sampled_at < self.sample_interval:
+            return
+        self._sampled_at = now
+        depth = self.in_flight()
+        memory = self.memory()
+        self._last_load = {"in_flight": depth, "memory_available": round(memory, 3) if memory is not None else None}
+        target = min(self.base + self._pressure(depth, memory), len(TIERS) - 1)
+        if target > self.level:
+            logger.warning(f"Load {self._last_load}: degrading to the '{TIER_NAMES[target]}' tier")
+            self.level = target
+            self.switches += 1
+            self._calm_since = None
+        elif target < self.level:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.recovery_delay:
+                self.level -= 1
+                self.switches += 1
+                self._calm_since = now if target < self.level else None
+                logger.info(f"Load {self._last_load}: recovering to the '{TIER_NAMES[self.level]}' tier")
+        else:
+            self._calm_since = None
+
+    @property
+    def base_tier(self) -> PerformanceTier:
+        return TIERS[self.base]
+
+    def select(self, requested: Optional[str] = None) -> PerformanceTier:
+        """Return the requested tier, or the load-based one for None/'auto'."""
+        if requested and requested != "auto":
+            if requested not in TIER_NAMES:
+                raise ValueError(f"Unknown tier '{requested}', expected one of auto, {', '.join(TIER_NAMES)}")
+            return TIERS[TIER_NAMES.index(requested)]
+        with self._lock:
+            self._update()
+            return TIERS[self.level]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "base": TIER_NAMES[self.base],
+                "current": TIER_NAMES[self.level],
+                "switches": self.switches,
+                "load": self._last_load,
+                "tiers": [tier.to_dict() for tier in TIERS]
+            }
@@ -0,0 +1,161 @@
+import time
+import math
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from shared_state import MemoryStateBackend
+
+RATE_LIMIT_NAMESPACE = "rate_limits"
+
+
+class TokenBucket:
+    """A token bucket that refills continuously at ``rate`` tokens per second.
+
+    Times are wall-clock, so a bucket stored in a shared state backend
+    refills correctly in whichever process loads it next.
+    """
+
+    def __init__(self, capacity: float, rate: float, tokens: Optional[float] = None,
+                 updated_at: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity if tokens is None else tokens
+        self.updated_at = time.time() if updated_at is None else updated_at
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, float]], capacity: float, rate: float) -> "TokenBucket":
+        if not state:
+            return cls(capacity, rate)
+        return cls(capacity, rate, state["tokens"], state["updated_at"])
+
+    def state(self) -> Dict[str, float]:
+        return {"tokens": self.tokens, "updated_at": self.updated_at}
+
+    def refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        if self.tokens >= amount or self.rate <= 0:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class RateLimitDecision:
+    """Outcome of a rate limit check, including the reserved cost to settle later."""
+
+    def __init__(self, key: str, allowed: bool, cost: int, limit: int, remaining: float,
+                 retry_after: float, reset_after: float):
+        self.key = key
+        self.allowed = allowed
+        self.cost = cost
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+        self.reset_after = reset_after
+        self.settled = False
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, int(self.remaining))),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class TokenRateLimiter:
+    """Per-client token buckets where each request costs its requested ``max_tokens``.
+
+    ``acquire`` reserves the requested budget up front. Once the generation
+    finishes, ``settle`` refunds the unused part (or charges the overrun)
+    based on Ollama's reported ``eval_count``.
+
+    Buckets are kept in ``backend`` and changed through its atomic
+    ``modify``, so with a backend shared between worker processes the limit
+    holds across all of them. Idle buckets expire once they would be full
+    again, since a missing bucket counts as a full one.
+    """
+
+    def __init__(self, tokens_per_minute: int = 20000, burst: Optional[int] = None,
+                 api_keys: Iterable[str] = (), backend=None):
+        self.enabled = tokens_per_minute > 0
+        self.api_keys = frozenset(api_keys)
+        self.capacity = burst or tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.backend = backend or MemoryStateBackend()
+        # Refilling from one full overrun below zero takes at most this long
+        self.idle_timeout = 2 * self.capacity / self.rate if self.rate > 0 else 0
+
+    def client_key(self, request) -> str:
+        """Identify the caller by API key when it sends a configured one, else by IP address.
+
+        Unknown keys are ignored; otherwise every made-up key would get a
+        fresh bucket.
+        """
+        api_key = request.headers.get("X-API-Key")
+        auth = request.headers.get("Authorization", "")
+        if not api_key and auth.lower().startswith("bearer "):
+            api_key = auth[7:].strip()
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+        return f"ip:{request.remote_addr}"
+
+    def _bucket(self, key: str) -> TokenBucket:
+        """Return a refilled copy of ``key``'s bucket without storing it."""
+        bucket = TokenBucket.from_state(self.backend.get(RATE_LIMIT_NAMESPACE, key), self.capacity, self.rate)
+        bucket.refill()
+        return bucket
+
+    def _modify(self, key: str, change: Callable[[TokenBucket], Any]) -> TokenBucket:
+        """Refill ``key``'s bucket and apply ``change`` to it in one backend transaction."""
+        buckets = []
+
+        def apply(state):
+            bucket = TokenBucket.from_state(state, self.capacity, self.rate)
+            bucket.refill()
+            change(bucket)
+            buckets.append(bucket)
+            return bucket.state()
+
+        self.backend.modify(RATE_LIMIT_NAMESPACE, key, apply, self.idle_timeout)
+        return buckets[-1]
+
+    def acquire(self, key: str, requested_tokens: int) -> RateLimitDecision:
+        if not self.enabled:
+            return RateLimitDecision(key, True, 0, 0, 0, 0, 0)
+        cost = min(max(1, int(requested_tokens)), int(self.capacity))
+        taken = []
+
+        def take(bucket):
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                taken.append(cost)
+
+        bucket = self._modify(key, take)
+        allowed = bool(taken)
+        return RateLimitDecision(
+            key, allowed, cost if allowed else 0, int(self.capacity), bucket.tokens,
+            bucket.seconds_until(cost), bucket.seconds_until(self.capacity)
+        )
+
+    def refresh(self, decision: RateLimitDecision) -> RateLimitDecision:
+        """Update a decision's remaining budget after any settlement."""
+        if self.enabled:
+            bucket = self._bucket(decision.key)
+            decision.remaining = bucket.tokens
+            decision.reset_after = bucket.seconds_until(self.capacity)
+        return decision
+
+    def settle(self, decision: RateLimitDecision, actual_tokens: int):
+        """Replace the reserved cost with the number of tokens actually generated."""
+        if not decision.allowed or decision.settled or not self.enabled:
+            return
+        decision.settled = True
+
+        def refund(bucket):
+            bucket.tokens = min(bucket.capacity, bucket.tokens + decision.cost - max(0, int(actual_tokens)))
+
+        self._modify(decision.key, refund)
@@ -0,0 +1,66 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# Durations in a generation's stats, in nanoseconds, and the spans they become
+OLLAMA_PHASES = (
+    ("first_byte", "first_byte_duration", "Until Ollama responded"),
+    ("load", "load_duration", "Model load"),
+    ("prefill", "prompt_eval_duration", "Prompt evaluation"),
+    ("decode", "eval_duration", "Token generation")
+)
+
+
+class RequestTrace:
+    """Named timing spans for one request, reported as a Server-Timing header.
+
+    Spans are either timed here with ``span()`` or taken from the durations
+    Ollama returns with a finished generation via ``add_ollama_stats()``.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, Optional[str]]] = []
+
+    def add(self, name: str, duration_ms: float, description: Optional[str] = None):
+        self.spans.append((name, duration_ms, description))
+
+    @contextmanager
+    def span(self, name: str, description: Optional[str] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000, description)
+
+    def mark(self, name: str, description: Optional[str] = None):
+        """Record the time from the start of the request until now."""
+        self.add(name, self.elapsed_ms(), description)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def add_ollama_stats(self, stats: Dict[str, Any]):
+        for name, field, description in OLLAMA_PHASES:
+            if stats.get(field) is not None:
+                self.add(name, stats[field] / 1e6, description)
+        # Whatever Ollama's total doesn't attribute to a phase was spent waiting for a slot
+        if stats.get("total_duration") is not None:
+            accounted = sum(stats.get(field) or 0 for field in ("load_duration", "prompt_eval_duration", "eval_duration"))
+            self.add("queue", max(0, stats["total_duration"] - accounted) / 1e6, "Waiting in Ollama")
+
+    def server_timing(self, include_total: bool = True) -> str:
+        entries = []
+        for name, duration, description in self.spans:
+            entry = f"{name};dur={duration:.1f}"
+            if description:
+                entry += f';desc="{description}"'
+            entries.append(entry)
+        if include_total:
+            entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, float]:
+        timings = {name: round(duration, 1) for name, duration, _ in self.spans}
+        timings["total"] = round(self.elapsed_ms(), 1)
+        return timings
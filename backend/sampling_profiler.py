@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval.
+
+    Sampling reads ``sys._current_frames()`` from a background thread, so
+    the profiled code runs unmodified; the cost is one stack walk per thread
+    per sample. Only one profile runs at a time.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._running = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._running.locked()
+
+    def profile(self, seconds: float) -> Dict[str, Any]:
+        """Sample for ``seconds`` and return the aggregated profile; blocks the caller."""
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            return self._sample(seconds)
+        finally:
+            self._running.release()
+
+    def _sample(self, seconds: float) -> Dict[str, Any]:
+        own_thread = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stacks[tuple(reversed(stack))] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return self._summarize(stacks, samples, time.perf_counter() - start)
+
+    @staticmethod
+    def _summarize(stacks: Counter, samples: int, duration: float) -> Dict[str, Any]:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            if stack:
+                own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        top: List[Tuple[str, int]] = own.most_common(30)
+        return {
+            "duration": round(duration, 3),
+            "samples": samples,
+            "top": [{"function": label, "self": count, "total": total[label]} for label, count in top],
+            # One 'outer;...;inner count' line per stack, as flamegraph tools expect
+            "collapsed": "\n".join(f"{';'.join(stack)} {count}"
+                                   for stack, count in stacks.most_common() if stack)
+        }
@@ -1,66 +1,283 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import os
+import re
+import sys
 import json
-import time
-
-def scrape_ollama_models():
-    options = Options()
-    options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--log-level=3')
-
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-
-    print("[*] Loading https://ollama.com/library")
-    driver.get("https://ollama.com/library")
-
-    try:
-        WebDriverWait(driver, 15).until(
-            EC.presence_of_all_elements_located((By.CLASS_NAME, "text-xl"))
-        )
-    except:
-        print("[!] Could not load model cards.")
-        driver.quit()
-        return
-
-    cards = driver.find_elements(By.CSS_SELECTOR, "a[href^='/library/']")
-    models = []
-    seen = set()
-
-    for card in cards:
-        try:
-            href = card.get_attribute("href")
-            if not href or href in seen:
+import argparse
+import threading
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://ollama.com"
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BACKEND_DIR, "ollama_models.json")
+DEFAULT_CACHE_FILE = os.path.join(BACKEND_DIR, "scrape_cache.json")
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+                 "link", "meta", "source", "track", "wbr"}
+
+SIZE_PATTERN = re.compile(r"\b(\d+(?:\.\d+)?\s?[KMGT]B)\b")
+PARAMETERS_PATTERN = re.compile(r"(?:^|[-_])(\d+(?:\.\d+)?(?:x\d+(?:\.\d+)?)?[bBmM])(?=$|[-_])")
+
+
+class _Element:
+    __slots__ = ("tag", "attrs")
+
+    def __init__(self, tag: str, attrs: Dict[str, Optional[str]]):
+        self.tag = tag
+        self.attrs = attrs
+
+
+class PageParser(HTMLParser):
+    """Flattens a page into text chunks, each with the stack of elements it appears in."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[_Element] = []
+        self.texts: List[Tuple[str, Tuple[_Element, ...]]] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(_Element(tag, dict(attrs)))
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        if text:
+            self.texts.append((text, tuple(self.stack)))
+
+
+def _parse(html: str) -> PageParser:
+    parser = PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def _link(stack: Tuple[_Element, ...], pattern) -> Optional[re.Match]:
+    for element in reversed(stack):
+        if element.tag == "a":
+            return pattern.match(element.attrs.get("href") or "")
+    return None
+
+
+def _has_attr(stack: Tuple[_Element, ...], attr: str) -> bool:
+    return any(attr in element.attrs for element in stack)
+
+
+def _enclosing(stack: Tuple[_Element, ...], tag: str) -> Optional[_Element]:
+    for element in reversed(stack):
+        if element.tag == tag:
+            return element
+    return None
+
+
+LIBRARY_LINK = re.compile(r"^(?:https?://[^/]+)?/library/([\w.\-]+)/?$")
+
+
+def parse_library(html: str, base_url: str = BASE_URL) -> List[Dict[str, Any]]:
+    """Extract name, description, capabilities and parameter sizes from the library listing."""
+    models: Dict[str, Dict[str, Any]] = {}
+    description_element: Dict[str, _Element] = {}
+    for text, stack in _parse(html).texts:
+        match = _link(stack, LIBRARY_LINK)
+        if not match:
+            continue
+        slug = match.group(1)
+        model = models.setdefault(slug, {
+            "name": slug,
+            "description": "",
+            "url": f"{base_url}/library/{slug}",
+            "capabilities": [],
+            "sizes": [],
+            "variants": []
+        })
+        if _has_attr(stack, "x-test-search-response-title"):
+            model["name"] = text
+        elif _has_attr(stack, "x-test-capability"):
+            if text not in model["capabilities"]:
+                model["capabilities"].append(text)
+        elif _has_attr(stack, "x-test-size"):
+            if text not in model["sizes"]:
+                model["sizes"].append(text)
+        else:
+            paragraph = _enclosing(stack, "p")
+            if paragraph is None:
                 continue
-            seen.add(href)
+            # Only the first paragraph in a card is the description, even if inline tags split it
+            first = description_element.setdefault(slug, paragraph)
+            if first is paragraph:
+                model["description"] = f"{model['description']} {text}".strip()
+    return list(models.values())
 
-            name = card.find_element(By.CLASS_NAME, "text-xl").text.strip()
-            desc_elem = card.find_element(By.TAG_NAME, "p")
-            description = desc_elem.text.strip() if desc_elem else ""
 
-            models.append({
-                "name": name,
-                "description": description,
-                "url": href if href.startswith("http") else "https://ollama.com" + href,
-                "variants": []
+def parse_tags(html: str, model_name: str) -> List[Dict[str, Any]]:
+    """Extract every tag of ``model_name`` with its download size and parameter count.
+
+    Text following a tag's link, up to the next tag link, is treated as that
+    tag's row; the first size-like string in it (e.g. '4.7GB') is its size.
+    """
+    tag_link = re.compile(rf"^(?:https?://[^/]+)?/library/{re.escape(model_name)}:([\w.\-]+)/?$")
+    variants: Dict[str, Dict[str, Any]] = {}
+    current = None
+    for text, stack in _parse(html).texts:
+        match = _link(stack, tag_link)
+        if match:
+            tag = match.group(1)
+            current = variants.setdefault(tag, {
+                "name": f"{model_name}:{tag}",
+                "tag": tag,
+                "size": None,
+                "parameters": None
             })
+            parameters = PARAMETERS_PATTERN.search(tag)
+            if parameters:
+                current["parameters"] = parameters.group(1).upper()
+        elif current is not None and current["size"] is None:
+            size = SIZE_PATTERN.search(text)
+            if size:
+                current["size"] = size.group(1).replace(" ", "")
+    return list(variants.values())
 
-        except Exception:
-            continue
 
-    print(f"[*] Found {len(models)} models\n")
-    driver.quit()
+class CatalogScraper:
+    """Fetches ollama.com library pages over plain HTTP.
+
+    Pages are requested with the ETag/Last-Modified validators from the
+    previous run, kept with the parsed result in ``cache_file``; a 304 reuses
+    the parsed result without downloading the page. Per-model tag pages are
+    fetched concurrently by at most ``workers`` threads. ``base_url`` can
+    point at a local server of HTML fixtures.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, cache_file: Optional[str] = DEFAULT_CACHE_FILE,
+                 workers: int = 8, timeout: float = 15, session: Optional[requests.Session] = None):
+        self.base_url = base_url.rstrip("/")
+        self.cache_file = cache_file
+        self.workers = workers
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.setdefault("User-Agent", "ollama-model-manager")
+        self.cache: Dict[str, Dict[str, Any]] = self._load_cache()
+        self.stats = {"downloaded": 0, "not_modified": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable scrape cache: {e}")
+            return {}
+
+    def save_cache(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            tmp_path = self.cache_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(tmp_path, self.cache_file)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def fetch(self, path: str, parse: Callable[[str], Any]) -> Any:
+        """Return ``parse`` of the page at ``path``, reusing the cached result when unchanged."""
+        url = self.base_url + path
+        cached = self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached:
+                self._count("not_modified")
+                return cached["data"]
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self._count("failed")
+            if cached:
+                print(f"[!] {url}: {e}; using cached copy")
+                return cached["data"]
+            raise
+        data = parse(response.text)
+        self._count("downloaded")
+        with self._lock:
+            self.cache[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "data": data
+            }
+        return data
+
+    def scrape(self, details: bool = True) -> List[Dict[str, Any]]:
+        models = self.fetch("/library", lambda html: parse_library(html, self.base_url))
+        models = [dict(model) for model in models]
+        if details and models:
+            def fill_variants(model):
+                try:
+                    model["variants"] = self.fetch(f"/library/{model['name']}/tags",
+                                                   lambda html: parse_tags(html, model["name"]))
+                except Exception as e:
+                    print(f"[!] Could not load tags for {model['name']}: {e}")
+                return model
 
-    with open("ollama_models.json", "w", encoding="utf-8") as f:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                models = list(executor.map(fill_variants, models))
+        return models
+
+
+def scrape_ollama_models(output_file: str = DEFAULT_OUTPUT, base_url: str = BASE_URL,
+                         cache_file: Optional[str] = DEFAULT_CACHE_FILE, workers: int = 8,
+                         details: bool = True) -> List[Dict[str, Any]]:
+    scraper = CatalogScraper(base_url, cache_file=cache_file, workers=workers)
+
+    print(f"[*] Loading {scraper.base_url}/library")
+    models = scraper.scrape(details=details)
+    if not models:
+        print("[!] Could not find any models.")
+        return []
+    print(f"[*] Found {len(models)} models "
+          f"({scraper.stats['downloaded']} pages downloaded, {scraper.stats['not_modified']} unchanged, "
+          f"{scraper.stats['failed']} failed)")
+
+    with open(output_file, "w", encoding="utf-8") as f:
         json.dump(models, f, indent=2, ensure_ascii=False)
+    scraper.save_cache()
+
+    print(f"\n[✓] Saved {len(models)} models to '{output_file}'")
+    return models
 
-    print(f"\n[✓] Saved {len(models)} models to 'ollama_models.json'")
 
 if __name__ == "__main__":
-    scrape_ollama_models()
+    parser = argparse.ArgumentParser(description="Scrape the Ollama model library")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-details", action="store_true", help="Skip per-model tag pages")
+    args = parser.parse_args()
+    models = scrape_ollama_models(args.output, args.base_url, args.cache_file, args.workers,
+                                  details=not args.no_details)
+    sys.exit(0 if models else 1)
@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from threading import RLock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LEASE_NAMESPACE = "__leases__"
+
+
+class SimpleCache:
+    """A simple in-memory cache implementation."""
+
+    def __init__(self, default_timeout=300, purge_interval=60):
+        self.cache = {}
+        self.timeouts = {}
+        self.default_timeout = default_timeout
+        self.purge_interval = purge_interval
+        self._purged_at = time.time()
+        self._lock = RLock()
+
+    def get(self, key):
+        """Look up key in the cache and return the value if it exists and hasn't expired."""
+        with self._lock:
+            if key not in self.cache:
+                return None
+            if key in self.timeouts:
+                expiry = self.timeouts[key]
+                if expiry is not None and expiry <= time.time():
+                    del self.cache[key]
+                    del self.timeouts[key]
+                    return None
+            return self.cache[key]
+
+    def set(self, key, value, timeout=None):
+        """Add a new key/value to the cache with optional expiry."""
+        with self._lock:
+            self.cache[key] = value
+            if timeout is None:
+                timeout = self.default_timeout
+            if timeout > 0:
+                self.timeouts[key] = time.time() + timeout
+            else:
+                self.timeouts[key] = None
+            self._purge_expired()
+            return True
+
+    def _purge_expired(self):
+        """Drop expired keys every ``purge_interval`` seconds; ``get`` only expires the key it looks up."""
+        now = time.time()
+        if now - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = now
+        for key in [k for k, expiry in self.timeouts.items() if expiry is not None and expiry <= now]:
+            del self.cache[key]
+            del self.timeouts[key]
+
+    def delete(self, key):
+        """Delete a key from the cache."""
+        with self._lock:
+            if key in self.cache:
+                del self.cache[key]
+                if key in self.timeouts:
+                    del self.timeouts[key]
+                return True
+            return False
+
+    def clear(self):
+        """Clear the entire cache."""
+        with self._lock:
+            self.cache.clear()
+            self.timeouts.clear()
+
+    def items(self) -> List[Tuple[Any, Any]]:
+        """Return a snapshot of all unexpired entries."""
+        with self._lock:
+            now = time.time()
+            return [(k, v) for k, v in self.cache.items()
+                    if self.timeouts.get(k) is None or self.timeouts[k] > now]
+
+
+class MemoryStateBackend:
+    """Process-local state, for running a single server process."""
+
+    def __init__(self):
+        self._namespaces: Dict[str, SimpleCache] = {}
+        self._lock = RLock()
+
+    def _namespace(self, namespace: str) -> SimpleCache:
+        with self._lock:
+            if namespace not in self._namespaces:
+                self._namespaces[namespace] = SimpleCache(default_timeout=0)
+            return self._namespaces[namespace]
+
+    def get(self, namespace: str, key: str) -> Any:
+        return self._namespace(namespace).get(key)
+
+    def set(self, namespace: str, key: str, value: Any, timeout: float = 0):
+        self._namespace(namespace).set(key, value, timeout)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return self._namespace(namespace).delete(key)
+
+    def clear(self, namespace: str):
+        self._namespace(namespace).clear()
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        return self._namespace(namespace).items()
+
+    def update(self, namespace: str, key: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge ``fields`` into a stored record, keeping its expiry."""
+        cache = self._namespace(namespace)
+        with cache._lock:
+            current = cache.get(key)
+            if current is None:
+                return None
+            merged = dict(current, **fields)
+            cache.cache[key] = merged
+            return merged
+
+    def modify(self, namespace: str, key: str, change: Callable[[Any], Any], timeout: float = 0) -> Any:
+        """Replace a value with ``change(current)`` atomically; returns the new value."""
+        cache = self._namespace(namespace)
+        with cache._lock:
+            value = change(cache.get(key))
+            cache.set(key, value, timeout)
+            return value
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return True
+
+
+class SQLiteStateBackend:
+    """State shared between server processes through a SQLite database in WAL mode.
+
+    Every thread gets its own connection. Values are stored as JSON, so
+    only JSON-serializable values can be shared.
+    """
+
+    def __init__(self, path: str = "chat_state.db", purge_interval: float = 60):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _expiry(timeout: float) -> Optional[float]:
+        return time.time() + timeout if timeout and timeout > 0 else None
+
+    def _read(self, conn: sqlite3.Connection, namespace: str, key: str) -> Any:
+        row = conn.execute(
+            "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            return None
+        return json.loads(row[0])
+
+    def _write(self, conn: sqlite3.Connection, namespace: str, key: str, value: Any, timeout: float = 0):
+        conn.execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), self._expiry(timeout))
+        )
+        self._purge_expired(conn)
+
+    def _purge_expired(self, conn: sqlite3.Connection):
+        """Drop expired rows every ``purge_interval`` seconds; reads only expire the key they hit."""
+        now = time.time()
+        if now - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = now
+        conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def get(self, namespace: str, key: str) -> Any:
+        return self._read(self._connection(), namespace, key)
+
+    def set(self, namespace: str, key: str, value: Any, timeout: float = 0):
+        self._write(self._connection(), namespace, key, value, timeout)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+        return cursor.rowcount > 0
+
+    def clear(self, namespace: str):
+        self._connection().execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time())
+        ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def update(self, namespace: str, key: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge ``fields`` into a stored record atomically, keeping its expiry."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._read(conn, namespace, key)
+            merged = None
+            if current is not None:
+                merged = dict(current, **fields)
+                conn.execute(
+                    "UPDATE state SET value = ? WHERE namespace = ? AND key = ?",
+                    (json.dumps(merged), namespace, key)
+                )
+            conn.execute("COMMIT")
+            return merged
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def modify(self, namespace: str, key: str, change: Callable[[Any], Any], timeout: float = 0) -> Any:
+        """Replace a value with ``change(current)`` atomically; returns the new value."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = change(self._read(conn, namespace, key))
+            self._write(conn, namespace, key, value, timeout)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew a named lease; only one owner can hold it until it expires."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            holder = self._read(conn, LEASE_NAMESPACE, name)
+            acquired = holder is None or holder == owner
+            if acquired:
+                self._write(conn, LEASE_NAMESPACE, name, owner, ttl)
+            conn.execute("COMMIT")
+            return acquired
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class SharedCache:
+    """SimpleCache-compatible view of one namespace in a state backend."""
+
+    def __init__(self, backend, namespace: str, default_timeout: float = 300):
+        self.backend = backend
+        self.namespace = namespace
+        self.default_timeout = default_timeout
+
+    def get(self, key):
+        return self.backend.get(self.namespace, key)
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(self.namespace, key, value, self.default_timeout if timeout is None else timeout)
+        return True
+
+    def delete(self, key):
+        return self.backend.delete(self.namespace, key)
+
+    def clear(self):
+        self.backend.clear(self.namespace)
+
+
+class SharedRecords:
+    """Dict-like collection of JSON records stored in a state backend.
+
+    Records must be changed through ``patch`` rather than by mutating the
+    dict returned from a lookup, which is only a copy when the backend is
+    shared between processes.
+    """
+
+    def __init__(self, backend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        value = self.backend.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default=None):
+        value = self.backend.get(self.namespace, key)
+        return default if value is None else value
+
+    def __setitem__(self, key: str, value: Dict[str, Any]):
+        self.backend.set(self.namespace, key, value)
+
+    def __delitem__(self, key: str):
+        if not self.backend.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def pop(self, key: str, default=None):
+        value = self.backend.get(self.namespace, key)
+        self.backend.delete(self.namespace, key)
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return self.backend.get(self.namespace, key) is not None
+
+    def __len__(self) -> int:
+        return len(self.backend.items(self.namespace))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([key for key, _ in self.backend.items(self.namespace)])
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return self.backend.items(self.namespace)
+
+    def values(self) -> List[Dict[str, Any]]:
+        return [value for _, value in self.backend.items(self.namespace)]
+
+    def patch(self, key: str, **fields) -> Optional[Dict[str, Any]]:
+        """Merge ``fields`` into the record stored under ``key``."""
+        return self.backend.update(self.namespace, key, fields)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.backend.items(self.namespace))
+
+
+def create_state_backend(kind: str = "memory", path: str = "chat_state.db"):
+    """Build the state backend named by ``kind`` ('memory' or 'sqlite')."""
+    if kind == "sqlite":
+        return SQLiteStateBackend(path)
+    if kind == "memory":
+        return MemoryStateBackend()
+    raise ValueError(f"Unknown state backend: {kind}")
@@ -0,0 +1,159 @@
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+import posixpath
+from typing import Dict, Optional
+
+from flask import Response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger("static_assets")
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+MIN_COMPRESS_SIZE = 256
+
+ASSET_REF_PATTERN = re.compile(r'(href|src)="([^"#?]+)"')
+
+
+class StaticAsset:
+    """A single frontend file held in memory with its precompressed variants."""
+
+    def __init__(self, path: str, body: bytes, mimetype: str):
+        self.path = path
+        self.body = body
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.etag = f'"{self.digest}"'
+        self.fingerprinted_path = self._fingerprint(path, self.digest)
+        self.encodings: Dict[str, bytes] = {}
+        self._precompress()
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Each encoded body is a different representation, so it gets its own ETag."""
+        return f'"{self.digest}-{encoding}"' if encoding else self.etag
+
+    @staticmethod
+    def _fingerprint(path: str, digest: str) -> str:
+        root, ext = posixpath.splitext(path)
+        return f"{root}.{digest}{ext}"
+
+    def _precompress(self):
+        if len(self.body) < MIN_COMPRESS_SIZE or not self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            return
+        gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if len(gzipped) < len(self.body):
+            self.encodings["gzip"] = gzipped
+        if BROTLI_AVAILABLE:
+            compressed = brotli.compress(self.body, quality=11)
+            if len(compressed) < len(self.body):
+                self.encodings["br"] = compressed
+
+
+class StaticAssetStore:
+    """Loads the frontend into memory once and serves it with fingerprinted URLs.
+
+    Every file is read and precompressed at startup. HTML files have their
+    relative asset references rewritten to fingerprinted URLs under
+    ``url_prefix`` so those can be cached forever, while the HTML itself is
+    revalidated through its ETag.
+    """
+
+    def __init__(self, root_dir: str, url_prefix: str = "/frontend"):
+        self.root_dir = os.path.abspath(root_dir)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.assets: Dict[str, StaticAsset] = {}
+        self.fingerprinted: Dict[str, StaticAsset] = {}
+
+    def load(self):
+        """Read every file under the root directory into memory."""
+        assets = {}
+        raw_html = {}
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.root_dir).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    body = f.read()
+                mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                if mimetype == "text/html":
+                    raw_html[rel_path] = body
+                else:
+                    assets[rel_path] = StaticAsset(rel_path, body, mimetype)
+
+        for rel_path, body in raw_html.items():
+            body = self._rewrite_references(rel_path, body, assets)
+            assets[rel_path] = StaticAsset(rel_path, body, "text/html")
+
+        self.assets = assets
+        self.fingerprinted = {a.fingerprinted_path: a for a in assets.values()}
+
+        total = sum(len(a.body) for a in assets.values())
+        compressed = sum(len(a.encodings.get("br", a.encodings.get("gzip", a.body))) for a in assets.values())
+        logger.info(f"Loaded {len(assets)} static assets ({total} bytes, {compressed} bytes compressed)")
+        return self
+
+    def _rewrite_references(self, html_path: str, body: bytes, assets: Dict[str, StaticAsset]) -> bytes:
+        base_dir = posixpath.dirname(html_path)
+        text = body.decode("utf-8")
+
+        def replace(match):
+            attr, url = match.group(1), match.group(2)
+            if "://" in url or url.startswith(("/", "data:", "mailto:")):
+                return match.group(0)
+            target = posixpath.normpath(posixpath.join(base_dir, url))
+            asset = assets.get(target)
+            if not asset:
+                return match.group(0)
+            return f'{attr}="{self.url_prefix}/{asset.fingerprinted_path}"'
+
+        return ASSET_REF_PATTERN.sub(replace, text).encode("utf-8")
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        asset = self.fingerprinted.get(path)
+        if asset:
+            return asset
+        return self.assets.get(path)
+
+    def url_for(self, path: str) -> str:
+        """Return the fingerprinted URL for a logical asset path."""
+        asset = self.assets.get(path)
+        if not asset:
+            return f"{self.url_prefix}/{path}"
+        return f"{self.url_prefix}/{asset.fingerprinted_path}"
+
+    def serve(self, path: str) -> Optional[Response]:
+        """Build a response for ``path``, or None if no such asset exists."""
+        asset = self.get(path)
+        if asset is None:
+            return None
+
+        immutable = path == asset.fingerprinted_path and path != asset.path
+        accepted = request.headers.get("Accept-Encoding", "")
+        encoding = next((e for e in ("br", "gzip") if e in asset.encodings and e in accepted), None)
+        etag = asset.etag_for(encoding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=304, headers=headers)
+
+        body = asset.body
+        if encoding:
+            body = asset.encodings[encoding]
+            headers["Content-Encoding"] = encoding
+
+        headers["Content-Length"] = str(len(body))
+        return Response(body, mimetype=asset.mimetype, headers=headers)
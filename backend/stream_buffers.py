@@ -0,0 +1,134 @@
+import json
+import time
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from threading import RLock
+
+
+class GenerationBuffer:
+    """Bounded, numbered event log for one streamed generation.
+
+    The producer appends events as the model generates them; any number of
+    readers can follow along from an arbitrary sequence number, which is how
+    a dropped SSE connection resumes from its ``Last-Event-ID``. Readers
+    attach and detach so the producer can tell when nobody has been
+    listening for a while, and ``cancel()`` asks it to stop.
+    """
+
+    def __init__(self, generation_id: str, max_events: int = 4096):
+        self.id = generation_id
+        self.events = deque(maxlen=max_events)
+        self.next_seq = 1
+        self.done = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.readers = 0
+        self.unread_since = time.time()
+        self.cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    def append(self, payload: Dict[str, Any]) -> int:
+        with self._cond:
+            seq = self.next_seq
+            self.events.append((seq, payload))
+            self.next_seq += 1
+            self._cond.notify_all()
+            return seq
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def attach(self):
+        with self._cond:
+            self.readers += 1
+
+    def detach(self):
+        with self._cond:
+            self.readers -= 1
+            if self.readers == 0:
+                self.unread_since = time.time()
+
+    def abandoned(self, timeout: float) -> bool:
+        """True if no reader has been attached for ``timeout`` seconds."""
+        with self._cond:
+            return self.readers == 0 and time.time() - self.unread_since > timeout
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def should_stop(self, timeout: float) -> bool:
+        """Whether the producer should give up: cancelled, or unread for ``timeout`` seconds."""
+        return self.cancelled.is_set() or self.abandoned(timeout)
+
+    @property
+    def first_seq(self) -> int:
+        with self._cond:
+            return self.events[0][0] if self.events else self.next_seq
+
+    def can_resume(self, after: int) -> bool:
+        """True if every event after ``after`` is still retained."""
+        return self.first_seq <= after + 1 <= self.next_seq
+
+    def read(self, after: int, timeout: float = 15) -> Tuple[List[Tuple[int, Dict[str, Any]]], bool]:
+        """Return events newer than ``after``, waiting up to ``timeout`` for one."""
+        with self._cond:
+            if after + 1 >= self.next_seq and not self.done:
+                self._cond.wait(timeout)
+            if not self.events:
+                return [], self.done
+            start = max(0, after + 1 - self.events[0][0])
+            return list(islice(self.events, start, None)), self.done
+
+    def format_event(self, seq: int, payload: Dict[str, Any]) -> str:
+        return f"id: {self.id}:{seq}\ndata: {json.dumps(payload)}\n\n"
+
+
+class GenerationBufferRegistry:
+    """Keeps generation buffers alive for ``ttl`` seconds after they finish."""
+
+    def __init__(self, ttl: float = 120, max_events: int = 4096):
+        self.ttl = ttl
+        self.max_events = max_events
+        self._buffers: Dict[str, GenerationBuffer] = {}
+        self._lock = RLock()
+
+    def create(self, generation_id: str) -> GenerationBuffer:
+        with self._lock:
+            self.purge()
+            buffer = GenerationBuffer(generation_id, max_events=self.max_events)
+            self._buffers[generation_id] = buffer
+            return buffer
+
+    def get(self, generation_id: str) -> Optional[GenerationBuffer]:
+        with self._lock:
+            self.purge()
+            return self._buffers.get(generation_id)
+
+    def purge(self):
+        """Drop buffers whose retention period has passed."""
+        now = time.time()
+        with self._lock:
+            expired = [gid for gid, buf in self._buffers.items()
+                       if buf.finished_at is not None and now - buf.finished_at > self.ttl]
+            for gid in expired:
+                del self._buffers[gid]
+
+    def __len__(self):
+        return len(self._buffers)
+
+    @staticmethod
+    def parse_event_id(event_id: str) -> Tuple[Optional[str], int]:
+        """Split a ``<generation_id>:<seq>`` SSE id into its parts."""
+        if not event_id or ":" not in event_id:
+            return None, 0
+        generation_id, _, seq = event_id.rpartition(":")
+        try:
+            return generation_id, int(seq)
+        except ValueError:
+            return None, 0
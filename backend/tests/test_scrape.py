@@ -0,0 +1,78 @@
+import os
+
+import requests
+
+from scrape import CatalogScraper, parse_library, parse_tags
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class FakeSession(requests.Session):
+    """Serves fixture pages and honours If-None-Match like ollama.com does."""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, dict(headers)))
+        path = url.split("://", 1)[-1].split("/", 1)[-1]
+        etag = f'"{path}-v1"'
+        response = requests.Response()
+        response.url = url
+        response.headers["ETag"] = etag
+        if headers.get("If-None-Match") == etag:
+            response.status_code = 304
+            return response
+        response.status_code = 200
+        response.encoding = "utf-8"
+        response._content = read_fixture(self.pages[path]).encode("utf-8")
+        return response
+
+
+def test_parse_library():
+    models = parse_library(read_fixture("library.html"), "https://ollama.com")
+    assert [m["name"] for m in models] == ["llama3.2", "nomic-embed-text"]
+    llama, embed = models
+    assert llama["url"] == "https://ollama.com/library/llama3.2"
+    assert llama["description"] == "Meta's Llama 3.2 goes small with 1B and 3B models."
+    assert llama["capabilities"] == ["tools"]
+    assert llama["sizes"] == ["1b", "3b"]
+    assert embed["description"] == "A high-performing open embedding model."
+    assert embed["capabilities"] == ["embedding"]
+    assert embed["sizes"] == []
+
+
+def test_parse_tags():
+    variants = parse_tags(read_fixture("tags.html"), "llama3.2")
+    assert variants == [
+        {"name": "llama3.2:latest", "tag": "latest", "size": "2.0GB", "parameters": None},
+        {"name": "llama3.2:1b", "tag": "1b", "size": "1.3GB", "parameters": "1B"},
+        {"name": "llama3.2:3b-instruct-q4_K_M", "tag": "3b-instruct-q4_K_M", "size": "2.0GB", "parameters": "3B"},
+    ]
+
+
+def test_unchanged_pages_are_reused_from_cache(tmp_path):
+    cache_file = str(tmp_path / "scrape_cache.json")
+    pages = {"library": "library.html", "library/llama3.2/tags": "tags.html",
+             "library/nomic-embed-text/tags": "tags.html"}
+
+    first = CatalogScraper("http://fixtures", cache_file=cache_file, workers=2, session=FakeSession(pages))
+    models = first.scrape()
+    first.save_cache()
+    assert first.stats == {"downloaded": 3, "not_modified": 0, "failed": 0}
+
+    session = FakeSession(pages)
+    second = CatalogScraper("http://fixtures", cache_file=cache_file, workers=2, session=session)
+    assert second.scrape() == models
+    assert second.stats == {"downloaded": 0, "not_modified": 3, "failed": 0}
+    assert all(headers.get("If-None-Match") for _, headers in session.requests)
+    llama = next(m for m in models if m["name"] == "llama3.2")
+    assert [v["tag"] for v in llama["variants"]] == ["latest", "1b", "3b-instruct-q4_K_M"]
@@ -0,0 +1,71 @@
+import os
+import json
+import time
+import logging
+from threading import RLock
+from typing import Any, Dict, List, Optional, Tuple
+
+from scrape import CatalogScraper, parse_tags
+
+logger = logging.getLogger("variant_cache")
+
+DEFAULT_VARIANT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "variant_cache.json")
+
+
+class VariantCache:
+    """Each model's tags and sizes, kept on disk and refreshed after ``ttl`` seconds.
+
+    Lookups never touch the network: they return whatever is stored, plus
+    whether it is still fresh, so callers can show it immediately and call
+    ``refresh`` from a worker thread when it is stale. Refreshes fetch the
+    model's tags page through a CatalogScraper, so unchanged pages cost a 304.
+    """
+
+    def __init__(self, cache_file: str = DEFAULT_VARIANT_CACHE, ttl: float = 24 * 3600,
+                 scraper: Optional[CatalogScraper] = None):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.scraper = scraper or CatalogScraper(workers=2)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = RLock()
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable variant cache: {e}")
+
+    def _save(self):
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def get(self, model_name: str) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """Return the stored variants (None if never fetched) and whether they are fresh."""
+        with self._lock:
+            entry = self._entries.get(model_name)
+        if entry is None:
+            return None, False
+        return entry["variants"], time.time() - entry["fetched_at"] < self.ttl
+
+    def seed(self, models: List[Dict[str, Any]], fetched_at: float):
+        """Take variants from a scraped catalog where they are newer than the cached ones."""
+        with self._lock:
+            changed = False
+            for model in models:
+                entry = self._entries.get(model["name"])
+                if model.get("variants") and (entry is None or entry["fetched_at"] < fetched_at):
+                    self._entries[model["name"]] = {"variants": model["variants"], "fetched_at": fetched_at}
+                    changed = True
+            if changed:
+                self._save()
+
+    def refresh(self, model_name: str) -> List[Dict[str, Any]]:
+        """Fetch the model's tags page and store its variants; blocks on the network."""
+        variants = self.scraper.fetch(f"/library/{model_name}/tags", lambda html: parse_tags(html, model_name))
+        with self._lock:
+            self._entries[model_name] = {"variants": variants, "fetched_at": time.time()}
+            self._save()
+            self.scraper.save_cache()
+        return variants
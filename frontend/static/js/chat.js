@@ -9,10 +9,9 @@ document.addEventListener("DOMContentLoaded", () => {
     const OPTIMIZATION = {
         useStreaming: true,
         maxResponseTokens: 3072, // Increased from 512 to 3072 (6x)
-        streamChunkSize: 10,
-        chunkBufferThreshold: 25,
         streamTimeout: 60000, // 60 second timeout for streams
-        maxStreamErrors: 3 // Maximum consecutive errors before falling back
+        maxStreamErrors: 3, // Maximum consecutive errors before falling back
+        maxResumeAttempts: 3 // Reconnects per answer using Last-Event-ID
     };
 
     const domCache = {
@@ -259,6 +258,7 @@ document.addEventListener("DOMContentLoaded", () => {
         }
         const { fragment: userFragment } = createMessageElement("user", message);
         messages.appendChild(userFragment);
+        recordChatMessage("user", message);
         const { fragment: botFragment, messageContainer: botMessageContainer, 
                 messageContent: botMessageContent } = createMessageElement("bot", "", true);
         messages.appendChild(botFragment);
@@ -285,7 +285,8 @@ document.addEventListener("DOMContentLoaded", () => {
                     method: "POST",
                     headers: { 
                         "Content-Type": "application/json",
-                        "Connection": "keep-alive"
+                        "Connection": "keep-alive",
+                        "X-Client-Id": clientId()
                     },
                     body: JSON.stringify({ 
                         message,
@@ -298,94 +299,73 @@ document.addEventListener("DOMContentLoaded", () => {
                 if (response.ok) {
                     botMessageContent.innerHTML = `<div class="message-role bot-role">Assistant</div>`;
                     botMessageContent.appendChild(responseElement);
-                    const reader = response.body.getReader();
-                    const decoder = new TextDecoder();
-                    let responseText = '';
-                    let batchedChunks = '';
-                    let updatesPending = 0;
+                    let reader = response.body.getReader();
+                    const parser = new SSEFrameParser();
+                    let lastEventId = null;
+                    let resumeAttempts = 0;
                     let lastScrollTime = 0;
-                    let chunkCount = 0;
-                    const maxChunks = 5000;
+                    let finished = false;
                     const scrollThrottleTime = 150;
+                    responseElement.style.whiteSpace = 'pre-wrap';
+                    const renderer = new StreamingTextRenderer(responseElement, () => {
+                        const now = performance.now();
+                        if (now - lastScrollTime > scrollThrottleTime) {
+                            messages.scrollTop = messages.scrollHeight;
+                            lastScrollTime = now;
+                        }
+                    });
 
                     try {
-                        while (true) {
-                            const { value, done } = await reader.read();
-                            if (done) break;
-
-                            chunkCount++;
-                            if (chunkCount > maxChunks) {
-                                console.warn("Maximum chunk count exceeded, terminating stream");
-                                break;
-                            }
-
-                            const chunk = decoder.decode(value, { stream: true });
-                            const lines = chunk.split('\n\n');
-                            let hasUpdate = false;
-
-                            for (const line of lines) {
-                                if (line.startsWith('data: ')) {
-                                    try {
-                                        const data = JSON.parse(line.slice(6));
-                                        if (data.error) {
-                                            responseElement.innerHTML = `<span class="error">Error: ${data.error}</span>`;
-                                            break;
-                                        } else if (data.done) {
-                                            break;
-                                        } else if (data.chunk) {
-                                            // Improved chunk handling to prevent duplicates
-                                            const newChunk = data.chunk.trim();
-                                            
-                                            // Skip empty chunks
-                                            if (!newChunk) continue;
-                                            
-                                            // Simple duplicate prevention - don't add the same chunk twice in a row
-                                            if (batchedChunks.endsWith(newChunk) || responseText.endsWith(newChunk)) {
-                                                console.log("Skipping duplicate chunk:", newChunk);
-                                                continue;
-                                            }
-                                            
-                                            batchedChunks += newChunk;
-                                            hasUpdate = true;
-                                            updatesPending++;
-                                        }
-                                    } catch (e) {
-                                        console.error('Error parsing SSE data', e);
-                                        continue;
-                                    }
+                        while (!finished) {
+                            let result;
+                            try {
+                                result = await reader.read();
+                            } catch (readError) {
+                                const signal = activeStreamConnection && activeStreamConnection.signal;
+                                if (lastEventId && signal && !signal.aborted &&
+                                    resumeAttempts < OPTIMIZATION.maxResumeAttempts) {
+                                    resumeAttempts++;
+                                    console.log("Stream dropped, resuming after", lastEventId);
+                                    reader = await resumeChatStream(lastEventId, signal);
+                                    parser.reset();
+                                    if (reader) continue;
                                 }
+                                throw readError;
                             }
+                            const { value, done } = result;
+                            if (done) break;
 
-                            const now = performance.now();
-                            if ((hasUpdate && batchedChunks.length > OPTIMIZATION.chunkBufferThreshold) || 
-                                (updatesPending > 10) || 
-                                (now - lastScrollTime > scrollThrottleTime)) {
-                                responseText += batchedChunks;
-                                window.requestAnimationFrame(() => {
-                                    // Clean up any potential duplicate phrases that might occur at chunk boundaries
-                                    const cleanedText = responseText.replace(/(.{15,50})(\s+\1)/g, "$1");
-                                    if (cleanedText !== responseText) {
-                                        console.log("Cleaned up duplicate phrase in response");
-                                        responseText = cleanedText;
-                                    }
-                                    
-                                    responseElement.textContent = responseText;
-                                    if (batchedChunks.length > OPTIMIZATION.chunkBufferThreshold) {
-                                        messages.scrollTop = messages.scrollHeight;
-                                        lastScrollTime = now;
-                                    }
-                                });
-                                batchedChunks = '';
-                                updatesPending = 0;
+                            for (const event of parser.push(value)) {
+                                if (event.id) lastEventId = event.id;
+                                if (event.data === null) continue;
+                                let data;
+                                try {
+                                    data = JSON.parse(event.data);
+                                } catch (e) {
+                                    console.error('Error parsing SSE data', e);
+                                    continue;
+                                }
+                                if (data.error) {
+                                    responseElement.innerHTML = `<span class="error">Error: ${data.error}</span>`;
+                                    finished = true;
+                                    break;
+                                } else if (data.done) {
+                                    finished = true;
+                                    recordChatMessage("bot", renderer.text);
+                                    break;
+                                } else if (data.chunk) {
+                                    renderer.append(data.chunk);
+                                }
                             }
                         }
+                        renderer.flush();
                         streamErrorCount = 0;
                     } catch (streamError) {
                         console.error("Stream reading error:", streamError);
                         streamErrorCount++;
 
-                        if (responseText.length > 0) {
-                            responseElement.textContent = responseText;
+                        if (renderer.text.length > 0) {
+                            renderer.flush();
                         } else {
                             responseElement.innerHTML = 
                                 `<span class="error">Error during streaming: ${streamError.message}</span>`;
@@ -409,7 +389,8 @@ document.addEventListener("DOMContentLoaded", () => {
                     method: "POST",
                     headers: { 
                         "Content-Type": "application/json",
-                        "Connection": "keep-alive"
+                        "Connection": "keep-alive",
+                        "X-Client-Id": clientId()
                     },
                     body: JSON.stringify({ 
                         message,
@@ -426,6 +407,7 @@ document.addEventListener("DOMContentLoaded", () => {
                     botMessageContent.innerHTML = `<div class="message-role bot-role">Assistant</div>`;
                     responseElement.textContent = data.response || "I don't have a response for that.";
                     botMessageContent.appendChild(responseElement);
+                    recordChatMessage("bot", data.response);
                 }
             }
         } catch (error) {
@@ -466,77 +448,89 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
-    // Add chat history persistence
-    const CHAT_HISTORY_KEY = 'xar_chat_history';
-    let lastSaveTime = 0;
-    const SAVE_INTERVAL = 5000; // Save at most every 5 seconds
+    // Chat history lives on the server; only the current conversation id is kept locally
+    const CONVERSATION_KEY = 'xar_conversation_id';
+    const HISTORY_PAGE_SIZE = 30;
+    let conversationId = localStorage.getItem(CONVERSATION_KEY);
+    let olderMessagesCursor = null;
+    let hasOlderMessages = Boolean(conversationId);
+    let loadingOlderMessages = false;
+    let historyWrites = Promise.resolve();
+
+    function newConversationId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID().replace(/-/g, '');
+        }
+        return `${Date.now().toString(16)}${Math.random().toString(16).slice(2)}`;
+    }
 
-    // Load chat history on startup
-    function loadChatHistory() {
-        try {
-            const savedChat = localStorage.getItem(CHAT_HISTORY_KEY);
-            if (savedChat) {
-                const chatData = JSON.parse(savedChat);
-                // Only restore if we have messages and they're not too old (24 hours max)
-                if (chatData.messages && chatData.messages.length > 0 && 
-                    (Date.now() - chatData.timestamp) < 24 * 60 * 60 * 1000) {
-                    
-                    // Reconstruct messages from saved data
-                    chatData.messages.forEach(msg => {
-                        const { fragment } = createMessageElement(msg.role, msg.content);
-                        messages.appendChild(fragment);
-                    });
-                    
-                    handleXarTitleVisibility();
-                    window.requestAnimationFrame(() => {
-                        messages.scrollTop = messages.scrollHeight;
-                    });
-                    
-                    console.log("Restored chat history with", chatData.messages.length, "messages");
-                }
-            }
-        } catch (e) {
-            console.error("Error loading chat history:", e);
-            // If there's a corruption, clear the history
-            localStorage.removeItem(CHAT_HISTORY_KEY);
+    // Append one finished message; writes are chained so they reach the server in order
+    function recordChatMessage(role, content) {
+        if (!content) return;
+        if (!conversationId) {
+            conversationId = newConversationId();
+            localStorage.setItem(CONVERSATION_KEY, conversationId);
         }
+        const id = conversationId;
+        historyWrites = historyWrites
+            .then(() => fetch(`${API_URL}/history/conversations/${id}/messages`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json", "X-Client-Id": clientId() },
+                body: JSON.stringify({ role: role === "user" ? "user" : "assistant", content })
+            }))
+            .catch(e => console.error("Error saving chat message:", e));
     }
 
-    // Save chat history but throttle to prevent excessive writes
-    function saveChatHistory() {
-        const now = Date.now();
-        if (now - lastSaveTime < SAVE_INTERVAL) return;
-        
-        lastSaveTime = now;
+    // Load the next page of older messages and insert it above the current ones
+    async function loadOlderMessages() {
+        if (!conversationId || !hasOlderMessages || loadingOlderMessages) return;
+        loadingOlderMessages = true;
         try {
-            const chatMessages = [];
-            document.querySelectorAll('.message-container').forEach(container => {
-                const isUser = container.classList.contains('user-message');
-                const role = isUser ? 'user' : 'bot';
-                
-                // Get the content (skip the role div)
-                const contentDivs = container.querySelectorAll('.message-content > div:not(.message-role):not(.thoughts-toggle):not(.thoughts-container)');
-                if (contentDivs.length > 0) {
-                    let content = '';
-                    contentDivs.forEach(div => {
-                        content += div.textContent;
-                    });
-                    
-                    chatMessages.push({ role, content });
-                }
+            const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+            if (olderMessagesCursor !== null) params.set("before", olderMessagesCursor);
+            const response = await fetch(`${API_URL}/history/conversations/${conversationId}/messages?${params}`, {
+                headers: { "X-Client-Id": clientId() }
             });
-            
-            if (chatMessages.length > 0) {
-                const chatData = {
-                    timestamp: Date.now(),
-                    messages: chatMessages
-                };
-                localStorage.setItem(CHAT_HISTORY_KEY, JSON.stringify(chatData));
+            if (!response.ok) {
+                hasOlderMessages = false;
+                return;
+            }
+            const page = await response.json();
+            const fragment = document.createDocumentFragment();
+            // Pages arrive newest first
+            for (let i = page.messages.length - 1; i >= 0; i--) {
+                const msg = page.messages[i];
+                fragment.appendChild(createMessageElement(msg.role === "user" ? "user" : "bot", msg.content).fragment);
             }
+            const previousHeight = messages.scrollHeight;
+            messages.insertBefore(fragment, messages.firstChild);
+            // Keep the messages the user was looking at in place
+            messages.scrollTop += messages.scrollHeight - previousHeight;
+            olderMessagesCursor = page.next_before;
+            hasOlderMessages = page.next_before !== null;
         } catch (e) {
-            console.error("Error saving chat history:", e);
+            console.error("Error loading chat history:", e);
+        } finally {
+            loadingOlderMessages = false;
         }
     }
+
+    async function loadChatHistory() {
+        if (!conversationId) return;
+        await loadOlderMessages();
+        handleXarTitleVisibility();
+        window.requestAnimationFrame(() => {
+            messages.scrollTop = messages.scrollHeight;
+        });
+    }
+
+    messages.addEventListener("scroll", () => {
+        if (messages.scrollTop < 200) {
+            loadOlderMessages();
+        }
+    }, { passive: true });
+
+    window.recordChatMessage = recordChatMessage;
     
     // Fix potential memory leaks with all running connections
     function cleanupConnections() {
@@ -562,23 +556,11 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
-    // Create improved message element function that triggers history saving
-    const originalCreateMessageElement = createMessageElement;
-    createMessageElement = function(role, content, isTyping = false) {
-        const result = originalCreateMessageElement(role, content, isTyping);
-        // Only save history for real messages, not typing indicators
-        if (!isTyping) {
-            setTimeout(saveChatHistory, 100);
-        }
-        return result;
-    };
-    
     // Handle page visibility changes to prevent memory issues
     document.addEventListener('visibilitychange', () => {
         if (document.visibilityState === 'hidden') {
             // Page is hidden, cleanup resources
             cleanupConnections();
-            saveChatHistory();
         } else {
             // Page is visible again
             console.log("Page visible again");
@@ -590,25 +572,10 @@ document.addEventListener("DOMContentLoaded", () => {
     window.addEventListener('beforeunload', (event) => {
         if (!hasUnloaded) {
             cleanupConnections();
-            saveChatHistory();
             hasUnloaded = true;
         }
     });
 
-    // Modified send button handler to update chat history after sending
-    const originalClickHandler = sendBtn.onclick;
-    sendBtn.onclick = async function() {
-        // Original handler logic
-        if (originalClickHandler) {
-            await originalClickHandler.apply(this, arguments);
-        } else {
-            // ...existing code...
-        }
-        
-        // Save after each message
-        setTimeout(saveChatHistory, 500);
-    };
-    
     // Add enhanced error recovery for streams
     async function handleStreamError(error, botMessageContent, responseElement, partialResponseText = '') {
         console.error("Stream error:", error);
@@ -647,8 +614,11 @@ document.addEventListener("DOMContentLoaded", () => {
         // Reset any error counters
         streamErrorCount = 0;
         
-        // Clear chat history from storage
-        localStorage.removeItem(CHAT_HISTORY_KEY);
+        // Start a new conversation; the old one stays in the server-side history
+        conversationId = null;
+        olderMessagesCursor = null;
+        hasOlderMessages = false;
+        localStorage.removeItem(CONVERSATION_KEY);
         
         // Reset XAR title container
         if (xarTitleContainer) {
@@ -377,6 +377,7 @@ document.addEventListener("DOMContentLoaded", () => {
             `;
             userMessageContainer.appendChild(userMessageContent);
             messages.appendChild(userMessageContainer);
+            if (window.recordChatMessage) window.recordChatMessage("user", message);
             userInput.value = "";
             userInput.disabled = true;
             sendBtn.disabled = true;
@@ -396,7 +397,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 if (streamingSupported) {
                     const response = await fetch("http://localhost:5000/chat", {
                         method: "POST",
-                        headers: { "Content-Type": "application/json" },
+                        headers: { "Content-Type": "application/json", "X-Client-Id": clientId() },
                         body: JSON.stringify({ 
                             message, 
                             stream: true,
@@ -404,54 +405,82 @@ document.addEventListener("DOMContentLoaded", () => {
                         }),
                     });
                     if (response.ok) {
-                        const reader = response.body.getReader();
-                        const decoder = new TextDecoder();
-                        let responseText = '';
+                        let reader = response.body.getReader();
+                        const parser = new SSEFrameParser();
+                        let lastEventId = null;
+                        let resumeAttempts = 0;
                         let thoughtsText = '';
+                        let finished = false;
                         botMessageContent.innerHTML = `<div class="message-role bot-role">Assistant</div>`;
                         let responseElement = document.createElement("div");
+                        // Stream as plain text nodes; markdown is rendered once the answer is complete
+                        responseElement.style.whiteSpace = 'pre-wrap';
                         botMessageContent.appendChild(responseElement);
-                        while (true) {
-                            const { value, done } = await reader.read();
+                        const renderer = new StreamingTextRenderer(responseElement, () => {
+                            messages.scrollTop = messages.scrollHeight;
+                        });
+                        while (!finished) {
+                            let result;
+                            try {
+                                result = await reader.read();
+                            } catch (readError) {
+                                if (lastEventId && resumeAttempts < 3) {
+                                    resumeAttempts++;
+                                    reader = await resumeChatStream(lastEventId);
+                                    parser.reset();
+                                    if (reader) continue;
+                                }
+                                throw readError;
+                            }
+                            const { value, done } = result;
                             if (done) break;
-                            const chunk = decoder.decode(value, { stream: true });
-                            const lines = chunk.split('\n\n');
-                            for (const line of lines) {
-                                if (line.startsWith('data: ')) {
-                                    try {
-                                        const data = JSON.parse(line.slice(6));
-                                        if (data.error) {
-                                            responseElement.innerHTML = `<span class="error">Error: ${data.error}</span>`;
-                                            break;
-                                        } else if (data.done) {
-                                            if (data.thoughts || thoughtsText) {
-                                                thoughtsText = data.thoughts || thoughtsText;
-                                                const thoughtsToggle = document.createElement("div");
-                                                thoughtsToggle.className = "thoughts-toggle";
-                                                thoughtsToggle.innerHTML = `<i class="ri-arrow-down-s-line"></i>Show thoughts`;
-                                                const thoughtsContainer = document.createElement("div");
-                                                thoughtsContainer.className = "thoughts-container";
-                                                const thoughtsContent = document.createElement("div");
-                                                thoughtsContent.className = "thoughts-content";
-                                                thoughtsContent.innerText = thoughtsText;
-                                                thoughtsContainer.appendChild(thoughtsContent);
-                                                botMessageContent.appendChild(thoughtsToggle);
-                                                botMessageContent.appendChild(thoughtsContainer);
-                                            }
-                                            break;
-                                        } else if (data.chunk) {
-                                            responseText += data.chunk;
-                                            responseElement.innerHTML = marked.parse(responseText);
-                                            messages.scrollTop = messages.scrollHeight;
-                                        } else if (data.thought_chunk) {
-                                            thoughtsText += data.thought_chunk;
-                                        }
-                                    } catch (e) {
-                                        console.error('Error parsing SSE data', e);
+                            for (const event of parser.push(value)) {
+                                if (event.id) lastEventId = event.id;
+                                if (event.data === null) continue;
+                                let data;
+                                try {
+                                    data = JSON.parse(event.data);
+                                } catch (e) {
+                                    console.error('Error parsing SSE data', e);
+                                    continue;
+                                }
+                                if (data.error) {
+                                    renderer.pending = '';
+                                    responseElement.innerHTML = `<span class="error">Error: ${data.error}</span>`;
+                                    finished = true;
+                                    break;
+                                } else if (data.done) {
+                                    finished = true;
+                                    renderer.pending = '';
+                                    responseElement.style.whiteSpace = '';
+                                    responseElement.innerHTML = marked.parse(renderer.text);
+                                    if (window.recordChatMessage) window.recordChatMessage("bot", renderer.text);
+                                    if (data.thoughts || thoughtsText) {
+                                        thoughtsText = data.thoughts || thoughtsText;
+                                        const thoughtsToggle = document.createElement("div");
+                                        thoughtsToggle.className = "thoughts-toggle";
+                                        thoughtsToggle.innerHTML = `<i class="ri-arrow-down-s-line"></i>Show thoughts`;
+                                        const thoughtsContainer = document.createElement("div");
+                                        thoughtsContainer.className = "thoughts-container";
+                                        const thoughtsContent = document.createElement("div");
+                                        thoughtsContent.className = "thoughts-content";
+                                        thoughtsContent.innerText = thoughtsText;
+                                        thoughtsContainer.appendChild(thoughtsContent);
+                                        botMessageContent.appendChild(thoughtsToggle);
+                                        botMessageContent.appendChild(thoughtsContainer);
                                     }
+                                    messages.scrollTop = messages.scrollHeight;
+                                    break;
+                                } else if (data.chunk) {
+                                    renderer.append(data.chunk);
+                                } else if (data.thought_chunk) {
+                                    thoughtsText += data.thought_chunk;
                                 }
                             }
                         }
+                        if (!finished) {
+                            renderer.flush();
+                        }
                     } else {
                         const errorData = await response.json();
                         botMessageContent.innerHTML = `
@@ -462,7 +491,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 } else {
                     const response = await fetch("http://localhost:5000/chat", {
                         method: "POST",
-                        headers: { "Content-Type": "application/json" },
+                        headers: { "Content-Type": "application/json", "X-Client-Id": clientId() },
                         body: JSON.stringify({ 
                             message,
                             include_thoughts: true
@@ -479,6 +508,7 @@ document.addEventListener("DOMContentLoaded", () => {
                         const responseElement = document.createElement("div");
                         responseElement.innerHTML = marked.parse(data.response || "I don't have a response for that.");
                         botMessageContent.appendChild(responseElement);
+                        if (window.recordChatMessage) window.recordChatMessage("bot", data.response);
                         if (data.thoughts) {
                             const thoughtsToggle = document.createElement("div");
                             thoughtsToggle.className = "thoughts-toggle";
@@ -246,3 +246,101 @@ if (reloadFrequency > 1) {
 
 // Export to window object for global access
 window.apiCallManager = apiCallManager;
+
+// Split one SSE frame ("id: ...\ndata: ...") into its fields
+function parseSSEFrame(frame) {
+    const event = { id: null, data: null };
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('id: ')) {
+            event.id = line.slice(4);
+        } else if (line.startsWith('data: ')) {
+            event.data = event.data === null ? line.slice(6) : `${event.data}\n${line.slice(6)}`;
+        }
+    }
+    return event;
+}
+
+// Random id that keeps this browser's server-side chat history private to it
+function clientId() {
+    const key = 'xar_client_id';
+    let id = localStorage.getItem(key);
+    if (!/^[0-9a-f]{32}$/.test(id || '')) {
+        const bytes = new Uint8Array(16);
+        crypto.getRandomValues(bytes);
+        id = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        localStorage.setItem(key, id);
+    }
+    return id;
+}
+
+// Reattach to a buffered generation after a dropped connection
+async function resumeChatStream(lastEventId, signal) {
+    const response = await fetch("http://localhost:5000/chat/stream", {
+        method: "GET",
+        headers: { "Last-Event-ID": lastEventId },
+        signal
+    });
+    return response.ok ? response.body.getReader() : null;
+}
+
+// Incremental SSE parser: a frame split across network reads is kept until its blank line arrives
+class SSEFrameParser {
+    constructor() {
+        this.reset();
+    }
+
+    // Decode one network chunk and return the frames it completes
+    push(bytes) {
+        this.buffer += this.decoder.decode(bytes, { stream: true });
+        const frames = [];
+        let start = 0;
+        let end;
+        while ((end = this.buffer.indexOf('\n\n', start)) !== -1) {
+            frames.push(parseSSEFrame(this.buffer.slice(start, end)));
+            start = end + 2;
+        }
+        this.buffer = this.buffer.slice(start);
+        return frames;
+    }
+
+    // Drop any partial frame, e.g. before reading a resumed connection
+    reset() {
+        this.decoder = new TextDecoder();
+        this.buffer = '';
+    }
+}
+
+// Appends streamed text as new text nodes, at most once per animation frame,
+// so rendering cost stays proportional to the new text rather than the whole answer
+class StreamingTextRenderer {
+    constructor(element, onFlush = null) {
+        this.element = element;
+        this.onFlush = onFlush;
+        this.text = '';
+        this.pending = '';
+        this.scheduled = false;
+    }
+
+    append(text) {
+        if (!text) return;
+        this.text += text;
+        this.pending += text;
+        if (!this.scheduled) {
+            this.scheduled = true;
+            window.requestAnimationFrame(() => this.flush());
+        }
+    }
+
+    flush() {
+        this.scheduled = false;
+        if (!this.pending) return;
+        this.element.appendChild(document.createTextNode(this.pending));
+        this.pending = '';
+        if (this.onFlush) this.onFlush();
+    }
+}
+
+window.parseSSEFrame = parseSSEFrame;
+window.resumeChatStream = resumeChatStream;
+window.SSEFrameParser = SSEFrameParser;
+window.StreamingTextRenderer = StreamingTextRenderer;
@@ -1,27 +1,10 @@
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
-template="""
-Answer the question below.
+"""Terminal chat client; see backend/chat_cli.py for options (``--help``)."""
+import os
+import sys
 
-Here is the converstaion history: {context}
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
 
-Question: {question}
+from chat_cli import main
 
-Answer:
-"""
-model = OllamaLLM(model="gemma3:1b")
-prompt= ChatPromptTemplate.from_template(template)
-chain = prompt | model
-def handle_conversation():
-    context=""
-    print("welcome to the AI Chatbot! Type 'exit' to quit.")
-    while True:
-        user_input=input("You: ")
-        if user_input.lower()=="exit":
-            break
-        result=chain.invoke({"context":context,"question":user_input})
-        print("Bot: ",result)
-        context+=f"\nUser: {user_input}\nAI: {result}"
-
-if __name__=="__main__":
-    handle_conversation()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())